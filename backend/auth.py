@@ -1,3 +1,6 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
@@ -5,18 +8,29 @@ from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from decouple import config
+from backend.cache import TTLCache
 from backend.database import users_collection
-from backend.models import UserResponse, TokenData
+from backend.metrics import record_password_job
+from backend.models import UserResponse, TokenData, UserRole
 import uuid
 
 # Security configurations
 SECRET_KEY = config('SECRET_KEY', default='your-secret-key-here')
 ALGORITHM = config('ALGORITHM', default='HS256')
 ACCESS_TOKEN_EXPIRE_MINUTES = int(config('ACCESS_TOKEN_EXPIRE_MINUTES', default=30))
+USER_CACHE_TTL_SECONDS = config('USER_CACHE_TTL_SECONDS', default=60, cast=float)
+USER_CACHE_MAX_SIZE = config('USER_CACHE_MAX_SIZE', default=10000, cast=int)
+BCRYPT_ROUNDS = config('BCRYPT_ROUNDS', default=12, cast=int)
+PASSWORD_HASH_WORKERS = config('PASSWORD_HASH_WORKERS', default=2, cast=int)
+# Hash/verify jobs allowed to wait for a worker before requests get a 503
+PASSWORD_HASH_MAX_QUEUE = config('PASSWORD_HASH_MAX_QUEUE', default=64, cast=int)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 security = HTTPBearer()
 
+# Authenticated user records keyed by user id, without the password hash
+user_cache = TTLCache(maxsize=USER_CACHE_MAX_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+
 def verify_password(plain_password, hashed_password):
     """Verify a password against its hash"""
     return pwd_context.verify(plain_password, hashed_password)
@@ -25,6 +39,37 @@ def get_password_hash(password):
     """Hash a password"""
     return pwd_context.hash(password)
 
+# bcrypt releases the GIL, so a small thread pool keeps hashing off the event loop
+_password_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+)
+_password_jobs = 0
+
+async def _run_password_job(func, *args):
+    """Run a hashing job on the password pool, refusing work when it is saturated"""
+    global _password_jobs
+    if _password_jobs >= PASSWORD_HASH_WORKERS + PASSWORD_HASH_MAX_QUEUE:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please try again",
+            headers={"Retry-After": "1"},
+        )
+    _password_jobs += 1
+    started = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_password_executor, func, *args)
+    finally:
+        _password_jobs -= 1
+        record_password_job(func.__name__, time.perf_counter() - started)
+
+async def verify_password_async(plain_password, hashed_password):
+    """Verify a password against its hash without blocking the event loop"""
+    return await _run_password_job(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    """Hash a password without blocking the event loop"""
+    return await _run_password_job(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token"""
     to_encode = data.copy()
@@ -46,12 +91,31 @@ async def get_user_by_id(user_id: str):
     user = await users_collection.find_one({"id": user_id})
     return user
 
+async def get_cached_user(user_id: str):
+    """Get user by ID through the user cache"""
+    return await user_cache.get_or_load(
+        user_id,
+        lambda: users_collection.find_one({"id": user_id}, {"_id": 0, "password": 0})
+    )
+
+def invalidate_user(user_id: str):
+    """Forget the cached record of a user after it was changed"""
+    user_cache.invalidate(user_id)
+
+async def deactivate_user(user_id: str):
+    """Deactivate a user and drop their cached record"""
+    await users_collection.update_one(
+        {"id": user_id},
+        {"$set": {"is_active": False, "updated_at": datetime.utcnow()}}
+    )
+    invalidate_user(user_id)
+
 async def authenticate_user(email: str, password: str):
     """Authenticate user credentials"""
     user = await get_user_by_email(email)
     if not user:
         return False
-    if not verify_password(password, user["password"]):
+    if not await verify_password_async(password, user["password"]):
         return False
     return user
 
@@ -65,13 +129,18 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     try:
         payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
+        user_id: Optional[str] = payload.get("uid")
         if username is None:
             raise credentials_exception
-        token_data = TokenData(username=username)
+        token_data = TokenData(username=username, user_id=user_id)
     except JWTError:
         raise credentials_exception
     
-    user = await get_user_by_email(username)
+    # Tokens issued before they carried the user id fall back to the email lookup
+    if token_data.user_id:
+        user = await get_cached_user(token_data.user_id)
+    else:
+        user = await get_user_by_email(token_data.username)
     if user is None:
         raise credentials_exception
     return user
@@ -82,6 +151,12 @@ async def get_current_active_user(current_user: dict = Depends(get_current_user)
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
+async def get_current_admin_user(current_user: dict = Depends(get_current_active_user)):
+    """Get current active user, who must be an admin"""
+    if current_user.get("role") != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user
+
 def create_user_id():
     """Generate unique user ID"""
     return str(uuid.uuid4())
\ No newline at end of file
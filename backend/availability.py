@@ -0,0 +1,154 @@
+"""Booking availability engine and item availability calendars.
+
+Bookings store their rental period as a half-open interval of real dates,
+``start`` (first day) to ``end`` (the day after the last day), next to the
+``YYYY-MM-DD`` strings the API exposes. Overlap checks are then a single
+range query on the (item_id, start, end) index.
+
+Mongo has no exclusion constraint for intervals, so claims on an item are
+serialised with an optimistic version counter on the item document: a
+writer reads the version, checks for overlaps, writes its booking and then
+bumps the version only if nobody else did in between. The loser undoes its
+write and retries, and on retry sees the winner's booking.
+"""
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from backend.database import bookings_collection, items_collection
+from backend.models import BookingRole, BookingStatus
+
+# Bookings holding their dates; a pending request keeps them until the owner
+# rejects it, so two renters can never both be approved for the same days
+BLOCKING_STATUSES = [BookingStatus.PENDING, BookingStatus.APPROVED, BookingStatus.ACTIVE]
+
+MAX_CLAIM_ATTEMPTS = 8
+
+DATE_FORMAT = "%Y-%m-%d"
+
+
+def parse_date(value: str) -> datetime:
+    try:
+        return datetime.strptime(value, DATE_FORMAT)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Dates must be in YYYY-MM-DD format")
+
+
+def dates_to_ranges(dates: List[str]) -> List[dict]:
+    """Merge a list of YYYY-MM-DD days into sorted half-open {start, end} ranges.
+
+    Items store their calendar this way: a year of consecutive days is one
+    small range instead of 365 strings, and ranges can be filtered on.
+    """
+    ranges: List[dict] = []
+    for day in sorted({parse_date(value) for value in dates}):
+        if ranges and ranges[-1]["end"] == day:
+            ranges[-1]["end"] = day + timedelta(days=1)
+        else:
+            ranges.append({"start": day, "end": day + timedelta(days=1)})
+    return ranges
+
+
+def ranges_to_dates(ranges: List[dict]) -> List[str]:
+    """Expand stored ranges back into the YYYY-MM-DD list the API exposes"""
+    dates = []
+    for available in ranges:
+        day = available["start"]
+        while day < available["end"]:
+            dates.append(day.strftime(DATE_FORMAT))
+            day += timedelta(days=1)
+    return dates
+
+
+def calendar_filter(start: datetime, end: datetime) -> dict:
+    """Items whose calendar has one range covering all of [start, end)"""
+    return {"available_ranges": {"$elemMatch": {"start": {"$lte": start}, "end": {"$gte": end}}}}
+
+
+def parse_interval(start_date: str, end_date: str) -> Tuple[datetime, datetime]:
+    """Half-open [start, end) interval covering start_date through end_date"""
+    start = parse_date(start_date)
+    last = parse_date(end_date)
+    if last < start:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+    return start, last + timedelta(days=1)
+
+
+def conflict_filter(item_id: str, start: datetime, end: datetime,
+                    exclude_id: Optional[str] = None) -> dict:
+    """Blocking bookings of the item overlapping [start, end)"""
+    query = {
+        "item_id": item_id,
+        "start": {"$lt": end},
+        "end": {"$gt": start},
+        "status": {"$in": BLOCKING_STATUSES}
+    }
+    if exclude_id:
+        query["id"] = {"$ne": exclude_id}
+    return query
+
+
+def bookings_filter(user_id: str, role: Optional[BookingRole] = None,
+                    status: Optional[BookingStatus] = None, after: Optional[dict] = None) -> dict:
+    """A user's bookings as renter, owner or (without a role) either.
+
+    Each role is served by its own (<role>_id, created_at, id) index; after
+    is a cursor clause for the RECENT_SORT order.
+    """
+    if role == BookingRole.RENTER:
+        clauses = [{"renter_id": user_id}]
+    elif role == BookingRole.OWNER:
+        clauses = [{"owner_id": user_id}]
+    else:
+        clauses = [{"$or": [{"renter_id": user_id}, {"owner_id": user_id}]}]
+    if status:
+        clauses.append({"status": status})
+    if after:
+        clauses.append(after)
+    return {"$and": clauses}
+
+
+async def find_conflict(item_id: str, start: datetime, end: datetime,
+                        exclude_id: Optional[str] = None) -> Optional[dict]:
+    """A blocking booking of the item overlapping [start, end), if any"""
+    return await bookings_collection.find_one(
+        conflict_filter(item_id, start, end, exclude_id), {"_id": 0, "id": 1}
+    )
+
+
+async def is_available(item_id: str, start: datetime, end: datetime) -> bool:
+    return await find_conflict(item_id, start, end) is None
+
+
+async def claim_interval(
+    item_id: str,
+    start: datetime,
+    end: datetime,
+    apply: Callable[[], Awaitable[None]],
+    undo: Callable[[], Awaitable[None]],
+    exclude_id: Optional[str] = None
+):
+    """Run apply() only if [start, end) is free, atomically with respect to
+    every other claim on the same item. Raises 409 when the dates are taken."""
+    for _ in range(MAX_CLAIM_ATTEMPTS):
+        item = await items_collection.find_one({"id": item_id}, {"_id": 0, "booking_version": 1})
+        if item is None:
+            raise HTTPException(status_code=404, detail="Item not found")
+        version = item.get("booking_version", 0)
+
+        if await find_conflict(item_id, start, end, exclude_id):
+            raise HTTPException(status_code=409, detail="Item is already booked for these dates")
+
+        await apply()
+        # Items created before the counter existed have no booking_version
+        expected = version if version else {"$in": [0, None]}
+        result = await items_collection.update_one(
+            {"id": item_id, "booking_version": expected},
+            {"$inc": {"booking_version": 1}}
+        )
+        if result.modified_count:
+            return
+        await undo()
+
+    raise HTTPException(status_code=409, detail="Item is being booked by someone else, please try again")
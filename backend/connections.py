@@ -0,0 +1,251 @@
+"""WebSocket connection management for real-time chat.
+
+Every connection owns a bounded outbound queue drained by its own writer
+task, so sending to a user or broadcasting only enqueues frames and never
+waits on a socket. What happens when a slow client's queue is full is set
+by WS_QUEUE_POLICY:
+
+* ``drop_oldest``: discard the oldest queued frame to make room.
+* ``coalesce``: replace a queued frame with the same coalesce key (e.g. a
+  newer presence update), otherwise drop the oldest.
+* ``disconnect``: close the slow connection.
+
+A user may be connected from several devices or tabs at once; every frame
+for the user goes to each of their connections. The server pings idle
+connections with a ``{"type": "ping"}`` frame and evicts those that have
+sent nothing, not even a pong, for WS_IDLE_TIMEOUT_SECONDS, so half-open
+sockets do not pile up.
+"""
+import asyncio
+from collections import deque
+from typing import Deque, Dict, Optional, Set, Tuple
+
+from decouple import config
+from fastapi import WebSocket
+
+WS_SEND_QUEUE_SIZE = config('WS_SEND_QUEUE_SIZE', default=256, cast=int)
+WS_QUEUE_POLICY = config('WS_QUEUE_POLICY', default='drop_oldest')
+# A single send taking longer than this marks the client as stuck
+WS_SEND_TIMEOUT_SECONDS = config('WS_SEND_TIMEOUT_SECONDS', default=10, cast=float)
+WS_HEARTBEAT_SECONDS = config('WS_HEARTBEAT_SECONDS', default=30, cast=float)
+WS_IDLE_TIMEOUT_SECONDS = config('WS_IDLE_TIMEOUT_SECONDS', default=90, cast=float)
+# Connections this process accepts before refusing new ones
+WS_MAX_CONNECTIONS = config('WS_MAX_CONNECTIONS', default=10000, cast=int)
+
+PING_FRAME = '{"type": "ping"}'
+# Close code asking the client to reconnect later
+TRY_AGAIN_LATER = 1013
+
+QUEUE_POLICIES = ("drop_oldest", "coalesce", "disconnect")
+
+
+class ConnectionStats:
+    def __init__(self):
+        self.frames_received = 0
+        self.frames_enqueued = 0
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.frames_coalesced = 0
+        self.slow_disconnects = 0
+        self.idle_evictions = 0
+        self.rejected_connections = 0
+
+
+class Connection:
+    """One accepted WebSocket with its outbound queue and writer task"""
+
+    def __init__(self, websocket: WebSocket, user_id: str, manager: "ConnectionManager"):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.manager = manager
+        self.queue: Deque[Tuple[Optional[str], str]] = deque()
+        self.ready = asyncio.Event()
+        self.closed = False
+        # Loop time the send in progress started at, checked by the watchdog
+        self.send_started: Optional[float] = None
+        self.last_seen = asyncio.get_running_loop().time()
+        self.writer = asyncio.create_task(self._write())
+
+    def enqueue(self, message: str, coalesce_key: Optional[str] = None) -> bool:
+        """Queue a frame without waiting; False if it was not queued"""
+        if self.closed:
+            return False
+        stats = self.manager.stats
+        if len(self.queue) >= self.manager.queue_size:
+            policy = self.manager.policy
+            if policy == "disconnect":
+                stats.slow_disconnects += 1
+                self.close()
+                return False
+            if policy == "coalesce" and coalesce_key is not None:
+                for i, (key, _) in enumerate(self.queue):
+                    if key == coalesce_key:
+                        self.queue[i] = (coalesce_key, message)
+                        stats.frames_coalesced += 1
+                        return True
+            self.queue.popleft()
+            stats.frames_dropped += 1
+        self.queue.append((coalesce_key, message))
+        stats.frames_enqueued += 1
+        self.ready.set()
+        return True
+
+    def touch(self):
+        """Record that the client sent something"""
+        self.last_seen = asyncio.get_running_loop().time()
+        self.manager.stats.frames_received += 1
+
+    async def _write(self):
+        stats = self.manager.stats
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                await self.ready.wait()
+                while self.queue:
+                    _, message = self.queue.popleft()
+                    self.send_started = loop.time()
+                    await self.websocket.send_text(message)
+                    self.send_started = None
+                    stats.frames_sent += 1
+                self.ready.clear()
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            # The socket is gone; the receive loop notices and disconnects
+            self.close()
+
+    def close(self):
+        """Stop writing and close the socket; the endpoint's receive loop ends"""
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.clear()
+        if self.writer is not asyncio.current_task():
+            self.writer.cancel()
+        self.manager.remove(self)
+        # The loop only keeps weak references to tasks, so hold on to it until done
+        closing = asyncio.create_task(self._close_socket())
+        self.manager.closing_tasks.add(closing)
+        closing.add_done_callback(self.manager.closing_tasks.discard)
+
+    async def _close_socket(self):
+        try:
+            await self.websocket.close()
+        except Exception:
+            pass
+
+
+class ConnectionManager:
+    def __init__(self, queue_size: int = WS_SEND_QUEUE_SIZE, policy: str = WS_QUEUE_POLICY,
+                 send_timeout: float = WS_SEND_TIMEOUT_SECONDS,
+                 heartbeat: float = WS_HEARTBEAT_SECONDS,
+                 idle_timeout: float = WS_IDLE_TIMEOUT_SECONDS,
+                 max_connections: int = WS_MAX_CONNECTIONS):
+        if policy not in QUEUE_POLICIES:
+            raise ValueError(f"WS_QUEUE_POLICY must be one of {', '.join(QUEUE_POLICIES)}")
+        self.queue_size = queue_size
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self.heartbeat = heartbeat
+        self.idle_timeout = idle_timeout
+        self.max_connections = max_connections
+        self.stats = ConnectionStats()
+        self.active_connections: Dict[WebSocket, Connection] = {}
+        self.user_connections: Dict[str, Set[Connection]] = {}
+        self._watchdog: Optional[asyncio.Task] = None
+        # Sockets being closed in the background
+        self.closing_tasks: Set[asyncio.Task] = set()
+
+    async def connect(self, websocket: WebSocket, user_id: str) -> Optional[Connection]:
+        """Accept and register a socket; None if this process is full"""
+        if len(self.active_connections) >= self.max_connections:
+            self.stats.rejected_connections += 1
+            await websocket.close(code=TRY_AGAIN_LATER)
+            return None
+        await websocket.accept()
+        connection = Connection(websocket, user_id, self)
+        self.active_connections[websocket] = connection
+        self.user_connections.setdefault(user_id, set()).add(connection)
+        if self._watchdog is None or self._watchdog.done():
+            self._watchdog = asyncio.create_task(self._watch())
+        return connection
+
+    def disconnect(self, connection: Connection) -> bool:
+        """Unregister a connection whose socket is gone.
+
+        Returns True if the user has no connections left on this process.
+        """
+        if not connection.closed:
+            connection.closed = True
+            connection.queue.clear()
+            connection.writer.cancel()
+        self.remove(connection)
+        return not self.is_connected(connection.user_id)
+
+    def remove(self, connection: Connection):
+        self.active_connections.pop(connection.websocket, None)
+        connections = self.user_connections.get(connection.user_id)
+        if connections is not None:
+            connections.discard(connection)
+            if not connections:
+                del self.user_connections[connection.user_id]
+
+    def is_connected(self, user_id: str) -> bool:
+        return user_id in self.user_connections
+
+    async def _watch(self):
+        """Ping idle clients and close stuck or silent connections.
+
+        One periodic sweep over all connections is much cheaper than a timer
+        per connection or a timeout around every send.
+        """
+        loop = asyncio.get_running_loop()
+        interval = min(self.send_timeout / 2, self.heartbeat)
+        last_ping = loop.time()
+        while self.active_connections:
+            await asyncio.sleep(interval)
+            now = loop.time()
+            ping = now - last_ping >= self.heartbeat
+            if ping:
+                last_ping = now
+            for connection in list(self.active_connections.values()):
+                started = connection.send_started
+                if started is not None and now - started > self.send_timeout:
+                    self.stats.slow_disconnects += 1
+                    connection.close()
+                elif now - connection.last_seen > self.idle_timeout:
+                    self.stats.idle_evictions += 1
+                    connection.close()
+                elif ping and now - connection.last_seen >= self.heartbeat:
+                    connection.enqueue(PING_FRAME, coalesce_key="ping")
+
+    async def send_personal_message(self, message: str, user_id: str):
+        for connection in list(self.user_connections.get(user_id, ())):
+            connection.enqueue(message)
+
+    async def deliver(self, user_id: str, message: str):
+        """Message bus callback for users connected to this process"""
+        await self.send_personal_message(message, user_id)
+
+    async def broadcast(self, message: str, coalesce_key: Optional[str] = None):
+        # Only enqueues, so one slow client cannot hold up the others
+        for connection in list(self.active_connections.values()):
+            connection.enqueue(message, coalesce_key)
+
+    def metrics(self) -> dict:
+        depths = [len(c.queue) for c in self.active_connections.values()]
+        return {
+            "connections": len(self.active_connections),
+            "users": len(self.user_connections),
+            "max_connections": self.max_connections,
+            "queued_frames": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "frames_received": self.stats.frames_received,
+            "frames_enqueued": self.stats.frames_enqueued,
+            "frames_sent": self.stats.frames_sent,
+            "frames_dropped": self.stats.frames_dropped,
+            "frames_coalesced": self.stats.frames_coalesced,
+            "slow_disconnects": self.stats.slow_disconnects,
+            "idle_evictions": self.stats.idle_evictions,
+            "rejected_connections": self.stats.rejected_connections
+        }
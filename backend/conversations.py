@@ -0,0 +1,171 @@
+"""Two-person chat conversations and every user's inbox.
+
+Every message carries the id of the conversation it belongs to, derived
+from the two participants, so a conversation's history is a single range
+on the (conversation_id, created_at, id) index instead of an $or over both
+directions that has to be sorted in memory.
+
+The inbox is materialized in the conversations collection: one document per
+user and conversation partner holding a preview of the last message and the
+user's unread count. It is updated as messages are stored and read, so
+listing a user's conversations is one indexed read.
+"""
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from pymongo import UpdateOne
+
+from backend.database import conversations_collection, messages_collection
+from backend.pagination import decode_cursor, encode_cursor
+
+# Oldest first, with the id breaking ties between equal timestamps
+HISTORY_SORT = [("created_at", 1), ("id", 1)]
+# The same order reversed, for the latest page of a conversation
+HISTORY_NEWEST_FIRST = [(key, -direction) for key, direction in HISTORY_SORT]
+
+# Most recently active conversations first
+INBOX_SORT = [("last_message_at", -1), ("other_user_id", -1)]
+
+PREVIEW_LENGTH = 100
+
+
+def conversation_id(user_id: str, other_user_id: str) -> str:
+    """Same id whichever of the two users asks"""
+    first, second = sorted((user_id, other_user_id))
+    return f"{first}:{second}"
+
+
+async def anchor_filter(conversation: str, message_id: str, direction: str) -> dict:
+    """Query clause selecting messages before ("$lt") or after ("$gt") a message"""
+    anchor = await messages_collection.find_one(
+        {"id": message_id, "conversation_id": conversation},
+        {"_id": 0, "id": 1, "created_at": 1}
+    )
+    if anchor is None:
+        raise HTTPException(status_code=404, detail="Message not found in this conversation")
+    return position_filter(anchor["created_at"], message_id, direction)
+
+
+def position_filter(created_at: datetime, message_id: str, direction: str,
+                    inclusive: bool = False) -> dict:
+    """Query clause selecting messages before ("$lt") or after ("$gt") a position.
+
+    Positions are in HISTORY_SORT order; with inclusive the message at the
+    position is selected too.
+    """
+    return {"$or": [
+        {"created_at": {direction: created_at}},
+        {"created_at": created_at, "id": {direction + "e" if inclusive else direction: message_id}}
+    ]}
+
+
+def _inbox_update(user_id: str, other_user_id: str, last: dict, unread: int) -> UpdateOne:
+    preview = {
+        "id": last["id"],
+        "sender_id": last["sender_id"],
+        "content": last["content"][:PREVIEW_LENGTH],
+        "created_at": last["created_at"]
+    }
+    # Batches may be stored out of order; only a newer message replaces the preview
+    newer = {"$gt": [last["created_at"], {"$ifNull": ["$last_message_at", datetime.min]}]}
+    return UpdateOne(
+        {"user_id": user_id, "other_user_id": other_user_id},
+        [{"$set": {
+            "conversation_id": conversation_id(user_id, other_user_id),
+            "last_message": {"$cond": [newer, {"$literal": preview}, "$last_message"]},
+            "last_message_at": {"$max": [last["created_at"], "$last_message_at"]},
+            "unread_count": {"$add": [{"$ifNull": ["$unread_count", 0]}, unread]}
+        }}],
+        upsert=True
+    )
+
+
+async def record_messages(messages: List[dict]):
+    """Update both participants' inbox entries for newly stored messages"""
+    entries: Dict[Tuple[str, str], list] = {}
+    for message in messages:
+        sender, receiver = message["sender_id"], message["receiver_id"]
+        for user_id, other_user_id, unread in ((sender, receiver, 0), (receiver, sender, 1)):
+            entry = entries.setdefault((user_id, other_user_id), [message, 0])
+            if message["created_at"] > entry[0]["created_at"]:
+                entry[0] = message
+            entry[1] += unread
+    if entries:
+        await conversations_collection.bulk_write([
+            _inbox_update(user_id, other_user_id, last, unread)
+            for (user_id, other_user_id), (last, unread) in entries.items()
+        ], ordered=False)
+
+
+async def mark_conversation_read(user_id: str, other_user_id: str, count: int):
+    """Take count messages that were just read off the user's unread counter"""
+    await conversations_collection.update_one(
+        {"user_id": user_id, "other_user_id": other_user_id},
+        [{"$set": {"unread_count": {"$max": [0, {"$subtract": ["$unread_count", count]}]}}}]
+    )
+
+
+def unread_filter(user_id: str, other_user_id: str, anchor: Optional[dict] = None,
+                  before: Optional[datetime] = None) -> dict:
+    """Unread messages other_user_id sent user_id, up to the anchor message or before"""
+    query = {
+        "conversation_id": conversation_id(user_id, other_user_id),
+        "receiver_id": user_id,
+        "is_read": False
+    }
+    if anchor:
+        query.update(position_filter(anchor["created_at"], anchor["id"], "$lt", inclusive=True))
+    elif before:
+        query["created_at"] = {"$lt": before}
+    return query
+
+
+async def mark_read_up_to(user_id: str, other_user_id: str, up_to: Optional[str] = None,
+                          before: Optional[datetime] = None) -> int:
+    """Mark what other_user_id sent user_id as read, in one update_many.
+
+    Everything up to and including message up_to, or sent before the
+    timestamp before, or (with neither) everything so far. Returns the
+    number of messages that were unread.
+    """
+    anchor = None
+    if up_to:
+        anchor = await messages_collection.find_one(
+            {"id": up_to, "conversation_id": conversation_id(user_id, other_user_id)},
+            {"_id": 0, "id": 1, "created_at": 1}
+        )
+        if anchor is None:
+            raise HTTPException(status_code=404, detail="Message not found in this conversation")
+
+    result = await messages_collection.update_many(
+        unread_filter(user_id, other_user_id, anchor, before), {"$set": {"is_read": True}}
+    )
+    if result.modified_count:
+        await mark_conversation_read(user_id, other_user_id, result.modified_count)
+    return result.modified_count
+
+
+def inbox_cursor_filter(cursor: str) -> dict:
+    """Query clause selecting the conversations after the cursor in INBOX_SORT order"""
+    values = decode_cursor(cursor)
+    try:
+        last_message_at = datetime.fromisoformat(values["last_message_at"])
+        other_user_id = values["other_user_id"]
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {"$or": [
+        {"last_message_at": {"$lt": last_message_at}},
+        {"last_message_at": last_message_at, "other_user_id": {"$lt": other_user_id}}
+    ]}
+
+
+def inbox_next_cursor(rows: List[dict], limit: int) -> Optional[str]:
+    """Cursor for the page after rows, fetched with limit + 1"""
+    if limit <= 0 or len(rows) <= limit:
+        return None
+    last = rows[limit - 1]
+    return encode_cursor({
+        "last_message_at": last["last_message_at"],
+        "other_user_id": last["other_user_id"]
+    })
@@ -2,13 +2,17 @@ from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo import MongoClient
 import os
 from decouple import config
+from backend.metrics import mongo_event_listeners
+from backend.slow_queries import slow_query_listeners
 
 # Database configuration
 MONGO_URL = config('MONGO_URL', default='mongodb://localhost:27017/p2p_marketplace')
-DATABASE_NAME = "p2p_marketplace"
+DATABASE_NAME = config('DATABASE_NAME', default='p2p_marketplace')
 
 # Async MongoDB client for FastAPI
-client = AsyncIOMotorClient(MONGO_URL)
+client = AsyncIOMotorClient(
+    MONGO_URL, event_listeners=mongo_event_listeners() + slow_query_listeners()
+)
 database = client[DATABASE_NAME]
 
 # Collections
@@ -17,7 +21,10 @@ items_collection = database.items
 bookings_collection = database.bookings
 reviews_collection = database.reviews
 messages_collection = database.messages
+conversations_collection = database.conversations
 payments_collection = database.payments
+image_variants_collection = database.image_variants
+chat_events_collection = database.chat_events
 
 # Sync client for startup operations
 sync_client = MongoClient(MONGO_URL)
@@ -27,11 +34,42 @@ async def create_indexes():
     """Create database indexes for better performance"""
     await users_collection.create_index("email", unique=True)
     await users_collection.create_index("username", unique=True)
+    await users_collection.create_index("id", unique=True)
+    await items_collection.create_index("id", unique=True)
     await items_collection.create_index([("location.coordinates", "2dsphere")])
     await items_collection.create_index("category")
     await items_collection.create_index("owner_id")
-    await bookings_collection.create_index("item_id")
-    await bookings_collection.create_index("renter_id")
+    # Keyset pagination of listings, newest first
+    await items_collection.create_index([("is_available", 1), ("created_at", -1), ("id", -1)])
+    await items_collection.create_index([("is_available", 1), ("category", 1), ("created_at", -1), ("id", -1)])
+    await items_collection.create_index([("owner_id", 1), ("created_at", -1), ("id", -1)])
+    # Full-text search, titles weighted over descriptions, and typeahead prefixes
+    await items_collection.create_index(
+        [("title", "text"), ("description", "text")],
+        weights={"title": 5, "description": 1},
+        name="item_text"
+    )
+    # Prefix-only typeahead is listed newest first, so the index carries the sort
+    await items_collection.create_index(
+        [("search_prefixes", 1), ("is_available", 1), ("created_at", -1), ("id", -1)]
+    )
+    # Calendar search; $elemMatch bounds both keys on the same range
+    await items_collection.create_index([("available_ranges.start", 1), ("available_ranges.end", 1)])
+    await bookings_collection.create_index("id", unique=True)
+    # Overlap checks: item_id equality, then a range on start with end filtered in the index
+    await bookings_collection.create_index([("item_id", 1), ("start", 1), ("end", 1)])
+    # Newest-first booking lists per role
+    await bookings_collection.create_index([("renter_id", 1), ("created_at", -1), ("id", -1)])
+    await bookings_collection.create_index([("owner_id", 1), ("created_at", -1), ("id", -1)])
     await messages_collection.create_index([("sender_id", 1), ("receiver_id", 1)])
+    await messages_collection.create_index("id", unique=True)
+    # Conversation history pages, in either direction
+    await messages_collection.create_index([("conversation_id", 1), ("created_at", 1), ("id", 1)])
+    # Inbox: one entry per user and partner, most recently active first
+    await conversations_collection.create_index([("user_id", 1), ("other_user_id", 1)], unique=True)
+    await conversations_collection.create_index([("user_id", 1), ("last_message_at", -1), ("other_user_id", -1)])
     await reviews_collection.create_index("item_id")
-    await reviews_collection.create_index("reviewer_id")
\ No newline at end of file
+    await reviews_collection.create_index("reviewer_id")
+    await image_variants_collection.create_index("image_id", unique=True)
+    # Chat bus events only need to live long enough to reach the other workers
+    await chat_events_collection.create_index("created_at", expireAfterSeconds=600)
\ No newline at end of file
@@ -0,0 +1,324 @@
+"""In-process spatial index of available items.
+
+Items are bucketed into fixed-size lat/lon grid cells. Each cell keeps its
+coordinates in NumPy arrays so radius and k-nearest queries evaluate the
+haversine distance for a whole cell at once instead of one item at a time.
+Hits are ordered by distance and then by item id, so pages of items at the
+same spot do not overlap. Only the requested page is ranked: the hits are
+partitioned around its end and just the items up to there are sorted.
+
+The index is per process: it is rebuilt from Mongo at startup and kept up to
+date by the item write endpoints of the same worker. ``check_consistency``,
+served to admins on /api/admin/geo-index, reports drift against the
+collection (e.g. writes made by other workers).
+"""
+import asyncio
+from functools import partial
+from math import ceil, cos, pi, radians, sqrt
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from decouple import config
+
+from backend.search import EARTH_RADIUS_KM
+
+GEO_INDEX_ENABLED = config('GEO_INDEX_ENABLED', default=False, cast=bool)
+GEO_INDEX_CELL_DEGREES = config('GEO_INDEX_CELL_DEGREES', default=0.1, cast=float)
+# Queries scanning more items than this run on a worker thread
+GEO_INDEX_INLINE_ITEMS = config('GEO_INDEX_INLINE_ITEMS', default=20000, cast=int)
+
+KM_PER_DEGREE = 2 * pi * EARTH_RADIUS_KM / 360
+MAX_DISTANCE_KM = pi * EARTH_RADIUS_KM  # Half the equator, the farthest two points can be apart
+
+
+def haversine_many(lon, lat, lons, lats):
+    """Vectorized great circle distance (km) from one point to many points"""
+    lon, lat = radians(lon), radians(lat)
+    lons = np.radians(lons)
+    lats = np.radians(lats)
+    a = np.sin((lats - lat) / 2) ** 2 + cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _category_value(category) -> Optional[str]:
+    # ItemCategory members hash by name, so key everything by the plain value
+    return getattr(category, "value", category)
+
+
+class _Cell:
+    """Items of one grid cell.
+
+    Writes replace the arrays instead of changing them in place, so a query
+    on a worker thread reads a consistent snapshot while the event loop
+    keeps indexing items.
+    """
+
+    def __init__(self, ids=(), documents=(), coords=None, categories=None):
+        self.entries = (
+            tuple(ids), tuple(documents),
+            np.empty((0, 2)) if coords is None else np.asarray(coords, dtype=np.float64).reshape(-1, 2),
+            np.empty(0, dtype=np.int16) if categories is None else np.asarray(categories, dtype=np.int16)
+        )
+        self.positions: Dict[str, int] = {item_id: i for i, item_id in enumerate(ids)}
+
+    def __len__(self):
+        return len(self.entries[0])
+
+    def add(self, item_id: str, document: dict, lon: float, lat: float, category_code: int):
+        ids, documents, coords, categories = self.entries
+        self.positions[item_id] = len(ids)
+        self.entries = (
+            ids + (item_id,), documents + (document,),
+            np.append(coords, [(lon, lat)], axis=0), np.append(categories, np.int16(category_code))
+        )
+
+    def remove(self, item_id: str):
+        # Move the last entry into the freed slot so no other position changes
+        position = self.positions.pop(item_id)
+        ids, documents, coords, categories = self.entries
+        last = len(ids) - 1
+        ids, documents = list(ids[:last]), list(documents[:last])
+        coords, categories = coords[:last].copy(), categories[:last].copy()
+        if position != last:
+            last_id = self.entries[0][last]
+            ids[position], documents[position] = last_id, self.entries[1][last]
+            coords[position], categories[position] = self.entries[2][last], self.entries[3][last]
+            self.positions[last_id] = position
+        self.entries = (tuple(ids), tuple(documents), coords, categories)
+
+    def search(self, lon: float, lat: float, min_distance_km: float, after_id: Optional[str],
+               radius_km: float, category_code: Optional[int]):
+        """Ids and documents of the cell, with positions and distances of the
+        entries in range; at exactly min_distance_km only ids after after_id"""
+        ids, documents, coords, categories = self.entries
+        distances = haversine_many(lon, lat, coords[:, 0], coords[:, 1])
+        mask = distances <= radius_km
+        if min_distance_km > 0 or after_id is not None:
+            mask &= distances >= min_distance_km
+        if after_id is not None:
+            for position in np.flatnonzero(distances == min_distance_km):
+                mask[position] = mask[position] and ids[position] > after_id
+        if category_code is not None:
+            mask &= categories == category_code
+        positions = np.flatnonzero(mask)
+        return ids, documents, positions, distances[positions]
+
+
+class GeoIndex:
+    """Grid-bucketed index of available items answering radius and k-NN queries"""
+
+    def __init__(self, cell_degrees: float = GEO_INDEX_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self.cells: Dict[Tuple[int, int], _Cell] = {}
+        self.documents: Dict[str, dict] = {}
+        self.item_cells: Dict[str, Tuple[int, int]] = {}
+        self.category_codes: Dict[Optional[str], int] = {}
+
+    def __len__(self):
+        return len(self.documents)
+
+    def _cell_key(self, lon: float, lat: float) -> Tuple[int, int]:
+        return int(lon // self.cell_degrees), int(lat // self.cell_degrees)
+
+    @staticmethod
+    def _coordinates(item: dict) -> Optional[Tuple[float, float]]:
+        location = item.get("location") or {}
+        coordinates = location.get("coordinates")
+        if not coordinates or len(coordinates) != 2:
+            return None
+        return float(coordinates[0]), float(coordinates[1])
+
+    def upsert(self, item: dict):
+        """Add or refresh an item; unavailable or unlocated items are dropped"""
+        item_id = item["id"]
+        self.remove(item_id)
+        coordinates = self._coordinates(item)
+        if coordinates is None or not item.get("is_available", True):
+            return
+        category = _category_value(item.get("category"))
+        code = self.category_codes.setdefault(category, len(self.category_codes))
+        key = self._cell_key(*coordinates)
+        self.cells.setdefault(key, _Cell()).add(item_id, item, *coordinates, code)
+        self.item_cells[item_id] = key
+        self.documents[item_id] = item
+
+    def remove(self, item_id: str):
+        key = self.item_cells.pop(item_id, None)
+        if key is None:
+            return
+        cell = self.cells[key]
+        cell.remove(item_id)
+        if not len(cell):
+            del self.cells[key]
+        del self.documents[item_id]
+
+    def _candidate_cells(self, lon: float, lat: float, radius_km: float) -> List[_Cell]:
+        lat_span = radius_km / KM_PER_DEGREE
+        lat_min, lat_max = lat - lat_span, lat + lat_span
+        # Near the poles or for huge radii the lon band covers the whole globe
+        if lat_min <= -90 or lat_max >= 90:
+            lon_span = 180.0
+        else:
+            widest = max(abs(lat_min), abs(lat_max))
+            lon_span = min(180.0, radius_km / (KM_PER_DEGREE * cos(radians(widest))))
+
+        n_lat = ceil(2 * lat_span / self.cell_degrees) + 1
+        wrap = int(round(360 / self.cell_degrees))
+        n_lon = min(ceil(2 * lon_span / self.cell_degrees) + 1, wrap)
+        # Copied at once, as the event loop may add cells while a worker thread reads
+        if n_lat * n_lon >= len(self.cells):
+            return list(self.cells.values())
+
+        x0, y0 = self._cell_key(lon - lon_span, lat_min)
+        cells = []
+        for dx in range(n_lon):
+            x = x0 + dx
+            # Fold cells that cross the antimeridian back into range
+            x = (x + wrap // 2) % wrap - wrap // 2
+            for dy in range(n_lat):
+                cell = self.cells.get((x, y0 + dy))
+                if cell is not None:
+                    cells.append(cell)
+        return cells
+
+    def _seed_radius(self, lon: float, lat: float, count: int, min_distance_km: float) -> float:
+        """Radius expected to hold count items beyond min_distance_km, from the
+        density of the cells around (lon, lat)"""
+        x, y = self._cell_key(lon, lat)
+        nearby = sum(
+            len(cell) for cell in (self.cells.get((x + dx, y + dy)) for dx in (-1, 0, 1) for dy in (-1, 0, 1))
+            if cell is not None
+        )
+        cell_km2 = (self.cell_degrees * KM_PER_DEGREE) ** 2 * max(cos(radians(lat)), 0.01)
+        if nearby:
+            density = nearby / (9 * cell_km2)
+        elif self.cells:
+            # Nothing close by: start from the average density of occupied cells
+            density = len(self) / (len(self.cells) * cell_km2)
+        else:
+            return MAX_DISTANCE_KM
+        # Half as much again, so a slightly sparser ring rarely needs a second pass
+        return min(sqrt(min_distance_km ** 2 + 1.5 * count / (pi * density)), MAX_DISTANCE_KM)
+
+    def _scan_size(self, lon: float, lat: float, radius_km: float) -> int:
+        return sum(len(cell) for cell in self._candidate_cells(lon, lat, radius_km))
+
+    def _search(self, lon: float, lat: float, radius_km: float, category,
+                min_distance_km: float, after_id: Optional[str], offset: int, limit: Optional[int]):
+        """The hits ranked offset to offset + limit and how many hits there were"""
+        category_code = None
+        if category:
+            category_code = self.category_codes.get(_category_value(category))
+            if category_code is None:
+                return [], 0
+
+        parts = []
+        for cell in self._candidate_cells(lon, lat, radius_km):
+            ids, documents, positions, distances = cell.search(
+                lon, lat, min_distance_km, after_id, radius_km, category_code
+            )
+            if len(positions):
+                parts.append((ids, documents, positions, distances))
+        if not parts:
+            return [], 0
+        distances = np.concatenate([part[3] for part in parts])
+        owners = np.repeat(np.arange(len(parts)), [len(part[2]) for part in parts])
+        positions = np.concatenate([part[2] for part in parts])
+
+        end = len(distances) if limit is None else min(offset + limit, len(distances))
+        if end <= offset:
+            return [], len(distances)
+        top = np.arange(len(distances))
+        if end < len(distances):
+            # Everything up to the end of the page, with all the ties at its last distance
+            boundary = distances[np.argpartition(distances, end - 1)[end - 1]]
+            top = np.flatnonzero(distances <= boundary)
+        ranked = sorted(top, key=lambda i: (distances[i], parts[owners[i]][0][positions[i]]))
+        return [
+            (parts[owners[i]][1][positions[i]], float(distances[i])) for i in ranked[offset:end]
+        ], len(distances)
+
+    def query_radius(self, lon: float, lat: float, radius_km: float,
+                     category: Optional[str] = None, min_distance_km: float = 0.0,
+                     after_id: Optional[str] = None, offset: int = 0,
+                     limit: Optional[int] = None) -> List[Tuple[dict, float]]:
+        """Items between min_distance_km and radius_km, nearest first, as (document, distance_km);
+        the page of limit items after the first offset. With after_id, items at
+        exactly min_distance_km must have a greater id."""
+        return self._search(lon, lat, radius_km, category, min_distance_km, after_id, offset, limit)[0]
+
+    def query_nearest(self, lon: float, lat: float, k: int,
+                      category: Optional[str] = None, min_distance_km: float = 0.0,
+                      after_id: Optional[str] = None, offset: int = 0) -> List[Tuple[dict, float]]:
+        """The k items closest to (lon, lat) at least min_distance_km away after the
+        first offset, nearest first; after_id as in query_radius"""
+        if k <= 0:
+            return []
+        radius_km = self._seed_radius(lon, lat, offset + k, min_distance_km)
+        while True:
+            hits, found = self._search(lon, lat, radius_km, category, min_distance_km, after_id, offset, k)
+            if found >= offset + k or radius_km >= MAX_DISTANCE_KM:
+                return hits
+            radius_km = min(radius_km * 2, MAX_DISTANCE_KM)
+
+    async def search(self, lon: float, lat: float, radius_km: Optional[float],
+                     category: Optional[str] = None, min_distance_km: float = 0.0,
+                     after_id: Optional[str] = None, offset: int = 0,
+                     limit: int = 20) -> List[Tuple[dict, float]]:
+        """query_radius, or query_nearest without a radius, on a worker thread
+        when it would scan more than GEO_INDEX_INLINE_ITEMS items"""
+        if radius_km is None:
+            query = partial(self.query_nearest, lon, lat, limit, category, min_distance_km, after_id, offset)
+            scanned = self._scan_size(lon, lat, self._seed_radius(lon, lat, offset + limit, min_distance_km))
+        else:
+            query = partial(
+                self.query_radius, lon, lat, radius_km, category, min_distance_km, after_id, offset, limit
+            )
+            scanned = self._scan_size(lon, lat, radius_km)
+        if scanned <= GEO_INDEX_INLINE_ITEMS:
+            return query()
+        return await asyncio.get_running_loop().run_in_executor(None, query)
+
+    async def rebuild(self, collection):
+        """Reload the index from the items collection, building each cell at once"""
+        grouped: Dict[Tuple[int, int], list] = {}
+        documents, item_cells, category_codes = {}, {}, {}
+        async for item in collection.find({"is_available": True}, {"_id": 0, "search_prefixes": 0}):
+            coordinates = self._coordinates(item)
+            if coordinates is None:
+                continue
+            code = category_codes.setdefault(_category_value(item.get("category")), len(category_codes))
+            key = self._cell_key(*coordinates)
+            grouped.setdefault(key, []).append((item["id"], item, coordinates, code))
+            documents[item["id"]] = item
+            item_cells[item["id"]] = key
+        self.category_codes = category_codes
+        self.cells = {key: _Cell(*zip(*entries)) for key, entries in grouped.items()}
+        self.documents = documents
+        self.item_cells = item_cells
+
+    async def check_consistency(self, collection) -> dict:
+        """Compare the index against the collection and report any drift"""
+        missing, moved = [], []
+        seen = set()
+        cursor = collection.find(
+            {"is_available": True},
+            {"_id": 0, "id": 1, "location.coordinates": 1}
+        )
+        async for item in cursor:
+            seen.add(item["id"])
+            coordinates = self._coordinates(item)
+            if coordinates is None:
+                continue
+            if item["id"] not in self.documents:
+                missing.append(item["id"])
+            elif self._coordinates(self.documents[item["id"]]) != coordinates:
+                moved.append(item["id"])
+        stale = [item_id for item_id in self.documents if item_id not in seen]
+        return {
+            "indexed": len(self.documents),
+            "missing": missing,
+            "stale": stale,
+            "moved": moved,
+            "consistent": not (missing or stale or moved)
+        }
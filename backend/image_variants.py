@@ -0,0 +1,129 @@
+"""Resized variants of item images.
+
+When an item is created or its images change, every image is rendered into
+thumbnail, card and full-size variants. Decoding and resizing are CPU bound,
+so they run in a bounded process pool and never on the event loop. Variants
+are stored in the image store like any other image, and the mapping from the
+original image to its variants lives in the image_variants collection.
+
+Listings ask for a size with ``?variant=``, which appends the variant to each
+image URL; GET /api/images/{id}?variant= resolves it and falls back to the
+original while the variant is still being rendered.
+"""
+import asyncio
+import io
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from decouple import config
+from PIL import Image, features
+
+from backend.database import image_variants_collection
+from backend.images import IMAGE_URL_PREFIX, is_image_reference, read_image, store_image
+from backend.models import ImageVariant
+
+IMAGE_WORKERS = config('IMAGE_WORKERS', default=2, cast=int)
+# Jobs handed to the pool beyond one per worker; further jobs wait on the event loop
+IMAGE_MAX_PENDING = config('IMAGE_MAX_PENDING', default=32, cast=int)
+
+# Longest edge in pixels of each variant
+VARIANT_SIZES = {
+    ImageVariant.THUMB: 160,
+    ImageVariant.CARD: 480,
+    ImageVariant.FULL: 1600,
+}
+
+_executor: Optional[ProcessPoolExecutor] = None
+_pending: Optional[asyncio.Semaphore] = None
+
+
+def render_variants(data: bytes) -> Dict[str, bytes]:
+    """Render every variant of an image. Runs inside a worker process."""
+    webp = features.check("webp")
+    with Image.open(io.BytesIO(data)) as original:
+        original.load()
+        has_alpha = original.mode in ("RGBA", "LA") or "transparency" in original.info
+        source = original.convert("RGBA" if has_alpha and webp else "RGB")
+
+    variants = {}
+    for variant, size in VARIANT_SIZES.items():
+        image = source.copy()
+        image.thumbnail((size, size), Image.LANCZOS)
+        out = io.BytesIO()
+        if webp:
+            image.save(out, "WEBP", quality=80, method=4)
+        else:
+            image.save(out, "JPEG", quality=82, optimize=True, progressive=True)
+        variants[variant.value] = out.getvalue()
+    return variants
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor, _pending
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+        _pending = asyncio.Semaphore(IMAGE_WORKERS + IMAGE_MAX_PENDING)
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _image_id(reference: str) -> str:
+    return reference[len(IMAGE_URL_PREFIX):].split("?", 1)[0]
+
+
+async def generate_variants(image_id: str):
+    """Render and store the variants of one stored image, once"""
+    if await image_variants_collection.find_one({"image_id": image_id}, {"_id": 1}):
+        return
+    data = await read_image(image_id)
+    if data is None:
+        return
+
+    executor = get_executor()
+    async with _pending:
+        rendered = await asyncio.get_running_loop().run_in_executor(
+            executor, render_variants, data
+        )
+
+    variants = {name: await store_image(body) for name, body in rendered.items()}
+    await image_variants_collection.update_one(
+        {"image_id": image_id},
+        {"$set": {"image_id": image_id, "variants": variants}},
+        upsert=True
+    )
+
+
+async def generate_item_variants(images: List[str]):
+    """Background task run after an item's images were written"""
+    for reference in images:
+        if is_image_reference(reference):
+            try:
+                await generate_variants(_image_id(reference))
+            except Exception as e:
+                print(f"Failed to render variants of {reference}: {e}")
+
+
+async def resolve_variant(image_id: str, variant: ImageVariant) -> Optional[str]:
+    """Id of the stored variant of an image, or None if not rendered yet"""
+    record = await image_variants_collection.find_one(
+        {"image_id": image_id}, {"_id": 0, "variants": 1}
+    )
+    if record is None:
+        return None
+    return record["variants"].get(variant.value)
+
+
+def variant_urls(images: List[str], variant: Optional[ImageVariant]) -> List[str]:
+    """Point image references at a variant, leaving anything else untouched"""
+    if variant is None:
+        return images
+    return [
+        f"{reference}?variant={variant.value}" if is_image_reference(reference) else reference
+        for reference in images
+    ]
@@ -0,0 +1,200 @@
+"""Content-addressed image storage.
+
+Images are stored once under the SHA-256 of their bytes, either on the local
+filesystem or in GridFS, and documents only keep a reference of the form
+``/api/images/<sha256>``. Because an image id never changes meaning, the
+download endpoint can be cached by clients indefinitely.
+
+Base64 payloads (plain or ``data:`` URLs) are still accepted by the write
+endpoints; they are moved into the store and replaced by their reference.
+Links to images hosted elsewhere (http or https URLs) are kept as they are.
+
+References are paths on the API's origin, which is not the frontend's;
+the frontend resolves them against its backend URL (utils/images.js).
+"""
+import asyncio
+import base64
+import binascii
+import hashlib
+import os
+import re
+import tempfile
+from typing import AsyncIterator, List, Optional, Tuple
+
+from decouple import config
+from fastapi import HTTPException
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+from backend.database import database
+
+IMAGE_STORE_BACKEND = config('IMAGE_STORE_BACKEND', default='filesystem')
+IMAGE_STORE_PATH = config('IMAGE_STORE_PATH', default='media/images')
+MAX_IMAGE_BYTES = config('MAX_IMAGE_BYTES', default=5 * 1024 * 1024, cast=int)
+
+IMAGE_URL_PREFIX = "/api/images/"
+CHUNK_SIZE = 256 * 1024
+
+_IMAGE_ID = re.compile(r"^[0-9a-f]{64}$")
+_DATA_URL = re.compile(r"^data:[^;,]*(;base64)?,")
+_EXTERNAL_URL = re.compile(r"^https?://", re.IGNORECASE)
+
+# Leading bytes of the image formats the marketplace accepts
+_SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+
+def sniff_content_type(data: bytes) -> Optional[str]:
+    """Detect the image type from its leading bytes"""
+    for signature, content_type in _SIGNATURES:
+        if data.startswith(signature):
+            return content_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def is_valid_image_id(image_id: str) -> bool:
+    return bool(_IMAGE_ID.match(image_id))
+
+
+def image_url(image_id: str) -> str:
+    return f"{IMAGE_URL_PREFIX}{image_id}"
+
+
+def is_image_reference(value: str) -> bool:
+    return value.startswith(IMAGE_URL_PREFIX)
+
+
+class FilesystemImageStore:
+    """Stores images as files named by their hash, sharded by hash prefix"""
+
+    def __init__(self, root: str = IMAGE_STORE_PATH):
+        self.root = root
+
+    def _path(self, image_id: str) -> str:
+        return os.path.join(self.root, image_id[:2], image_id)
+
+    def _write(self, image_id: str, data: bytes):
+        path = self._path(image_id)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so readers never see a partial file; every write
+        # gets its own temporary file, as uploads of one image can race
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    async def put(self, image_id: str, data: bytes, content_type: str):
+        await asyncio.to_thread(self._write, image_id, data)
+
+    async def open(self, image_id: str) -> Optional[Tuple[str, int, AsyncIterator[bytes]]]:
+        path = self._path(image_id)
+        try:
+            f = await asyncio.to_thread(open, path, "rb")
+        except FileNotFoundError:
+            return None
+        head = await asyncio.to_thread(f.read, 16)
+        length = os.fstat(f.fileno()).st_size
+
+        async def chunks():
+            try:
+                yield head
+                while True:
+                    chunk = await asyncio.to_thread(f.read, CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+            finally:
+                f.close()
+
+        return sniff_content_type(head) or "application/octet-stream", length, chunks()
+
+
+class GridFSImageStore:
+    """Stores images in a GridFS bucket with the hash as filename"""
+
+    def __init__(self, bucket_name: str = "images"):
+        self.bucket = AsyncIOMotorGridFSBucket(database, bucket_name=bucket_name)
+
+    async def put(self, image_id: str, data: bytes, content_type: str):
+        existing = await self.bucket.find({"filename": image_id}).to_list(length=1)
+        if existing:
+            return
+        await self.bucket.upload_from_stream(
+            image_id, data, metadata={"contentType": content_type}
+        )
+
+    async def open(self, image_id: str) -> Optional[Tuple[str, int, AsyncIterator[bytes]]]:
+        files = await self.bucket.find({"filename": image_id}).to_list(length=1)
+        if not files:
+            return None
+        grid_out = await self.bucket.open_download_stream(files[0]["_id"])
+
+        async def chunks():
+            while True:
+                chunk = await grid_out.readchunk()
+                if not chunk:
+                    break
+                yield chunk
+
+        content_type = (grid_out.metadata or {}).get("contentType", "application/octet-stream")
+        return content_type, grid_out.length, chunks()
+
+
+def create_image_store():
+    if IMAGE_STORE_BACKEND == "gridfs":
+        return GridFSImageStore()
+    return FilesystemImageStore()
+
+
+image_store = create_image_store()
+
+
+async def store_image(data: bytes) -> str:
+    """Validate and store raw image bytes, returning the image id"""
+    if len(data) > MAX_IMAGE_BYTES:
+        raise HTTPException(status_code=413, detail="Image is too large")
+    content_type = sniff_content_type(data)
+    if content_type is None:
+        raise HTTPException(status_code=400, detail="Unsupported image format")
+    image_id = hashlib.sha256(data).hexdigest()
+    await image_store.put(image_id, data, content_type)
+    return image_id
+
+
+async def read_image(image_id: str) -> Optional[bytes]:
+    """Load a whole stored image into memory"""
+    stored = await image_store.open(image_id)
+    if stored is None:
+        return None
+    _, _, chunks = stored
+    return b"".join([chunk async for chunk in chunks])
+
+
+async def store_inline_image(value: str) -> str:
+    """Move a base64 image into the store and return its reference.
+
+    References to already stored images and http(s) URLs are returned unchanged.
+    """
+    if not value or is_image_reference(value) or _EXTERNAL_URL.match(value):
+        return value
+    payload = "".join(_DATA_URL.sub("", value, count=1).split())
+    try:
+        data = base64.b64decode(payload, validate=True)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Images must be URLs, image references or base64 data")
+    return image_url(await store_image(data))
+
+
+async def store_inline_images(values: List[str]) -> List[str]:
+    return [await store_inline_image(value) for value in values]
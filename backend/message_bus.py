@@ -0,0 +1,166 @@
+"""Message buses delivering chat frames to users connected to any worker.
+
+Every worker keeps its own WebSocket connections, so a message received by
+one worker may be for a user whose socket lives in another process or on
+another node. Handlers publish frames for a user on the bus; each worker
+subscribes the users connected to it and delivers what the bus hands back
+to their local sockets.
+
+Backends, picked with CHAT_BUS_BACKEND:
+
+* ``memory``: in-process only, for tests and single-worker deployments.
+* ``redis``: Redis pub/sub with one channel per user, so a frame only
+  reaches the workers that hold that user's sockets.
+* ``mongo``: an insert-only chat_events collection tailed with a change
+  stream (needs a replica set); every worker sees every event and keeps the
+  ones for its users.
+"""
+import asyncio
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Awaitable, Callable, Optional, Set
+
+from decouple import config
+
+from backend.database import chat_events_collection
+
+CHAT_BUS_BACKEND = config('CHAT_BUS_BACKEND', default='memory')
+REDIS_URL = config('REDIS_URL', default='redis://localhost:6379/0')
+REDIS_CHANNEL_PREFIX = config('REDIS_CHANNEL_PREFIX', default='p2p:chat:')
+
+Deliver = Callable[[str, str], Awaitable[None]]
+
+
+class MessageBus(ABC):
+    """Interface of the backends; deliver(user_id, message) sends to local sockets.
+
+    Backends implement publish and extend start, stop, subscribe and
+    unsubscribe, which track the users connected to this worker.
+    """
+
+    def __init__(self):
+        self.deliver: Optional[Deliver] = None
+        self.local_users: Set[str] = set()
+
+    async def start(self, deliver: Deliver):
+        self.deliver = deliver
+
+    async def stop(self):
+        pass
+
+    async def subscribe(self, user_id: str):
+        self.local_users.add(user_id)
+
+    async def unsubscribe(self, user_id: str):
+        self.local_users.discard(user_id)
+
+    @abstractmethod
+    async def publish(self, user_id: str, message: str):
+        """Hand a frame to whichever worker holds the user's sockets"""
+
+    async def _deliver_local(self, user_id: str, message: str):
+        if user_id in self.local_users:
+            try:
+                await self.deliver(user_id, message)
+            except Exception as e:
+                print(f"Failed to deliver chat message to {user_id}: {e}")
+
+
+class InMemoryMessageBus(MessageBus):
+    async def publish(self, user_id: str, message: str):
+        await self._deliver_local(user_id, message)
+
+
+class RedisMessageBus(MessageBus):
+    def __init__(self, url: str = REDIS_URL, prefix: str = REDIS_CHANNEL_PREFIX):
+        super().__init__()
+        # Only needed for this backend
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(url)
+        self.prefix = prefix
+        self.pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self, deliver: Deliver):
+        await super().start(deliver)
+        # Keeps the pub/sub connection open while no user is subscribed
+        await self.pubsub.subscribe(f"{self.prefix}__workers")
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+        await self.pubsub.aclose()
+        await self.redis.aclose()
+
+    async def subscribe(self, user_id: str):
+        await super().subscribe(user_id)
+        await self.pubsub.subscribe(self.prefix + user_id)
+
+    async def unsubscribe(self, user_id: str):
+        await super().unsubscribe(user_id)
+        await self.pubsub.unsubscribe(self.prefix + user_id)
+
+    async def publish(self, user_id: str, message: str):
+        await self.redis.publish(self.prefix + user_id, message)
+
+    async def _listen(self):
+        while True:
+            try:
+                async for event in self.pubsub.listen():
+                    if event["type"] != "message":
+                        continue
+                    user_id = event["channel"].decode()[len(self.prefix):]
+                    await self._deliver_local(user_id, event["data"].decode())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Redis chat bus listener failed, reconnecting: {e}")
+                await asyncio.sleep(1)
+
+
+class MongoChangeStreamMessageBus(MessageBus):
+    def __init__(self, collection=chat_events_collection):
+        super().__init__()
+        self.collection = collection
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self, deliver: Deliver):
+        await super().start(deliver)
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+
+    async def publish(self, user_id: str, message: str):
+        await self.collection.insert_one({
+            "user_id": user_id,
+            "message": message,
+            "created_at": datetime.utcnow()
+        })
+
+    async def _listen(self):
+        resume_token = None
+        pipeline = [{"$match": {"operationType": "insert"}}]
+        while True:
+            try:
+                async with self.collection.watch(pipeline, resume_after=resume_token) as stream:
+                    async for change in stream:
+                        resume_token = stream.resume_token
+                        event = change["fullDocument"]
+                        await self._deliver_local(event["user_id"], event["message"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Mongo chat bus change stream failed, reconnecting: {e}")
+                await asyncio.sleep(1)
+
+
+def create_message_bus() -> MessageBus:
+    if CHAT_BUS_BACKEND == "redis":
+        return RedisMessageBus()
+    if CHAT_BUS_BACKEND == "mongo":
+        return MongoChangeStreamMessageBus()
+    return InMemoryMessageBus()
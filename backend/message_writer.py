@@ -0,0 +1,164 @@
+"""Persistence of chat messages, optionally write-behind.
+
+By default every message is inserted before it is forwarded, so chat
+throughput is bounded by the database round trip. With CHAT_WRITE_BEHIND
+the message is forwarded right away and queued; a background task writes
+the queue with insert_many once CHAT_BATCH_SIZE messages are waiting or
+CHAT_BATCH_INTERVAL_MS has passed, whichever comes first.
+
+Failed batches are retried with backoff. Documents keep the _id assigned on
+the first attempt, so a retry after a partial write skips the documents
+already stored instead of duplicating them. Stopping the writer flushes
+everything still queued.
+
+Once messages are stored, both participants' inbox entries are updated.
+"""
+import asyncio
+from typing import List, Optional, Tuple
+
+from decouple import config
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from backend.conversations import record_messages
+from backend.database import messages_collection
+
+CHAT_WRITE_BEHIND = config('CHAT_WRITE_BEHIND', default=False, cast=bool)
+CHAT_BATCH_SIZE = config('CHAT_BATCH_SIZE', default=200, cast=int)
+CHAT_BATCH_INTERVAL_MS = config('CHAT_BATCH_INTERVAL_MS', default=50, cast=int)
+CHAT_WRITE_RETRIES = config('CHAT_WRITE_RETRIES', default=5, cast=int)
+# Write-behind acks the sender as soon as a message is queued; with this,
+# only once it is stored. Write-through always acks after the insert.
+CHAT_DURABLE_ACKS = config('CHAT_DURABLE_ACKS', default=False, cast=bool)
+
+DUPLICATE_KEY = 11000
+
+
+class MessageWriter:
+    def __init__(self, collection=messages_collection, write_behind: bool = CHAT_WRITE_BEHIND,
+                 batch_size: int = CHAT_BATCH_SIZE,
+                 batch_interval: float = CHAT_BATCH_INTERVAL_MS / 1000,
+                 retries: int = CHAT_WRITE_RETRIES,
+                 durable_acks: bool = CHAT_DURABLE_ACKS):
+        self.collection = collection
+        self.write_behind = write_behind
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.retries = retries
+        self.durable_acks = durable_acks and write_behind
+        self._pending: List[Tuple[dict, asyncio.Future]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.batches_written = 0
+        self.messages_written = 0
+        self.messages_failed = 0
+
+    async def start(self):
+        if self.write_behind:
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush everything queued, then stop"""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+
+    async def save(self, message: dict) -> asyncio.Future:
+        """Store a message; the returned future resolves once it is written.
+
+        Write-through inserts before returning. Write-behind only queues it.
+        """
+        future = asyncio.get_running_loop().create_future()
+        if self._task is None:
+            await self.collection.insert_one(message)
+            await self._record([message])
+            future.set_result(None)
+            return future
+        self._pending.append((message, future))
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+        return future
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.batch_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._pending:
+                batch = self._pending[:self.batch_size]
+                del self._pending[:self.batch_size]
+                await self._flush(batch)
+                if not self._stopping and len(self._pending) < self.batch_size:
+                    break
+            if self._stopping and not self._pending:
+                return
+
+    async def _flush(self, batch: List[Tuple[dict, asyncio.Future]]):
+        documents = [message for message, _ in batch]
+        error: Optional[Exception] = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(min(0.1 * 2 ** (attempt - 1), 5))
+            try:
+                await self.collection.insert_many(documents, ordered=False)
+                error = None
+                break
+            except BulkWriteError as e:
+                # Duplicates were stored by an earlier attempt; retry the rest
+                failed = {
+                    write_error["index"] for write_error in e.details.get("writeErrors", [])
+                    if write_error.get("code") != DUPLICATE_KEY
+                }
+                documents = [document for i, document in enumerate(documents) if i in failed]
+                error = e
+                if not documents:
+                    error = None
+                    break
+            except PyMongoError as e:
+                error = e
+
+        self.batches_written += 1
+        if error is None:
+            await self._record([message for message, _ in batch])
+            self.messages_written += len(batch)
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(None)
+            return
+
+        failed_ids = {id(document) for document in documents}
+        print(f"Failed to store {len(documents)} chat messages after {self.retries} retries: {error}")
+        await self._record([message for message, _ in batch if id(message) not in failed_ids])
+        for message, future in batch:
+            if future.done():
+                continue
+            if id(message) in failed_ids:
+                self.messages_failed += 1
+                future.set_exception(error)
+                future.exception()  # Nobody may be waiting; don't warn about it
+            else:
+                self.messages_written += 1
+                future.set_result(None)
+
+    async def _record(self, messages: List[dict]):
+        # The messages are stored; a failure here only leaves the inbox stale
+        try:
+            await record_messages(messages)
+        except PyMongoError as e:
+            print(f"Failed to update inboxes for {len(messages)} chat messages: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "write_behind": self._task is not None,
+            "queued": len(self._pending),
+            "batches_written": self.batches_written,
+            "messages_written": self.messages_written,
+            "messages_failed": self.messages_failed
+        }
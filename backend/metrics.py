@@ -0,0 +1,308 @@
+"""Request, database and password-hashing metrics in Prometheus format.
+
+* MetricsMiddleware times every HTTP request by route template and status
+  and counts requests in flight.
+* MongoCommandTimer, a pymongo CommandListener, times every database
+  command by collection and command name.
+* Hashing jobs on the password pool are timed in backend.auth.
+
+While a request is handled, the Mongo and password time spent on its
+behalf is summed up, so a slow route can be broken down into database,
+bcrypt and everything else (validation, serialization, the handler).
+
+Stats the app already keeps (WebSocket connections, caches, the chat
+writer) are read when /metrics is scraped instead of on every event, so
+they cost nothing in between.
+
+Metrics are off by default; with METRICS_ENABLED off the middleware and
+the listener are not installed at all. The numbers include the cache and
+WebSocket stats that /api/*/stats only shows admins, so /metrics is only
+served to scrapers sending ``Authorization: Bearer <METRICS_TOKEN>``.
+"""
+import bisect
+import secrets
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from decouple import config
+from pymongo import monitoring
+
+METRICS_ENABLED = config('METRICS_ENABLED', default=False, cast=bool)
+# Bearer token scrapers must send; without one /metrics refuses everyone
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Starlette appends the charset
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        # Observations arrive from the event loop and from pymongo's threads
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, help, labels)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self.values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}"
+            for labels, value in values
+        ]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+        # Per label set: a count per bucket (the last one open-ended) and the sum
+        self.values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self.values.get(labels) or self.values.setdefault(
+                labels, ([0] * (len(self.buckets) + 1), [0.0])
+            )
+            counts[index] += 1
+            total[0] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = [(labels, list(counts), total[0]) for labels, (counts, total) in self.values.items()]
+        lines = self.header()
+        names = self.labels + ("le",)
+        for labels, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(names, labels + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, labels)} {total!r}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+        self.collectors: List[Callable[[], Iterable[str]]] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_stats(self, prefix: str, stats: Callable[[], dict], counters: Iterable[str] = ()):
+        """Export the numbers of a stats() dict when scraped, as gauges or,
+        for the keys in counters, as counters"""
+        counters = set(counters)
+
+        def collect():
+            lines = []
+            for key, value in stats().items():
+                if isinstance(value, bool):
+                    value = int(value)
+                if not isinstance(value, (int, float)):
+                    continue
+                if key in counters:
+                    name, kind = f"{prefix}_{key}_total", "counter"
+                else:
+                    name, kind = f"{prefix}_{key}", "gauge"
+                lines += [f"# TYPE {name} {kind}", f"{name} {_format_value(value)}"]
+            return lines
+
+        self.collectors.append(collect)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render()
+        for collect in self.collectors:
+            lines += collect()
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "p2p_http_requests_total", "HTTP requests by route and status", ("method", "route", "status")
+))
+http_request_seconds = registry.register(Histogram(
+    "p2p_http_request_duration_seconds", "Time until the response was sent", ("method", "route")
+))
+http_in_flight = registry.register(Gauge(
+    "p2p_http_requests_in_flight", "HTTP requests being handled"
+))
+http_phase_seconds = registry.register(Histogram(
+    "p2p_http_request_phase_seconds",
+    "Time a request spent waiting on Mongo or on password hashing", ("route", "phase")
+))
+mongo_command_seconds = registry.register(Histogram(
+    "p2p_mongo_command_duration_seconds", "Mongo commands by collection", ("collection", "command")
+))
+mongo_command_failures = registry.register(Counter(
+    "p2p_mongo_command_failures_total", "Mongo commands that failed", ("collection", "command")
+))
+password_job_seconds = registry.register(Histogram(
+    "p2p_password_job_duration_seconds",
+    "bcrypt jobs on the password pool, including the wait for a worker", ("operation",)
+))
+
+# Seconds spent per phase by the request being handled
+_request_phases: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_phases", default=None)
+_phases_lock = threading.Lock()
+
+
+def add_request_time(phase: str, seconds: float):
+    """Attribute time to the current request, if there is one"""
+    phases = _request_phases.get()
+    if phases is not None:
+        # Commands of one request can finish on several threads at once
+        with _phases_lock:
+            phases[phase] = phases.get(phase, 0.0) + seconds
+
+
+def scrape_allowed(token: Optional[str]) -> bool:
+    """Whether a scrape presenting this bearer token may read /metrics"""
+    return bool(METRICS_TOKEN) and token is not None and secrets.compare_digest(
+        token.encode(), METRICS_TOKEN.encode()
+    )
+
+
+def record_password_job(operation: str, seconds: float):
+    if METRICS_ENABLED:
+        password_job_seconds.observe(seconds, operation)
+        add_request_time("password", seconds)
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing HTTP requests by route template.
+
+    Requests that match no route share one label, so scanners probing
+    random paths cannot blow up the number of series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+        finished = None
+
+        async def send_and_time(message):
+            nonlocal status, finished
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body" and not message.get("more_body"):
+                finished = time.perf_counter()
+            await send(message)
+
+        phases: Dict[str, float] = {}
+        token = _request_phases.set(phases)
+        http_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_and_time)
+        finally:
+            # Background tasks run after the body is sent; they do not count
+            elapsed = (finished or time.perf_counter()) - started
+            http_in_flight.dec()
+            _request_phases.reset(token)
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            method = scope["method"]
+            http_requests.inc(method, path, str(status))
+            http_request_seconds.observe(elapsed, method, path)
+            for phase, seconds in phases.items():
+                http_phase_seconds.observe(seconds, path, phase)
+
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """Times database commands by collection and command name.
+
+    Callbacks run on motor's executor threads, in a copy of the calling
+    task's context, so the time is also added to the request it served.
+    """
+
+    def __init__(self):
+        # Collections of commands in progress; succeeded events do not carry one
+        self._collections: Dict[Tuple, str] = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            collection = event.command.get("collection")
+        self._collections[(event.connection_id, event.request_id)] = (
+            collection if isinstance(collection, str) else ""
+        )
+
+    def _finish(self, event) -> Tuple[str, str]:
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        seconds = event.duration_micros / 1e6
+        mongo_command_seconds.observe(seconds, collection, event.command_name)
+        add_request_time("mongo", seconds)
+        return collection, event.command_name
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        mongo_command_failures.inc(*self._finish(event))
+
+
+def mongo_event_listeners() -> list:
+    """Listeners to create the Mongo client with"""
+    return [MongoCommandTimer()] if METRICS_ENABLED else []
@@ -0,0 +1,43 @@
+"""Convert item calendars from available_dates string lists to merged ranges.
+
+    python -m backend.migrations.availability_ranges
+"""
+import asyncio
+
+from fastapi import HTTPException
+from pymongo import UpdateOne
+
+from backend.availability import dates_to_ranges
+from backend.database import items_collection
+
+BATCH_SIZE = 1000
+
+
+async def main():
+    migrated = failed = 0
+    batch = []
+    cursor = items_collection.find(
+        {"available_dates": {"$exists": True}},
+        {"_id": 0, "id": 1, "available_dates": 1}
+    )
+    async for item in cursor:
+        try:
+            ranges = dates_to_ranges(item["available_dates"])
+        except HTTPException:
+            print(f"Item {item['id']}: unparsable available_dates, left unchanged")
+            failed += 1
+            continue
+        batch.append(UpdateOne(
+            {"id": item["id"]},
+            {"$set": {"available_ranges": ranges}, "$unset": {"available_dates": ""}}
+        ))
+        if len(batch) == BATCH_SIZE:
+            migrated += (await items_collection.bulk_write(batch, ordered=False)).modified_count
+            batch = []
+    if batch:
+        migrated += (await items_collection.bulk_write(batch, ordered=False)).modified_count
+    print(f"Items migrated: {migrated}, failed: {failed}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,43 @@
+"""Store the item owner on bookings created before bookings carried owner_id.
+
+get_bookings finds an owner's bookings through owner_id, so bookings without
+it are invisible to their owner until this has run. The backfill is a single
+aggregation that looks up each booking's item and $merges owner_id back.
+
+    python -m backend.migrations.backfill_booking_owner
+"""
+import asyncio
+
+from backend.database import bookings_collection, items_collection, create_indexes
+
+
+async def main():
+    # $merge on "id" needs the unique index
+    await create_indexes()
+    missing = await bookings_collection.count_documents({"owner_id": {"$exists": False}})
+
+    await bookings_collection.aggregate([
+        {"$match": {"owner_id": {"$exists": False}}},
+        {"$lookup": {
+            "from": items_collection.name,
+            "localField": "item_id",
+            "foreignField": "id",
+            "pipeline": [{"$project": {"_id": 0, "owner_id": 1}}],
+            "as": "item"
+        }},
+        {"$unwind": "$item"},
+        {"$project": {"_id": 0, "id": 1, "owner_id": "$item.owner_id"}},
+        {"$merge": {
+            "into": bookings_collection.name,
+            "on": "id",
+            "whenMatched": "merge",
+            "whenNotMatched": "discard"
+        }}
+    ]).to_list(length=None)
+
+    remaining = await bookings_collection.count_documents({"owner_id": {"$exists": False}})
+    print(f"Bookings backfilled: {missing - remaining}, without an item: {remaining}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,32 @@
+"""Add the start/end date interval to bookings created before they had one.
+
+Overlap checks only look at the start/end fields, so existing bookings must
+be backfilled from their start_date/end_date strings. end is exclusive: the
+day after end_date.
+
+    python -m backend.migrations.booking_date_intervals
+"""
+import asyncio
+
+from backend.database import bookings_collection, create_indexes
+
+
+def _date(field: str) -> dict:
+    return {"$dateFromString": {"dateString": f"${field}", "format": "%Y-%m-%d", "onError": None}}
+
+
+async def main():
+    await create_indexes()
+    result = await bookings_collection.update_many(
+        {"start": {"$exists": False}},
+        [{"$set": {
+            "start": _date("start_date"),
+            "end": {"$dateAdd": {"startDate": _date("end_date"), "unit": "day", "amount": 1}}
+        }}]
+    )
+    unparsable = await bookings_collection.count_documents({"$or": [{"start": None}, {"end": None}]})
+    print(f"Bookings backfilled: {result.modified_count}, with unparsable dates: {unparsable}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
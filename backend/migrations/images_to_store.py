@@ -0,0 +1,64 @@
+"""Move base64 images embedded in item and user documents into the image store.
+
+Documents are rewritten to hold ``/api/images/<sha256>`` references instead.
+Safe to re-run: stored references and http(s) URLs are left untouched, and
+identical images are only stored once.
+
+    python -m backend.migrations.images_to_store
+"""
+import asyncio
+import re
+
+from fastapi import HTTPException
+
+from backend.database import items_collection, users_collection
+from backend.images import IMAGE_URL_PREFIX, store_inline_image, store_inline_images
+
+_REFERENCE = re.compile("^" + re.escape(IMAGE_URL_PREFIX))
+
+
+async def migrate_items():
+    migrated = failed = 0
+    cursor = items_collection.find(
+        {"images": {"$elemMatch": {"$not": _REFERENCE}}},
+        {"_id": 0, "id": 1, "images": 1}
+    )
+    async for item in cursor:
+        try:
+            images = await store_inline_images(item["images"])
+        except HTTPException as e:
+            print(f"Item {item['id']}: {e.detail}")
+            failed += 1
+            continue
+        await items_collection.update_one({"id": item["id"]}, {"$set": {"images": images}})
+        migrated += 1
+    print(f"Items migrated: {migrated}, failed: {failed}")
+
+
+async def migrate_users():
+    migrated = failed = 0
+    cursor = users_collection.find(
+        {"profile_image": {"$type": "string", "$nin": [""], "$not": _REFERENCE}},
+        {"_id": 0, "id": 1, "profile_image": 1}
+    )
+    async for user in cursor:
+        try:
+            profile_image = await store_inline_image(user["profile_image"])
+        except HTTPException as e:
+            print(f"User {user['id']}: {e.detail}")
+            failed += 1
+            continue
+        await users_collection.update_one(
+            {"id": user["id"]}, {"$set": {"profile_image": profile_image}}
+        )
+        migrated += 1
+    print(f"Users migrated: {migrated}, failed: {failed}")
+
+
+async def main():
+    await migrate_items()
+    await migrate_users()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,29 @@
+"""Store conversation_id on messages written before messages carried it.
+
+get_messages reads a conversation through conversation_id, so older
+messages do not show up in their conversation until this has run. The
+id is the two participants' ids sorted and joined with ":", computed by a
+single update pipeline on the server.
+
+    python -m backend.migrations.message_conversations
+"""
+import asyncio
+
+from backend.database import messages_collection, create_indexes
+
+
+async def main():
+    await create_indexes()
+    result = await messages_collection.update_many(
+        {"conversation_id": {"$exists": False}},
+        [{"$set": {"conversation_id": {"$cond": [
+            {"$lt": ["$sender_id", "$receiver_id"]},
+            {"$concat": ["$sender_id", ":", "$receiver_id"]},
+            {"$concat": ["$receiver_id", ":", "$sender_id"]}
+        ]}}}]
+    )
+    print(f"Messages backfilled: {result.modified_count}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
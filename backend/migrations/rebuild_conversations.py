@@ -0,0 +1,66 @@
+"""Rebuild every inbox entry in the conversations collection from messages.
+
+Inbox entries are maintained as messages are stored and read; this fills
+them in for messages written before the inbox existed, and repairs entries
+left stale by a failed update. A single aggregation groups the messages by
+user and conversation partner and $merges the result.
+
+    python -m backend.migrations.rebuild_conversations
+"""
+import asyncio
+
+from backend.conversations import PREVIEW_LENGTH
+from backend.database import conversations_collection, messages_collection, create_indexes
+
+
+async def main():
+    # $merge on (user_id, other_user_id) needs the unique index
+    await create_indexes()
+    await messages_collection.aggregate([
+        {"$sort": {"created_at": 1, "id": 1}},
+        {"$project": {
+            "_id": 0, "id": 1, "sender_id": 1, "content": 1, "created_at": 1,
+            "sides": [
+                {"user_id": "$sender_id", "other_user_id": "$receiver_id", "unread": 0},
+                {"user_id": "$receiver_id", "other_user_id": "$sender_id",
+                 "unread": {"$cond": ["$is_read", 0, 1]}}
+            ]
+        }},
+        {"$unwind": "$sides"},
+        {"$group": {
+            "_id": {"user_id": "$sides.user_id", "other_user_id": "$sides.other_user_id"},
+            "last_message": {"$last": {
+                "id": "$id",
+                "sender_id": "$sender_id",
+                "content": {"$substrCP": ["$content", 0, PREVIEW_LENGTH]},
+                "created_at": "$created_at"
+            }},
+            "unread_count": {"$sum": "$sides.unread"}
+        }},
+        {"$project": {
+            "_id": 0,
+            "user_id": "$_id.user_id",
+            "other_user_id": "$_id.other_user_id",
+            "conversation_id": {"$cond": [
+                {"$lt": ["$_id.user_id", "$_id.other_user_id"]},
+                {"$concat": ["$_id.user_id", ":", "$_id.other_user_id"]},
+                {"$concat": ["$_id.other_user_id", ":", "$_id.user_id"]}
+            ]},
+            "last_message": 1,
+            "last_message_at": "$last_message.created_at",
+            "unread_count": 1
+        }},
+        {"$merge": {
+            "into": conversations_collection.name,
+            "on": ["user_id", "other_user_id"],
+            "whenMatched": "replace",
+            "whenNotMatched": "insert"
+        }}
+    ], allowDiskUse=True).to_list(length=None)
+
+    total = await conversations_collection.count_documents({})
+    print(f"Inbox entries: {total}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
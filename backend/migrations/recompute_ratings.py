@@ -0,0 +1,70 @@
+"""Recompute item and owner rating aggregates from the reviews collection.
+
+create_review keeps rating, rating_sum and total_reviews up to date
+incrementally; this job rebuilds them in bulk with aggregation pipelines
+that $merge straight into items and users, e.g. after restoring reviews or
+to backfill rating_sum on documents created before it existed.
+
+    python -m backend.migrations.recompute_ratings
+"""
+import asyncio
+from datetime import datetime
+
+from backend.database import items_collection, reviews_collection, users_collection, create_indexes
+
+
+def _aggregate_into(target: str, repaired_at: datetime) -> list:
+    """Stages turning {_id: target id, rating_sum, total_reviews} groups into
+    rating fields merged into the target collection"""
+    return [
+        {"$project": {
+            "_id": 0,
+            "id": "$_id",
+            "rating_sum": 1,
+            "total_reviews": 1,
+            "rating": {"$divide": ["$rating_sum", "$total_reviews"]},
+            "ratings_repaired_at": repaired_at
+        }},
+        {"$merge": {"into": target, "on": "id", "whenMatched": "merge", "whenNotMatched": "discard"}}
+    ]
+
+
+async def reset_unreviewed(collection, repaired_at: datetime):
+    """Zero the aggregates of documents that no longer have any review"""
+    result = await collection.update_many(
+        {"ratings_repaired_at": {"$ne": repaired_at}, "total_reviews": {"$ne": 0}},
+        {"$set": {"rating": 0.0, "rating_sum": 0, "total_reviews": 0}}
+    )
+    return result.modified_count
+
+
+async def main():
+    # $merge on "id" needs the unique indexes
+    await create_indexes()
+    repaired_at = datetime.utcnow()
+
+    await reviews_collection.aggregate([
+        {"$group": {"_id": "$item_id", "rating_sum": {"$sum": "$rating"}, "total_reviews": {"$sum": 1}}},
+        *_aggregate_into(items_collection.name, repaired_at)
+    ]).to_list(length=None)
+    reset = await reset_unreviewed(items_collection, repaired_at)
+    print(f"Item ratings recomputed, {reset} items without reviews reset")
+
+    await reviews_collection.aggregate([
+        {"$lookup": {
+            "from": items_collection.name,
+            "localField": "item_id",
+            "foreignField": "id",
+            "pipeline": [{"$project": {"_id": 0, "owner_id": 1}}],
+            "as": "item"
+        }},
+        {"$unwind": "$item"},
+        {"$group": {"_id": "$item.owner_id", "rating_sum": {"$sum": "$rating"}, "total_reviews": {"$sum": 1}}},
+        *_aggregate_into(users_collection.name, repaired_at)
+    ]).to_list(length=None)
+    reset = await reset_unreviewed(users_collection, repaired_at)
+    print(f"Owner ratings recomputed, {reset} owners without reviews reset")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
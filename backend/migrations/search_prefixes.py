@@ -0,0 +1,41 @@
+"""Store typeahead prefixes on items created before search existed.
+
+Full-word search works on every item through the text index once it is
+built; prefix search (?q=...&prefix=true) only finds items with
+search_prefixes.
+
+    python -m backend.migrations.search_prefixes
+"""
+import asyncio
+
+from pymongo import UpdateOne
+
+from backend.database import items_collection, create_indexes
+from backend.search import search_prefixes
+
+BATCH_SIZE = 1000
+
+
+async def main():
+    await create_indexes()
+    migrated = 0
+    batch = []
+    cursor = items_collection.find(
+        {"search_prefixes": {"$exists": False}},
+        {"_id": 0, "id": 1, "title": 1}
+    )
+    async for item in cursor:
+        batch.append(UpdateOne(
+            {"id": item["id"]},
+            {"$set": {"search_prefixes": search_prefixes(item.get("title") or "")}}
+        ))
+        if len(batch) == BATCH_SIZE:
+            migrated += (await items_collection.bulk_write(batch, ordered=False)).modified_count
+            batch = []
+    if batch:
+        migrated += (await items_collection.bulk_write(batch, ordered=False)).modified_count
+    print(f"Items migrated: {migrated}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
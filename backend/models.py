@@ -16,6 +16,11 @@ class ItemCategory(str, Enum):
     VEHICLES = "vehicles"
     OTHER = "other"
 
+class ImageVariant(str, Enum):
+    THUMB = "thumb"
+    CARD = "card"
+    FULL = "full"
+
 class BookingStatus(str, Enum):
     PENDING = "pending"
     APPROVED = "approved"
@@ -24,6 +29,10 @@ class BookingStatus(str, Enum):
     COMPLETED = "completed"
     CANCELLED = "cancelled"
 
+class BookingRole(str, Enum):
+    RENTER = "renter"
+    OWNER = "owner"
+
 class PaymentStatus(str, Enum):
     PENDING = "pending"
     COMPLETED = "completed"
@@ -46,7 +55,7 @@ class UserBase(BaseModel):
     full_name: str = Field(..., min_length=1, max_length=100)
     phone: Optional[str] = None
     bio: Optional[str] = None
-    profile_image: Optional[str] = None  # Base64 encoded image
+    profile_image: Optional[str] = None  # Image URL; base64 uploads are moved to the image store
     location: Optional[Location] = None
 
 class UserCreate(UserBase):
@@ -74,7 +83,7 @@ class ItemBase(BaseModel):
     description: str = Field(..., min_length=1, max_length=2000)
     category: ItemCategory
     price_per_day: float = Field(..., gt=0)
-    images: List[str] = Field(default=[], description="Base64 encoded images")
+    images: List[str] = Field(default=[], description="Image URLs; base64 uploads are moved to the image store")
     location: Location
     available_dates: List[str] = Field(default=[], description="Available dates in YYYY-MM-DD format")
 
@@ -87,9 +96,34 @@ class ItemResponse(ItemBase):
     is_available: bool = True
     rating: float = 0.0
     total_reviews: int = 0
+    distance_km: Optional[float] = None  # Set by geo searches only
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
+class ItemSummary(BaseModel):
+    """Item card returned by list endpoints; see ITEM_SUMMARY_EXTRA_FIELDS"""
+    id: str
+    owner_id: str
+    title: str
+    category: ItemCategory
+    price_per_day: float
+    images: List[str] = Field(default=[], description="Cover image only unless requested with fields=images")
+    location: Location
+    is_available: bool = True
+    rating: float = 0.0
+    total_reviews: int = 0
+    distance_km: Optional[float] = None
+    # Text search score, discounted by distance when searching near a point
+    relevance: Optional[float] = None
+    created_at: datetime
+    # Only returned when requested with fields=
+    description: Optional[str] = None
+    available_dates: Optional[List[str]] = None
+    updated_at: Optional[datetime] = None
+
+# Fields of ItemSummary left out of list responses unless asked for
+ITEM_SUMMARY_EXTRA_FIELDS = {"description", "available_dates", "images", "updated_at"}
+
 class ItemUpdate(BaseModel):
     title: Optional[str] = None
     description: Optional[str] = None
@@ -114,10 +148,29 @@ class BookingCreate(BookingBase):
 class BookingResponse(BookingBase):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     renter_id: str
+    owner_id: Optional[str] = None
     status: BookingStatus = BookingStatus.PENDING
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
+class BookingSummary(BaseModel):
+    """Booking row returned by list endpoints; see BOOKING_SUMMARY_EXTRA_FIELDS"""
+    id: str
+    item_id: str
+    renter_id: str
+    owner_id: Optional[str] = None
+    start_date: str
+    end_date: str
+    total_amount: float
+    status: BookingStatus = BookingStatus.PENDING
+    created_at: datetime
+    # Only returned when requested with fields=
+    message: Optional[str] = None
+    updated_at: Optional[datetime] = None
+
+# Fields of BookingSummary left out of list responses unless asked for
+BOOKING_SUMMARY_EXTRA_FIELDS = {"message", "updated_at"}
+
 class BookingUpdate(BaseModel):
     status: Optional[BookingStatus] = None
     message: Optional[str] = None
@@ -148,10 +201,30 @@ class MessageCreate(MessageBase):
 
 class MessageResponse(MessageBase):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    conversation_id: Optional[str] = None
     sender_id: str
     is_read: bool = False
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+class ConversationMessage(BaseModel):
+    id: str
+    sender_id: str
+    content: str
+    created_at: datetime
+
+class ConversationResponse(BaseModel):
+    conversation_id: str
+    other_user_id: str
+    last_message: Optional[ConversationMessage] = None
+    last_message_at: Optional[datetime] = None
+    unread_count: int = 0
+
+class MarkReadRequest(BaseModel):
+    # Read up to and including this message, or everything sent before a time;
+    # with neither, the whole conversation is read
+    up_to: Optional[str] = None
+    before: Optional[datetime] = None
+
 # Payment Models
 class PaymentBase(BaseModel):
     booking_id: str
@@ -176,6 +249,7 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     username: Optional[str] = None
+    user_id: Optional[str] = None
 
 class LoginRequest(BaseModel):
     email: EmailStr
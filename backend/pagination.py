@@ -0,0 +1,61 @@
+"""Opaque cursors for keyset pagination.
+
+A cursor is the URL-safe base64 encoding of the sort key of the last row a
+client has seen. List endpoints return the cursor for the next page in the
+``X-Next-Cursor`` response header and accept it back as ``?cursor=``.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import HTTPException
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Newest first, with the id breaking ties between equal timestamps
+RECENT_SORT = [("created_at", -1), ("id", -1)]
+
+
+def encode_cursor(values: dict) -> str:
+    """Encode a sort key as an opaque cursor string"""
+    raw = json.dumps(values, separators=(",", ":"), default=lambda v: v.isoformat())
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, dict):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def recent_cursor_filter(cursor: str) -> dict:
+    """Query clause selecting the rows after the cursor in RECENT_SORT order"""
+    values = decode_cursor(cursor)
+    try:
+        created_at = datetime.fromisoformat(values["created_at"])
+        last_id = values["id"]
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {"$or": [
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, "id": {"$lt": last_id}}
+    ]}
+
+
+def recent_next_cursor(rows: List[dict], limit: int) -> Optional[str]:
+    """Cursor for the page after rows, or None when rows was the last page.
+
+    rows must have been fetched with limit + 1 so a following page can be
+    detected without a count query.
+    """
+    if limit <= 0 or len(rows) <= limit:
+        return None
+    last = rows[limit - 1]
+    return encode_cursor({"created_at": last["created_at"], "id": last["id"]})
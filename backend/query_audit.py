@@ -0,0 +1,253 @@
+"""Index coverage check for the queries the endpoints issue.
+
+Runs explain on a representative of every query shape the API sends to
+Mongo and prints the winning plan of each. It exits with status 1 when a
+shape is answered by a collection scan (COLLSCAN) or has to sort in
+memory (a blocking SORT stage), so it can gate CI. Shapes ranked by text
+score are allowed to sort: a text score cannot be indexed, and those
+queries are bounded by their limit.
+
+Compound filters, cursor clauses and the $geoNear pipeline are built by
+the same helpers and sort constants the handlers call (availability,
+conversations, pagination, search), so a change to one is audited as it
+ships. A new query in a handler needs a shape here, and one with more
+than equality matches needs a helper.
+
+    python -m backend.query_audit [--output plans.json]
+
+It creates the indexes first. On an empty database the planner only shows
+which indexes are eligible; against seeded data (benchmarks.load.seed)
+it shows the plans production would pick.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from backend.availability import bookings_filter, calendar_filter, conflict_filter
+from backend.conversations import (
+    HISTORY_NEWEST_FIRST, HISTORY_SORT, INBOX_SORT, conversation_id, inbox_cursor_filter,
+    position_filter, unread_filter
+)
+from backend.database import create_indexes, database
+from backend.models import BookingRole, BookingStatus
+from backend.pagination import RECENT_SORT, encode_cursor, recent_cursor_filter
+from backend.search import (
+    TEXT_SCORE, geo_near_options, geo_near_pipeline, search_filter, within_radius
+)
+
+# Stages that mean the query reads every document or sorts in memory;
+# SORT_MERGE merges index-ordered inputs and does not block
+COLLSCAN = "COLLSCAN"
+BLOCKING_SORT = "SORT"
+
+
+class QueryShape:
+    def __init__(self, name: str, command: dict, sorts_by_score: bool = False):
+        self.name = name
+        self.command = command
+        self.sorts_by_score = sorts_by_score
+
+    @property
+    def collection(self) -> str:
+        return next(iter(self.command.values()))
+
+
+def find(name: str, collection: str, filter: dict, sort: Optional[list] = None,
+         limit: int = 21, projection: Optional[dict] = None, sorts_by_score: bool = False) -> QueryShape:
+    command = {"find": collection, "filter": filter, "limit": limit}
+    if sort:
+        command["sort"] = dict(sort)
+    if projection:
+        command["projection"] = projection
+    return QueryShape(name, command, sorts_by_score)
+
+
+def aggregate(name: str, collection: str, pipeline: list, limit: int = 21) -> QueryShape:
+    return QueryShape(name, {
+        "aggregate": collection, "pipeline": pipeline + [{"$limit": limit}], "cursor": {}
+    })
+
+
+def update(name: str, collection: str, filter: dict, multi: bool = False) -> QueryShape:
+    return QueryShape(name, {"update": collection, "updates": [
+        {"q": filter, "u": {"$set": {"audited_at": datetime.utcnow()}}, "multi": multi}
+    ]})
+
+
+def query_shapes() -> List[QueryShape]:
+    """One representative query per access path, named after the caller"""
+    user, other, item = str(uuid.uuid4()), str(uuid.uuid4()), str(uuid.uuid4())
+    now = datetime.utcnow()
+    recent_cursor = recent_cursor_filter(encode_cursor({"created_at": now, "id": item}))
+    conversation = conversation_id(user, other)
+    start, end = now, now + timedelta(days=3)
+    inbox_cursor = inbox_cursor_filter(encode_cursor({"last_message_at": now, "other_user_id": other}))
+    geo_cursor = {"distance": 2500.0, "id": item}
+    geo_page = geo_near_options(-122.4194, 37.7749, {"is_available": True}, 10, geo_cursor)
+
+    return [
+        # Auth
+        find("login, register: user by email", "users", {"email": "user@example.com"}, limit=1),
+        find("register: username taken", "users", {"username": "user"}, limit=1),
+        find("current user: user by id", "users", {"id": user}, limit=1),
+        update("ratings, profile, deactivate: user by id", "users", {"id": user}),
+
+        # Items
+        find("GET /api/items", "items", {"is_available": True}, RECENT_SORT),
+        find("GET /api/items next page", "items", {"is_available": True, **recent_cursor}, RECENT_SORT),
+        find("GET /api/items?category", "items", {"is_available": True, "category": "tools"}, RECENT_SORT),
+        find("GET /api/items?available_from", "items",
+             {"is_available": True, **calendar_filter(start, end)}, RECENT_SORT),
+        find("GET /api/items?q", "items", {"is_available": True, **search_filter("cordless drill", False)},
+             [("relevance", TEXT_SCORE), ("created_at", -1), ("id", -1)],
+             projection={"relevance": TEXT_SCORE}, sorts_by_score=True),
+        find("GET /api/items?q&lat&lon&max_distance", "items",
+             {"is_available": True, **search_filter("drill", False),
+              **within_radius(-122.4194, 37.7749, 10)},
+             [("relevance", TEXT_SCORE)], limit=500, projection={"relevance": TEXT_SCORE},
+             sorts_by_score=True),
+        find("GET /api/items?q&prefix (one word)", "items",
+             {"is_available": True, **search_filter("dri", True)}, RECENT_SORT),
+        find("GET /api/items?q&prefix&category", "items",
+             {"is_available": True, "category": "tools", **search_filter("dri", True)}, RECENT_SORT),
+        aggregate("GET /api/items?lat&lon", "items", geo_near_pipeline(
+            geo_near_options(-122.4194, 37.7749, {"is_available": True}, 10)
+        )),
+        aggregate("GET /api/items?lat&lon next page", "items", geo_near_pipeline(geo_page, geo_cursor)),
+        aggregate("GET /api/items?lat&lon tied distances", "items", geo_near_pipeline(
+            dict(geo_page, maxDistance=geo_page["minDistance"]), geo_cursor
+        ) + [{"$sort": {"id": 1}}]),
+        find("GET /api/items/my", "items", {"owner_id": user}, RECENT_SORT, limit=101),
+        find("item by id", "items", {"id": item}, limit=1),
+        update("update, rate, claim: item by id", "items", {"id": item, "booking_version": 3}),
+
+        # Bookings
+        find("booking conflict check", "bookings", conflict_filter(item, start, end, item), limit=1),
+        find("GET /api/bookings?role=renter", "bookings",
+             bookings_filter(user, BookingRole.RENTER, after=recent_cursor), RECENT_SORT),
+        find("GET /api/bookings?role=owner&status", "bookings",
+             bookings_filter(user, BookingRole.OWNER, BookingStatus.PENDING), RECENT_SORT),
+        find("GET /api/bookings", "bookings", bookings_filter(user), RECENT_SORT),
+        find("POST /api/reviews: completed booking", "bookings",
+             {"item_id": item, "renter_id": user, "status": BookingStatus.COMPLETED}, limit=1),
+        find("booking by id", "bookings", {"id": item}, limit=1),
+
+        # Reviews
+        find("GET /api/reviews/{item_id}", "reviews", {"item_id": item}, limit=0),
+
+        # Messages and inbox
+        find("GET /api/messages", "messages", {"conversation_id": conversation},
+             HISTORY_NEWEST_FIRST, limit=50),
+        find("GET /api/messages?before", "messages",
+             {"conversation_id": conversation, **position_filter(now, item, "$lt")},
+             HISTORY_NEWEST_FIRST, limit=50),
+        find("GET /api/messages?since", "messages",
+             {"conversation_id": conversation, **position_filter(now, item, "$gt")},
+             HISTORY_SORT, limit=50),
+        find("message anchor", "messages", {"id": item, "conversation_id": conversation}, limit=1),
+        update("PUT /api/messages/{id}/read", "messages",
+               {"id": item, "receiver_id": user, "is_read": False}),
+        update("mark conversation read", "messages",
+               unread_filter(user, other, {"id": item, "created_at": now}), multi=True),
+        update("mark conversation read before", "messages",
+               unread_filter(user, other, before=now), multi=True),
+        find("GET /api/conversations", "conversations", {"user_id": user}, INBOX_SORT),
+        find("GET /api/conversations next page", "conversations",
+             {"user_id": user, **inbox_cursor}, INBOX_SORT),
+        update("inbox entry", "conversations", {"user_id": user, "other_user_id": other}),
+
+        # Images
+        find("image variants", "image_variants", {"image_id": item}, limit=1),
+    ]
+
+
+def winning_stages(explain) -> List[dict]:
+    """Every stage of the winning plans in an explain result, outermost first.
+
+    Aggregations nest a query planner per cursor stage, so winning plans
+    are looked for anywhere in the result.
+    """
+    stages = []
+
+    def collect_plan(plan):
+        if isinstance(plan, dict):
+            if "stage" in plan:
+                stages.append(plan)
+            for value in plan.values():
+                collect_plan(value)
+        elif isinstance(plan, list):
+            for value in plan:
+                collect_plan(value)
+
+    def find_plans(value):
+        if isinstance(value, dict):
+            for key, item in value.items():
+                if key == "winningPlan":
+                    collect_plan(item)
+                elif key != "rejectedPlans":
+                    find_plans(item)
+        elif isinstance(value, list):
+            for item in value:
+                find_plans(item)
+
+    find_plans(explain)
+    return stages
+
+
+def plan_summary(stages: List[dict]) -> str:
+    return " <- ".join(
+        f"{stage['stage']}({stage['indexName']})" if "indexName" in stage else stage["stage"]
+        for stage in stages
+    )
+
+
+def problems(shape: QueryShape, stages: List[dict]) -> List[str]:
+    names = {stage["stage"] for stage in stages}
+    found = []
+    if COLLSCAN in names:
+        found.append("collection scan")
+    if BLOCKING_SORT in names and not shape.sorts_by_score:
+        found.append("in-memory sort")
+    return found
+
+
+async def audit(shape: QueryShape) -> dict:
+    explain = await database.command("explain", shape.command, verbosity="queryPlanner")
+    stages = winning_stages(explain)
+    return {
+        "collection": shape.collection,
+        "command": shape.command,
+        "plan": plan_summary(stages),
+        "indexes": sorted({stage["indexName"] for stage in stages if "indexName" in stage}),
+        "problems": problems(shape, stages)
+    }
+
+
+async def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Fail on query shapes without index coverage")
+    parser.add_argument("--output", help="write the winning plans as JSON here")
+    args = parser.parse_args(argv)
+
+    await create_indexes()
+    results = {}
+    for shape in query_shapes():
+        result = results[shape.name] = await audit(shape)
+        status = "FAIL" if result["problems"] else "ok"
+        print(f"{status:<4} {shape.collection:<14} {shape.name:<44} {result['plan']}")
+        for problem in result["problems"]:
+            print(f"     {problem}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, default=str)
+    failed = sum(1 for result in results.values() if result["problems"])
+    print(f"{len(results)} query shapes, {failed} without index coverage")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
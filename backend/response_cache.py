@@ -0,0 +1,287 @@
+"""Read-through cache of rendered GET responses with conditional requests.
+
+Item details, item listings and review lists are read far more often than
+they change, so their rendered bodies are cached and served without a
+database query until a write path invalidates them. Every cached response
+carries a strong ETag (a hash of the body) and, where the resource has one,
+a Last-Modified from its updated_at, and requests with a matching
+If-None-Match or If-Modified-Since get a 304 without a body.
+
+Single resources are invalidated by key. Listings depend on every item, so
+their keys include a generation number that any item write bumps; entries
+of older generations are never read again and age out. A response rendered
+while its key was invalidated is served but not stored, so a write that
+lands during a render cannot be masked by the stale body.
+
+Backends, picked with RESPONSE_CACHE_BACKEND:
+
+* ``memory``: a TTLCache per worker. Invalidation only reaches the worker
+  that handled the write; other workers serve stale entries for at most
+  RESPONSE_CACHE_TTL_SECONDS.
+* ``redis``: shared by all workers, so invalidation is immediate everywhere.
+"""
+import hashlib
+import json
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from decouple import config
+from fastapi import Request, Response
+
+from backend.cache import TTLCache
+
+RESPONSE_CACHE_ENABLED = config('RESPONSE_CACHE_ENABLED', default=True, cast=bool)
+RESPONSE_CACHE_BACKEND = config('RESPONSE_CACHE_BACKEND', default='memory')
+RESPONSE_CACHE_TTL_SECONDS = config('RESPONSE_CACHE_TTL_SECONDS', default=30, cast=float)
+RESPONSE_CACHE_MAX_ENTRIES = config('RESPONSE_CACHE_MAX_ENTRIES', default=10000, cast=int)
+# Larger bodies are served with validators but not kept in memory
+RESPONSE_CACHE_MAX_BODY_BYTES = config('RESPONSE_CACHE_MAX_BODY_BYTES', default=256 * 1024, cast=int)
+REDIS_URL = config('REDIS_URL', default='redis://localhost:6379/0')
+REDIS_RESPONSE_PREFIX = config('REDIS_RESPONSE_PREFIX', default='p2p:responses:')
+
+# Lifetime of the per-key invalidation counters in Redis, far longer than any render
+REDIS_VERSION_TTL_MS = 60 * 60 * 1000
+
+# Stores an entry only if its key was not invalidated since the render started
+REDIS_SET_IF_VERSION = """
+if tonumber(redis.call('get', KEYS[2]) or '0') == tonumber(ARGV[2]) then
+    redis.call('set', KEYS[1], ARGV[1], 'PX', ARGV[3])
+end
+"""
+
+# Stored with the body so cached listings keep their pagination cursor
+CACHED_HEADERS = ("x-next-cursor",)
+
+
+class CachedResponse:
+    def __init__(self, body: bytes, last_modified: Optional[datetime] = None,
+                 headers: Optional[Dict[str, str]] = None, etag: Optional[str] = None):
+        self.body = body
+        self.etag = etag or '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        # HTTP dates have one second resolution
+        self.last_modified = last_modified.replace(microsecond=0) if last_modified else None
+        self.headers = headers or {}
+
+    @classmethod
+    def from_response(cls, response: Response, last_modified: Optional[datetime] = None):
+        headers = {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers}
+        return cls(bytes(response.body), last_modified, headers)
+
+    def encode(self) -> bytes:
+        meta = {
+            "etag": self.etag,
+            "last_modified": self.last_modified.isoformat() if self.last_modified else None,
+            "headers": self.headers
+        }
+        return json.dumps(meta).encode() + b"\n" + self.body
+
+    @classmethod
+    def decode(cls, raw: bytes) -> "CachedResponse":
+        meta, body = raw.split(b"\n", 1)
+        meta = json.loads(meta)
+        last_modified = meta["last_modified"]
+        return cls(body, datetime.fromisoformat(last_modified) if last_modified else None,
+                   meta["headers"], meta["etag"])
+
+    def not_modified(self, request: Request) -> bool:
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = {tag.strip() for tag in if_none_match.split(",")}
+            return "*" in tags or self.etag in tags
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since and self.last_modified:
+            try:
+                since = parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=timezone.utc)
+            return self.last_modified.replace(tzinfo=timezone.utc) <= since
+        return False
+
+    def to_response(self, request: Request, cache_status: str) -> Response:
+        headers = {"ETag": self.etag, "Cache-Control": "no-cache", "X-Cache": cache_status}
+        if self.last_modified:
+            headers["Last-Modified"] = format_datetime(
+                self.last_modified.replace(tzinfo=timezone.utc), usegmt=True
+            )
+        if self.not_modified(request):
+            return Response(status_code=304, headers=headers)
+        return Response(content=self.body, media_type="application/json",
+                        headers={**headers, **self.headers})
+
+
+class ResponseCache(ABC):
+    """Interface of the backends, which store entries, per-key versions and
+    generation counters"""
+
+    def __init__(self, enabled: bool = RESPONSE_CACHE_ENABLED):
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+
+    @abstractmethod
+    async def _get(self, key: str) -> Optional[CachedResponse]:
+        """The stored entry of key, if any"""
+
+    @abstractmethod
+    async def _version(self, key: str) -> Any:
+        """A version of key taken before rendering it"""
+
+    @abstractmethod
+    async def _set(self, key: str, entry: CachedResponse, version: Any):
+        """Store entry unless key was invalidated after version was taken"""
+
+    async def _release(self, key: str, version: Any):
+        """Called once the render of version finished or failed"""
+
+    @abstractmethod
+    async def _delete(self, key: str):
+        """Drop the entry of key and invalidate renders in flight"""
+
+    @abstractmethod
+    async def generation(self, namespace: str) -> int:
+        """Current generation of a namespace of keys, such as the listings"""
+
+    @abstractmethod
+    async def bump(self, namespace: str):
+        """Start a new generation; keys of the old one are never read again"""
+
+    async def respond(self, request: Request, key: str,
+                      render: Callable[[], Awaitable[CachedResponse]]) -> Response:
+        """Serve key from the cache, rendering and storing it on a miss"""
+        entry = await self._get(key) if self.enabled else None
+        if entry is not None:
+            self.hits += 1
+            cache_status = "HIT"
+        else:
+            self.misses += 1
+            cache_status = "MISS"
+            if self.enabled:
+                version = await self._version(key)
+                try:
+                    entry = await render()
+                    if len(entry.body) <= RESPONSE_CACHE_MAX_BODY_BYTES:
+                        await self._set(key, entry, version)
+                finally:
+                    await self._release(key, version)
+            else:
+                entry = await render()
+        response = entry.to_response(request, cache_status)
+        if response.status_code == 304:
+            self.not_modified += 1
+        return response
+
+    async def invalidate(self, *keys: str):
+        self.invalidations += len(keys)
+        for key in keys:
+            await self._delete(key)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+
+class InMemoryResponseCache(ResponseCache):
+    def __init__(self, maxsize: int = RESPONSE_CACHE_MAX_ENTRIES, ttl: float = RESPONSE_CACHE_TTL_SECONDS,
+                 enabled: bool = RESPONSE_CACHE_ENABLED):
+        super().__init__(enabled)
+        self.entries = TTLCache(maxsize, ttl)
+        self.generations: Dict[str, int] = {}
+        # Renders in flight per key; invalidating the key forgets them
+        self.rendering: Dict[str, Set[object]] = {}
+
+    async def _get(self, key: str) -> Optional[CachedResponse]:
+        return self.entries.get(key)
+
+    async def _version(self, key: str) -> object:
+        version = object()
+        self.rendering.setdefault(key, set()).add(version)
+        return version
+
+    async def _set(self, key: str, entry: CachedResponse, version: object):
+        if version in self.rendering.get(key, ()):
+            self.entries.set(key, entry)
+
+    async def _release(self, key: str, version: object):
+        versions = self.rendering.get(key)
+        if versions is not None:
+            versions.discard(version)
+            if not versions:
+                del self.rendering[key]
+
+    async def _delete(self, key: str):
+        self.entries.invalidate(key)
+        self.rendering.pop(key, None)
+
+    async def generation(self, namespace: str) -> int:
+        return self.generations.get(namespace, 0)
+
+    async def bump(self, namespace: str):
+        self.generations[namespace] = self.generations.get(namespace, 0) + 1
+
+    def stats(self) -> dict:
+        return dict(super().stats(), size=len(self.entries), maxsize=self.entries.maxsize,
+                    evictions=self.entries.evictions)
+
+
+class RedisResponseCache(ResponseCache):
+    def __init__(self, url: str = REDIS_URL, prefix: str = REDIS_RESPONSE_PREFIX,
+                 ttl: float = RESPONSE_CACHE_TTL_SECONDS, enabled: bool = RESPONSE_CACHE_ENABLED):
+        super().__init__(enabled)
+        # Only needed for this backend
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(url)
+        self.prefix = prefix
+        self.ttl = ttl
+        self._set_if_version = self.redis.register_script(REDIS_SET_IF_VERSION)
+
+    def _version_key(self, key: str) -> str:
+        return f"{self.prefix}version:{key}"
+
+    async def _get(self, key: str) -> Optional[CachedResponse]:
+        raw = await self.redis.get(self.prefix + key)
+        return CachedResponse.decode(raw) if raw is not None else None
+
+    async def _version(self, key: str) -> int:
+        value = await self.redis.get(self._version_key(key))
+        return int(value) if value is not None else 0
+
+    async def _set(self, key: str, entry: CachedResponse, version: int):
+        # Compared and stored in one step, as other workers invalidate concurrently
+        await self._set_if_version(
+            keys=[self.prefix + key, self._version_key(key)],
+            args=[entry.encode(), version, int(self.ttl * 1000)]
+        )
+
+    async def _delete(self, key: str):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(self.prefix + key)
+            pipe.incr(self._version_key(key))
+            pipe.pexpire(self._version_key(key), REDIS_VERSION_TTL_MS)
+            await pipe.execute()
+
+    async def generation(self, namespace: str) -> int:
+        value = await self.redis.get(f"{self.prefix}generation:{namespace}")
+        return int(value) if value is not None else 0
+
+    async def bump(self, namespace: str):
+        await self.redis.incr(f"{self.prefix}generation:{namespace}")
+
+
+def create_response_cache() -> ResponseCache:
+    if RESPONSE_CACHE_BACKEND == "redis":
+        return RedisResponseCache()
+    return InMemoryResponseCache()
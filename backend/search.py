@@ -0,0 +1,122 @@
+"""Full-text item search.
+
+Titles and descriptions are searched through a Mongo text index, weighted
+towards the title, and results are ranked by text score. Typeahead needs
+prefixes, which text indexes do not match, so items also store the edge
+n-grams of their title words in ``search_prefixes`` (a multikey index):
+with ``prefix=true`` the last, unfinished word of the query is matched
+against them.
+
+$geoNear cannot be combined with $text, so a search near a point runs the
+text query restricted to the radius, takes the best SEARCH_CANDIDATES
+matches and reorders them by relevance discounted by distance.
+"""
+import re
+from typing import List, Optional, Tuple
+
+from decouple import config
+from fastapi import HTTPException
+
+SEARCH_CANDIDATES = config('SEARCH_CANDIDATES', default=500, cast=int)
+# Distance at which a match counts half as much as the same match next door
+SEARCH_DISTANCE_SCALE_KM = config('SEARCH_DISTANCE_SCALE_KM', default=10, cast=float)
+
+PREFIX_MIN_LENGTH = 2
+PREFIX_MAX_LENGTH = 15
+# The radius Mongo computes spherical distances with; every distance the API
+# reports uses it, so $geoNear, the text+geo search and the geo index agree
+EARTH_RADIUS_KM = 6378.1
+
+TEXT_SCORE = {"$meta": "textScore"}
+
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+
+def search_prefixes(title: str) -> List[str]:
+    """Edge n-grams of the title words, stored for typeahead matching"""
+    prefixes = set()
+    for word in tokenize(title):
+        for length in range(PREFIX_MIN_LENGTH, min(len(word), PREFIX_MAX_LENGTH) + 1):
+            prefixes.add(word[:length])
+    return sorted(prefixes)
+
+
+def parse_query(q: str, prefix: bool) -> Tuple[str, Optional[str]]:
+    """Split q into the words to match in full and the typed-ahead prefix"""
+    words = tokenize(q)
+    if not words:
+        raise HTTPException(status_code=400, detail="Search query must contain a word")
+    if not prefix:
+        return " ".join(words), None
+    return " ".join(words[:-1]), words[-1][:PREFIX_MAX_LENGTH]
+
+
+def search_filter(q: str, prefix: bool) -> dict:
+    """Query clauses for q; contains $text unless q is a single prefix.
+
+    A typed-ahead prefix too short to have been stored is ignored after
+    full words and rejected on its own, as it would match nothing.
+    """
+    text, last = parse_query(q, prefix)
+    if not text and len(last) < PREFIX_MIN_LENGTH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"A prefix search needs at least {PREFIX_MIN_LENGTH} characters"
+        )
+    query = {}
+    if text:
+        query["$text"] = {"$search": text}
+    if last is not None and len(last) >= PREFIX_MIN_LENGTH:
+        query["search_prefixes"] = last
+    return query
+
+
+def within_radius(lon: float, lat: float, max_distance_km: float) -> dict:
+    """Radius filter usable next to $text, unlike $geoNear"""
+    return {"location.coordinates": {"$geoWithin": {
+        "$centerSphere": [[lon, lat], max_distance_km / EARTH_RADIUS_KM]
+    }}}
+
+
+def geo_near_options(lon: float, lat: float, query: dict, max_distance_km: Optional[float] = None,
+                     after: Optional[dict] = None) -> dict:
+    """$geoNear options for items matching query, nearest first.
+
+    after is a {"distance" (meters), "id"} cursor; paging resumes at its distance.
+    """
+    options = {
+        "near": {"type": "Point", "coordinates": [lon, lat]},
+        "key": "location.coordinates",
+        "distanceField": "distance_m",
+        "spherical": True,
+        "query": query
+    }
+    if max_distance_km is not None:
+        options["maxDistance"] = max_distance_km * 1000
+    if after:
+        options["minDistance"] = after["distance"]
+    return options
+
+
+def geo_near_pipeline(options: dict, after: Optional[dict] = None) -> List[dict]:
+    """$geoNear stage, followed after a cursor by the tiebreak on id.
+
+    minDistance is inclusive; of the items tied with the cursor's only
+    those with a greater id are left.
+    """
+    stages = [{"$geoNear": options}]
+    if after:
+        stages.append({"$match": {"$or": [
+            {"distance_m": {"$gt": after["distance"]}},
+            {"distance_m": after["distance"], "id": {"$gt": after["id"]}}
+        ]}})
+    return stages
+
+
+def geo_relevance(score: float, distance_km: float) -> float:
+    """Text score discounted by distance from the searcher"""
+    return score / (1 + distance_km / SEARCH_DISTANCE_SCALE_KM)
@@ -1,26 +1,67 @@
-from fastapi import FastAPI, HTTPException, Depends, status, WebSocket, WebSocketDisconnect
+from fastapi import (
+    FastAPI, HTTPException, Depends, Request, Response, status, WebSocket, WebSocketDisconnect,
+    UploadFile, File, BackgroundTasks, Query
+)
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.security import HTTPBearer
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from datetime import datetime, timedelta
 from typing import List, Optional
 import json
+from functools import partial
 import uuid
 from math import radians, cos, sin, asin, sqrt
+from urllib.parse import urlencode
 
 from backend.database import (
     users_collection, items_collection, bookings_collection, 
     reviews_collection, messages_collection, payments_collection,
-    create_indexes
+    conversations_collection, create_indexes
 )
 from backend.models import (
     UserCreate, UserResponse, UserUpdate, LoginRequest, Token,
-    ItemCreate, ItemResponse, ItemUpdate, BookingCreate, BookingResponse, BookingUpdate,
-    ReviewCreate, ReviewResponse, MessageCreate, MessageResponse,
-    PaymentCreate, PaymentResponse, ItemCategory, BookingStatus
+    ItemCreate, ItemResponse, ItemSummary, ItemUpdate, ITEM_SUMMARY_EXTRA_FIELDS,
+    BookingCreate, BookingResponse, BookingSummary, BookingUpdate, BOOKING_SUMMARY_EXTRA_FIELDS,
+    ReviewCreate, ReviewResponse, MessageCreate, MessageResponse, ConversationResponse,
+    MarkReadRequest,
+    PaymentCreate, PaymentResponse, ItemCategory, BookingStatus, BookingRole, ImageVariant
 )
 from backend.auth import (
-    get_password_hash, authenticate_user, create_access_token, 
-    get_current_user, get_current_active_user, create_user_id
+    get_password_hash_async, authenticate_user, create_access_token, 
+    get_current_user, get_current_active_user, get_current_admin_user, create_user_id,
+    invalidate_user, deactivate_user, user_cache
+)
+from backend.availability import (
+    BLOCKING_STATUSES, bookings_filter, claim_interval, is_available, parse_interval,
+    dates_to_ranges, ranges_to_dates, calendar_filter
+)
+from backend.connections import ConnectionManager
+from backend.geo_index import GeoIndex, GEO_INDEX_ENABLED
+from backend.conversations import (
+    HISTORY_NEWEST_FIRST, HISTORY_SORT, INBOX_SORT, anchor_filter, conversation_id,
+    inbox_cursor_filter, inbox_next_cursor, mark_conversation_read, mark_read_up_to
+)
+from backend.message_bus import create_message_bus
+from backend.metrics import (
+    CONTENT_TYPE, METRICS_ENABLED, MetricsMiddleware, registry, scrape_allowed
+)
+from backend.response_cache import CachedResponse, create_response_cache
+from backend.responses import json_list
+from backend.search import (
+    EARTH_RADIUS_KM, SEARCH_CANDIDATES, TEXT_SCORE, geo_near_options, geo_near_pipeline,
+    geo_relevance, search_filter, search_prefixes, within_radius
+)
+from backend.message_writer import MessageWriter
+from backend.images import (
+    MAX_IMAGE_BYTES, image_store, image_url, is_valid_image_id, store_image,
+    store_inline_image, store_inline_images
+)
+from backend.image_variants import (
+    generate_item_variants, resolve_variant, variant_urls, shutdown_executor
+)
+from backend.pagination import (
+    NEXT_CURSOR_HEADER, RECENT_SORT, encode_cursor, decode_cursor,
+    recent_cursor_filter, recent_next_cursor
 )
 
 app = FastAPI(title="P2P Marketplace API", version="1.0.0")
@@ -32,39 +73,59 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", "X-Cache"],
 )
 
+# Outermost, so the time spent in the other middleware counts too
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 # WebSocket connection manager for real-time chat
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-        self.user_connections: dict = {}
+manager = ConnectionManager()
 
-    async def connect(self, websocket: WebSocket, user_id: str):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-        self.user_connections[user_id] = websocket
+# Carries chat messages to the worker holding the recipient's socket
+message_bus = create_message_bus()
 
-    def disconnect(self, websocket: WebSocket, user_id: str):
-        self.active_connections.remove(websocket)
-        if user_id in self.user_connections:
-            del self.user_connections[user_id]
+# Stores chat messages, batched in the background when CHAT_WRITE_BEHIND is set
+message_writer = MessageWriter()
 
-    async def send_personal_message(self, message: str, user_id: str):
-        if user_id in self.user_connections:
-            await self.user_connections[user_id].send_text(message)
+# Rendered item, listing and review responses, invalidated by the write paths
+response_cache = create_response_cache()
 
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            await connection.send_text(message)
+# Optional in-memory spatial index serving geo searches without a database round trip
+geo_index = GeoIndex() if GEO_INDEX_ENABLED else None
 
-manager = ConnectionManager()
+# Gauges and counters the components keep anyway, read when /metrics is scraped
+registry.add_stats("p2p_ws", manager.metrics, counters=(
+    "frames_received", "frames_enqueued", "frames_sent", "frames_dropped", "frames_coalesced",
+    "slow_disconnects", "idle_evictions", "rejected_connections"
+))
+registry.add_stats("p2p_chat_writer", message_writer.stats, counters=(
+    "batches_written", "messages_written", "messages_failed"
+))
+registry.add_stats("p2p_user_cache", user_cache.stats, counters=(
+    "hits", "misses", "coalesced", "evictions"
+))
+registry.add_stats("p2p_response_cache", response_cache.stats, counters=(
+    "hits", "misses", "not_modified", "invalidations", "evictions"
+))
 
 # Startup event
 @app.on_event("startup")
 async def startup_event():
     await create_indexes()
     print("Database indexes created successfully")
+    await message_bus.start(manager.deliver)
+    await message_writer.start()
+    if geo_index is not None:
+        await geo_index.rebuild(items_collection)
+        print(f"Geo index built with {len(geo_index)} items")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await message_bus.stop()
+    await message_writer.stop()
+    shutdown_executor()
 
 # Utility functions
 def haversine(lon1, lat1, lon2, lat2):
@@ -74,8 +135,88 @@ def haversine(lon1, lat1, lon2, lat2):
     dlat = lat2 - lat1
     a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
     c = 2 * asin(sqrt(a))
-    r = 6371  # Radius of earth in kilometers
-    return c * r
+    return c * EARTH_RADIUS_KM
+
+def add_rating_pipeline(rating: int) -> list:
+    """Update pipeline adding one rating to a document's running sum and count
+    and recomputing its average in the same atomic write. Documents rated
+    before rating_sum existed derive it from their stored average."""
+    return [
+        {"$set": {
+            "rating_sum": {"$add": [
+                {"$ifNull": ["$rating_sum", {"$multiply": [
+                    {"$ifNull": ["$rating", 0]}, {"$ifNull": ["$total_reviews", 0]}
+                ]}]},
+                rating
+            ]},
+            "total_reviews": {"$add": [{"$ifNull": ["$total_reviews", 0]}, 1]}
+        }},
+        {"$set": {"rating": {"$divide": ["$rating_sum", "$total_reviews"]}}}
+    ]
+
+def summary_fields(model, extra_fields: set, fields: Optional[str]) -> set:
+    """Fields of a summary model to load: the base card plus the extras
+    requested with a comma separated `fields=` parameter"""
+    requested = {name.strip() for name in fields.split(",") if name.strip()} if fields else set()
+    unknown = requested - extra_fields
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return (set(model.model_fields) - extra_fields) | requested
+
+def with_available_dates(item: dict) -> dict:
+    """Item document with its stored calendar ranges expanded into available_dates"""
+    if "available_ranges" not in item:
+        return item
+    return dict(item, available_dates=ranges_to_dates(item["available_ranges"]))
+
+def item_projection(field_names: set, aggregation: bool = False) -> dict:
+    """Mongo projection for ItemSummary; only the cover image unless all images were requested"""
+    projection = {name: 1 for name in field_names}
+    projection["_id"] = 0
+    if "available_dates" in field_names:
+        projection["available_ranges"] = 1
+    if "images" not in field_names:
+        projection["images"] = {"$slice": ["$images", 1]} if aggregation else {"$slice": 1}
+    return projection
+
+def item_summary(item: dict, field_names: set, variant: Optional[ImageVariant]) -> dict:
+    """ItemSummary fields of an item document, validated later by json_list"""
+    if "available_dates" in field_names:
+        item = with_available_dates(item)
+    summary = {name: item[name] for name in field_names if name in item}
+    images = item.get("images", [])
+    summary["images"] = variant_urls(images if "images" in field_names else images[:1], variant)
+    return summary
+
+def _offset_cursor(cursor: Optional[str], skip: int) -> int:
+    """Offset of a relevance-ranked page; text search results are paged by position"""
+    if not cursor:
+        return skip
+    offset = decode_cursor(cursor).get("offset")
+    if not isinstance(offset, int) or offset < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return offset
+
+async def search_items(query: dict, field_names: set, lat: Optional[float], lon: Optional[float],
+                       max_distance: Optional[float], limit: int, offset: int) -> List[dict]:
+    """Text search ranked by relevance, discounted by distance near a point"""
+    projection = dict(item_projection(field_names), relevance=TEXT_SCORE)
+    if lat is None or lon is None:
+        return await items_collection.find(query, projection).sort(
+            [("relevance", TEXT_SCORE), ("created_at", -1), ("id", -1)]
+        ).skip(offset).limit(limit + 1).to_list(length=limit + 1)
+    
+    if max_distance is not None:
+        query = dict(query, **within_radius(lon, lat, max_distance))
+    candidates = await items_collection.find(query, projection).sort(
+        [("relevance", TEXT_SCORE)]
+    ).limit(SEARCH_CANDIDATES).to_list(length=SEARCH_CANDIDATES)
+    for item in candidates:
+        item_lon, item_lat = item["location"]["coordinates"]
+        item["distance_km"] = haversine(lon, lat, item_lon, item_lat)
+        item["relevance"] = geo_relevance(item["relevance"], item["distance_km"])
+    candidates.sort(key=lambda item: item["relevance"], reverse=True)
+    return candidates[offset:offset + limit + 1]
 
 # Authentication endpoints
 @app.post("/api/auth/register", response_model=Token)
@@ -97,7 +238,7 @@ async def register(user: UserCreate):
     
     # Create new user
     user_id = create_user_id()
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     
     user_data = {
         "id": user_id,
@@ -106,11 +247,12 @@ async def register(user: UserCreate):
         "full_name": user.full_name,
         "phone": user.phone,
         "bio": user.bio,
-        "profile_image": user.profile_image,
+        "profile_image": await store_inline_image(user.profile_image),
         "location": user.location.dict() if user.location else None,
         "password": hashed_password,
         "role": "user",
         "rating": 0.0,
+        "rating_sum": 0,
         "total_reviews": 0,
         "is_verified": False,
         "is_active": True,
@@ -123,7 +265,7 @@ async def register(user: UserCreate):
     # Create access token
     access_token_expires = timedelta(minutes=30)
     access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data={"sub": user.email, "uid": user_id}, expires_delta=access_token_expires
     )
     
     # Return token and user data
@@ -142,7 +284,7 @@ async def login(login_data: LoginRequest):
     
     access_token_expires = timedelta(minutes=30)
     access_token = create_access_token(
-        data={"sub": user["email"]}, expires_delta=access_token_expires
+        data={"sub": user["email"], "uid": user["id"]}, expires_delta=access_token_expires
     )
     
     user_response = UserResponse(**user)
@@ -162,21 +304,59 @@ async def update_profile(
         update_data["updated_at"] = datetime.utcnow()
         if "location" in update_data:
             update_data["location"] = update_data["location"].dict()
+        if "profile_image" in update_data:
+            update_data["profile_image"] = await store_inline_image(update_data["profile_image"])
         
         await users_collection.update_one(
             {"id": current_user["id"]},
             {"$set": update_data}
         )
+        invalidate_user(current_user["id"])
         
         updated_user = await users_collection.find_one({"id": current_user["id"]})
         return UserResponse(**updated_user)
     
     return UserResponse(**current_user)
 
+@app.delete("/api/auth/me")
+async def deactivate_account(current_user: dict = Depends(get_current_active_user)):
+    await deactivate_user(current_user["id"])
+    return {"message": "Account deactivated"}
+
+@app.get("/api/ws/stats")
+async def get_websocket_stats(current_user: dict = Depends(get_current_admin_user)):
+    return {**manager.metrics(), "message_writer": message_writer.stats()}
+
+@app.get("/api/cache/stats")
+async def get_cache_stats(current_user: dict = Depends(get_current_admin_user)):
+    return {"users": user_cache.stats(), "responses": response_cache.stats()}
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False))
+):
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not scrape_allowed(credentials.credentials if credentials else None):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
+
+@app.get("/api/admin/geo-index")
+async def check_geo_index(current_user: dict = Depends(get_current_admin_user)):
+    # Drift shows writes made by other workers since this one built its index
+    if geo_index is None:
+        raise HTTPException(status_code=404, detail="Geo index is disabled")
+    return await geo_index.check_consistency(items_collection)
+
 # Item endpoints
 @app.post("/api/items", response_model=ItemResponse)
 async def create_item(
     item: ItemCreate,
+    background_tasks: BackgroundTasks,
     current_user: dict = Depends(get_current_active_user)
 ):
     item_id = str(uuid.uuid4())
@@ -185,68 +365,227 @@ async def create_item(
         "owner_id": current_user["id"],
         "title": item.title,
         "description": item.description,
+        "search_prefixes": search_prefixes(item.title),
         "category": item.category,
         "price_per_day": item.price_per_day,
-        "images": item.images,
+        "images": await store_inline_images(item.images),
         "location": item.location.dict(),
-        "available_dates": item.available_dates,
+        "available_ranges": dates_to_ranges(item.available_dates),
         "is_available": True,
         "rating": 0.0,
+        "rating_sum": 0,
         "total_reviews": 0,
         "created_at": datetime.utcnow(),
         "updated_at": datetime.utcnow()
     }
     
     await items_collection.insert_one(item_data)
-    return ItemResponse(**item_data)
+    await response_cache.bump("items")
+    if geo_index is not None:
+        geo_index.upsert(item_data)
+    background_tasks.add_task(generate_item_variants, item_data["images"])
+    return ItemResponse(**with_available_dates(item_data))
+
+def _geo_next_cursor(items: List[dict], limit: int, distance_key: str):
+    """Cursor for a page ordered by distance and then id: the last item's both"""
+    if limit <= 0 or len(items) <= limit:
+        return None
+    last = items[limit - 1]
+    return encode_cursor({"distance": last[distance_key], "id": last["id"]})
+
+def _geo_cursor_values(cursor: Optional[str]) -> Optional[dict]:
+    if cursor is None:
+        return None
+    values = decode_cursor(cursor)
+    if not isinstance(values.get("distance"), (int, float)) or not isinstance(values.get("id"), str):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
 
-@app.get("/api/items", response_model=List[ItemResponse])
+async def _geo_near_page(geo_near: dict, cursor_values: Optional[dict], skip: int, limit: int,
+                         projection: dict) -> List[dict]:
+    """limit items of a $geoNear search after skip, ordered by distance and then id.
+
+    $geoNear returns items at the same distance in no set order, so when a
+    page ends inside a run of ties the run is loaded again and ordered by id.
+    """
+    output = [
+        {"$addFields": {"distance_km": {"$divide": ["$distance_m", 1000]}}},
+        {"$project": dict(projection, distance_m=1)}
+    ]
+    end = skip + limit
+    items = await items_collection.aggregate(
+        geo_near_pipeline(geo_near, cursor_values) + [{"$limit": end}] + output
+    ).to_list(length=end)
+    if len(items) == end:
+        boundary = items[-1]["distance_m"]
+        ties = await items_collection.aggregate(
+            geo_near_pipeline(dict(geo_near, minDistance=boundary, maxDistance=boundary), cursor_values)
+            + [{"$match": {"distance_m": boundary}}, {"$sort": {"id": 1}}, {"$limit": end}]
+            + output
+        ).to_list(length=end)
+        items = [item for item in items if item["distance_m"] < boundary] + ties
+    items.sort(key=lambda item: (item["distance_m"], item["id"]))
+    return items[skip:end]
+
+@app.get("/api/items", response_model=List[ItemSummary], response_model_exclude_unset=True)
 async def get_items(
+    request: Request,
+    category: Optional[ItemCategory] = None,
+    lat: Optional[float] = None,
+    lon: Optional[float] = None,
+    max_distance: Optional[float] = None,
+    limit: int = Query(20, ge=1, le=100),
+    skip: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    variant: Optional[ImageVariant] = None,
+    fields: Optional[str] = None,
+    available_from: Optional[str] = None,
+    available_to: Optional[str] = None,
+    q: Optional[str] = None,
+    prefix: bool = False
+):
+    # Any item write starts a new generation of listing keys
+    generation = await response_cache.generation("items")
+    query_string = urlencode(sorted(request.query_params.multi_items()))
+    
+    async def render():
+        page = await list_items(
+            Response(), category, lat, lon, max_distance, limit, skip, cursor, variant,
+            fields, available_from, available_to, q, prefix
+        )
+        return CachedResponse.from_response(page)
+    
+    return await response_cache.respond(request, f"items:{generation}:{query_string}", render)
+
+async def list_items(
+    response: Response,
     category: Optional[ItemCategory] = None,
     lat: Optional[float] = None,
     lon: Optional[float] = None,
     max_distance: Optional[float] = None,
     limit: int = 20,
-    skip: int = 0
+    skip: int = 0,
+    cursor: Optional[str] = None,
+    variant: Optional[ImageVariant] = None,
+    fields: Optional[str] = None,
+    available_from: Optional[str] = None,
+    available_to: Optional[str] = None,
+    q: Optional[str] = None,
+    prefix: bool = False
 ):
+    # Pages are requested with limit + 1 rows so the next cursor is only
+    # issued when there is a next page. `skip` is kept for older clients;
+    # a cursor takes precedence over it.
+    field_names = summary_fields(ItemSummary, ITEM_SUMMARY_EXTRA_FIELDS, fields)
     query = {"is_available": True}
     
     if category:
         query["category"] = category
     
-    items = await items_collection.find(query).skip(skip).limit(limit).to_list(length=limit)
+    # Full words go to the text index; with prefix=true the last word is typed ahead
+    if q:
+        query.update(search_filter(q, prefix))
+    
+    # A single date may be given on either side
+    if available_from or available_to:
+        start, end = parse_interval(available_from or available_to, available_to or available_from)
+        query.update(calendar_filter(start, end))
     
-    # Filter by distance if location provided
-    if lat is not None and lon is not None and max_distance is not None:
-        filtered_items = []
-        for item in items:
-            if item.get("location") and item["location"].get("coordinates"):
-                item_lon, item_lat = item["location"]["coordinates"]
-                distance = haversine(lon, lat, item_lon, item_lat)
-                if distance <= max_distance:
-                    filtered_items.append(item)
-        items = filtered_items
+    if "$text" in query:
+        offset = _offset_cursor(cursor, skip)
+        items = await search_items(query, field_names, lat, lon, max_distance, limit, offset)
+        next_cursor = encode_cursor({"offset": offset + limit}) if len(items) > limit else None
+    # With the in-process index enabled, geo searches never touch the database;
+    # calendar and prefix filters are left to Mongo
+    elif (lat is not None and lon is not None and geo_index is not None
+            and "available_ranges" not in query and "search_prefixes" not in query):
+        cursor_values = _geo_cursor_values(cursor)
+        if cursor_values:
+            hits = await geo_index.search(
+                lon, lat, max_distance, category, cursor_values["distance"], cursor_values["id"],
+                limit=limit + 1
+            )
+        else:
+            hits = await geo_index.search(lon, lat, max_distance, category, offset=skip, limit=limit + 1)
+        items = [dict(item, distance_km=distance) for item, distance in hits]
+        next_cursor = _geo_next_cursor(items, limit, "distance_km")
+    # Geo search runs inside Mongo on the 2dsphere index so that the radius
+    # filter and distance ordering are applied before skip/limit
+    elif lat is not None and lon is not None:
+        cursor_values = _geo_cursor_values(cursor)
+        items = await _geo_near_page(
+            geo_near_options(lon, lat, query, max_distance, cursor_values), cursor_values, 0 if cursor_values else skip, limit + 1,
+            item_projection(field_names, aggregation=True)
+        )
+        next_cursor = _geo_next_cursor(items, limit, "distance_m")
+    else:
+        if cursor:
+            query.update(recent_cursor_filter(cursor))
+        find = items_collection.find(query, item_projection(field_names)).sort(RECENT_SORT)
+        if not cursor:
+            find = find.skip(skip)
+        items = await find.limit(limit + 1).to_list(length=limit + 1)
+        next_cursor = recent_next_cursor(items, limit)
     
-    return [ItemResponse(**item) for item in items]
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return json_list(
+        ItemSummary, (item_summary(item, field_names, variant) for item in items[:limit]),
+        response, exclude_unset=True
+    )
 
-@app.get("/api/items/my", response_model=List[ItemResponse])
+@app.get("/api/items/my", response_model=List[ItemSummary], response_model_exclude_unset=True)
 async def get_my_items(
+    response: Response,
+    limit: int = Query(100, ge=1, le=200),
+    cursor: Optional[str] = None,
+    variant: Optional[ImageVariant] = None,
+    fields: Optional[str] = None,
     current_user: dict = Depends(get_current_active_user)
 ):
-    items = await items_collection.find({"owner_id": current_user["id"]}).to_list(length=None)
-    return [ItemResponse(**item) for item in items]
+    field_names = summary_fields(ItemSummary, ITEM_SUMMARY_EXTRA_FIELDS, fields)
+    query = {"owner_id": current_user["id"]}
+    if cursor:
+        query.update(recent_cursor_filter(cursor))
+    
+    items = await items_collection.find(query, item_projection(field_names)).sort(RECENT_SORT).limit(limit + 1).to_list(length=limit + 1)
+    
+    next_cursor = recent_next_cursor(items, limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return json_list(
+        ItemSummary, (item_summary(item, field_names, variant) for item in items[:limit]),
+        response, exclude_unset=True
+    )
 
 @app.get("/api/items/{item_id}", response_model=ItemResponse)
-async def get_item(item_id: str):
-    item = await items_collection.find_one({"id": item_id})
-    if not item:
+async def get_item(item_id: str, request: Request):
+    async def render():
+        item = await items_collection.find_one({"id": item_id}, {"_id": 0})
+        if not item:
+            raise HTTPException(status_code=404, detail="Item not found")
+        body = ItemResponse(**with_available_dates(item)).model_dump_json().encode()
+        return CachedResponse(body, item.get("updated_at"))
+    
+    return await response_cache.respond(request, f"item:{item_id}", render)
+
+@app.get("/api/items/{item_id}/availability")
+async def get_item_availability(item_id: str, start_date: str, end_date: str):
+    start, end = parse_interval(start_date, end_date)
+    if not await items_collection.find_one({"id": item_id}, {"_id": 0, "id": 1}):
         raise HTTPException(status_code=404, detail="Item not found")
-    return ItemResponse(**item)
+    return {
+        "item_id": item_id,
+        "start_date": start_date,
+        "end_date": end_date,
+        "available": await is_available(item_id, start, end)
+    }
 
 @app.put("/api/items/{item_id}", response_model=ItemResponse)
 async def update_item(
     item_id: str,
     item_update: ItemUpdate,
+    background_tasks: BackgroundTasks,
     current_user: dict = Depends(get_current_active_user)
 ):
     item = await items_collection.find_one({"id": item_id})
@@ -261,16 +600,27 @@ async def update_item(
         update_data["updated_at"] = datetime.utcnow()
         if "location" in update_data:
             update_data["location"] = update_data["location"].dict()
+        if "title" in update_data:
+            update_data["search_prefixes"] = search_prefixes(update_data["title"])
+        if "images" in update_data:
+            update_data["images"] = await store_inline_images(update_data["images"])
+            background_tasks.add_task(generate_item_variants, update_data["images"])
         
-        await items_collection.update_one(
-            {"id": item_id},
-            {"$set": update_data}
-        )
+        update = {"$set": update_data}
+        if "available_dates" in update_data:
+            update_data["available_ranges"] = dates_to_ranges(update_data.pop("available_dates"))
+            update["$unset"] = {"available_dates": ""}
+        
+        await items_collection.update_one({"id": item_id}, update)
+        await response_cache.invalidate(f"item:{item_id}")
+        await response_cache.bump("items")
         
         updated_item = await items_collection.find_one({"id": item_id})
-        return ItemResponse(**updated_item)
+        if geo_index is not None:
+            geo_index.upsert(updated_item)
+        return ItemResponse(**with_available_dates(updated_item))
     
-    return ItemResponse(**item)
+    return ItemResponse(**with_available_dates(item))
 
 @app.delete("/api/items/{item_id}")
 async def delete_item(
@@ -285,8 +635,49 @@ async def delete_item(
         raise HTTPException(status_code=403, detail="Not authorized to delete this item")
     
     await items_collection.delete_one({"id": item_id})
+    await response_cache.invalidate(f"item:{item_id}", f"reviews:{item_id}")
+    await response_cache.bump("items")
+    if geo_index is not None:
+        geo_index.remove(item_id)
     return {"message": "Item deleted successfully"}
 
+# Image endpoints
+@app.post("/api/images")
+async def upload_image(
+    file: UploadFile = File(...),
+    current_user: dict = Depends(get_current_active_user)
+):
+    data = await file.read(MAX_IMAGE_BYTES + 1)
+    image_id = await store_image(data)
+    return {"id": image_id, "url": image_url(image_id)}
+
+@app.get("/api/images/{image_id}")
+async def get_image(image_id: str, variant: Optional[ImageVariant] = None):
+    if not is_valid_image_id(image_id):
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    # Images are addressed by content hash, so they never change. A variant
+    # that is still being rendered falls back to the original, which must
+    # not be cached under the variant URL for long.
+    cache_control = "public, max-age=31536000, immutable"
+    served_id = image_id
+    if variant is not None:
+        served_id = await resolve_variant(image_id, variant)
+        if served_id is None:
+            served_id = image_id
+            cache_control = "public, max-age=60"
+    
+    stored = await image_store.open(served_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    content_type, length, chunks = stored
+    return StreamingResponse(chunks, media_type=content_type, headers={
+        "Cache-Control": cache_control,
+        "ETag": f'"{served_id}"',
+        "Content-Length": str(length)
+    })
+
 # Booking endpoints
 @app.post("/api/bookings", response_model=BookingResponse)
 async def create_booking(
@@ -302,13 +693,17 @@ async def create_booking(
     if item["owner_id"] == current_user["id"]:
         raise HTTPException(status_code=400, detail="Cannot book your own item")
     
+    start, end = parse_interval(booking.start_date, booking.end_date)
     booking_id = str(uuid.uuid4())
     booking_data = {
         "id": booking_id,
         "item_id": booking.item_id,
         "renter_id": current_user["id"],
+        "owner_id": item["owner_id"],
         "start_date": booking.start_date,
         "end_date": booking.end_date,
+        "start": start,
+        "end": end,
         "total_amount": booking.total_amount,
         "message": booking.message,
         "status": BookingStatus.PENDING,
@@ -316,20 +711,37 @@ async def create_booking(
         "updated_at": datetime.utcnow()
     }
     
-    await bookings_collection.insert_one(booking_data)
+    await claim_interval(
+        booking.item_id, start, end,
+        apply=lambda: bookings_collection.insert_one(booking_data),
+        undo=lambda: bookings_collection.delete_one({"id": booking_id})
+    )
     return BookingResponse(**booking_data)
 
-@app.get("/api/bookings", response_model=List[BookingResponse])
+@app.get("/api/bookings", response_model=List[BookingSummary], response_model_exclude_unset=True)
 async def get_bookings(
+    response: Response,
+    role: Optional[BookingRole] = None,
+    booking_status: Optional[BookingStatus] = Query(None, alias="status"),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
     current_user: dict = Depends(get_current_active_user)
 ):
+    field_names = summary_fields(BookingSummary, BOOKING_SUMMARY_EXTRA_FIELDS, fields)
+    
+    query = bookings_filter(
+        current_user["id"], role, booking_status, recent_cursor_filter(cursor) if cursor else None
+    )
     bookings = await bookings_collection.find(
-        {"$or": [
-            {"renter_id": current_user["id"]},
-            {"item_id": {"$in": [item["id"] for item in await items_collection.find({"owner_id": current_user["id"]}).to_list(length=None)]}}
-        ]}
-    ).to_list(length=None)
-    return [BookingResponse(**booking) for booking in bookings]
+        query,
+        dict.fromkeys(field_names, 1) | {"_id": 0}
+    ).sort(RECENT_SORT).limit(limit + 1).to_list(length=limit + 1)
+    
+    next_cursor = recent_next_cursor(bookings, limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return json_list(BookingSummary, bookings[:limit], response, exclude_unset=True)
 
 @app.put("/api/bookings/{booking_id}", response_model=BookingResponse)
 async def update_booking(
@@ -342,18 +754,35 @@ async def update_booking(
         raise HTTPException(status_code=404, detail="Booking not found")
     
     # Check if user is the renter or owner of the item
-    item = await items_collection.find_one({"id": booking["item_id"]})
-    if booking["renter_id"] != current_user["id"] and item["owner_id"] != current_user["id"]:
+    owner_id = booking.get("owner_id")
+    if owner_id is None:
+        item = await items_collection.find_one({"id": booking["item_id"]}, {"_id": 0, "owner_id": 1})
+        owner_id = item["owner_id"] if item else None
+    if booking["renter_id"] != current_user["id"] and owner_id != current_user["id"]:
         raise HTTPException(status_code=403, detail="Not authorized to update this booking")
     
     update_data = {k: v for k, v in booking_update.dict().items() if v is not None}
     if update_data:
         update_data["updated_at"] = datetime.utcnow()
         
-        await bookings_collection.update_one(
-            {"id": booking_id},
-            {"$set": update_data}
-        )
+        # Moving a booking back into a blocking status has to claim its dates again
+        if update_data.get("status") in BLOCKING_STATUSES and booking["status"] not in BLOCKING_STATUSES:
+            start, end = parse_interval(booking["start_date"], booking["end_date"])
+            update_data.update(start=start, end=end)
+            await claim_interval(
+                booking["item_id"], start, end,
+                apply=lambda: bookings_collection.update_one({"id": booking_id}, {"$set": update_data}),
+                undo=lambda: bookings_collection.update_one(
+                    {"id": booking_id},
+                    {"$set": {"status": booking["status"], "updated_at": booking["updated_at"]}}
+                ),
+                exclude_id=booking_id
+            )
+        else:
+            await bookings_collection.update_one(
+                {"id": booking_id},
+                {"$set": update_data}
+            )
         
         updated_booking = await bookings_collection.find_one({"id": booking_id})
         return BookingResponse(**updated_booking)
@@ -393,84 +822,204 @@ async def create_review(
     
     await reviews_collection.insert_one(review_data)
     
-    # Update item rating
-    reviews = await reviews_collection.find({"item_id": review.item_id}).to_list(length=None)
-    avg_rating = sum(r["rating"] for r in reviews) / len(reviews)
-    await items_collection.update_one(
-        {"id": review.item_id},
-        {"$set": {"rating": avg_rating, "total_reviews": len(reviews)}}
-    )
+    # Roll the rating into the item's and the owner's running aggregates
+    await items_collection.update_one({"id": review.item_id}, add_rating_pipeline(review.rating))
+    if geo_index is not None:
+        geo_index.upsert(await items_collection.find_one({"id": review.item_id}))
+    await users_collection.update_one({"id": item["owner_id"]}, add_rating_pipeline(review.rating))
+    invalidate_user(item["owner_id"])
+    # The item's rating shows on its page and in listings
+    await response_cache.invalidate(f"item:{review.item_id}", f"reviews:{review.item_id}")
+    await response_cache.bump("items")
     
     return ReviewResponse(**review_data)
 
 @app.get("/api/reviews/{item_id}", response_model=List[ReviewResponse])
-async def get_item_reviews(item_id: str):
-    reviews = await reviews_collection.find({"item_id": item_id}).to_list(length=None)
-    return [ReviewResponse(**review) for review in reviews]
+async def get_item_reviews(item_id: str, request: Request):
+    async def render():
+        reviews = await reviews_collection.find({"item_id": item_id}, {"_id": 0}).to_list(length=None)
+        last_modified = max((review["created_at"] for review in reviews), default=None)
+        return CachedResponse.from_response(json_list(ReviewResponse, reviews), last_modified)
+    
+    return await response_cache.respond(request, f"reviews:{item_id}", render)
+
+def ack_message(connection, message: dict, client_id: Optional[str], stored: bool = True):
+    """Tell the sender its message's id and whether it was stored"""
+    connection.enqueue(json.dumps({
+        "type": "ack",
+        "id": message["id"],
+        "client_id": client_id,
+        "created_at": message["created_at"].isoformat(),
+        "saved": stored
+    }))
+
+def ack_saved_message(connection, message: dict, client_id: Optional[str], saved):
+    """Ack a message once the writer's future for it resolves"""
+    ack_message(connection, message, client_id, not saved.cancelled() and saved.exception() is None)
+
+async def read_conversation(user_id: str, other_user_id: str, receipt: MarkReadRequest) -> int:
+    """Mark a conversation read and send the other side a read receipt"""
+    marked = await mark_read_up_to(user_id, other_user_id, receipt.up_to, receipt.before)
+    if marked:
+        await message_bus.publish(other_user_id, json.dumps({
+            "type": "read",
+            "conversation_id": conversation_id(user_id, other_user_id),
+            "reader_id": user_id,
+            "up_to": receipt.up_to,
+            "before": receipt.before.isoformat() if receipt.before else None,
+            "read_at": datetime.utcnow().isoformat(),
+            "count": marked
+        }))
+    return marked
 
 # WebSocket endpoint for real-time chat
 @app.websocket("/ws/{user_id}")
 async def websocket_endpoint(websocket: WebSocket, user_id: str):
-    await manager.connect(websocket, user_id)
+    connection = await manager.connect(websocket, user_id)
+    if connection is None:
+        return
     try:
+        await message_bus.subscribe(user_id)
         while True:
             data = await websocket.receive_text()
-            message_data = json.loads(data)
+            connection.touch()
+            try:
+                message_data = json.loads(data)
+                if message_data.get("type") == "pong":
+                    continue
+                receiver_id = message_data["receiver_id"]
+                content = message_data["content"]
+            except (ValueError, KeyError, TypeError, AttributeError):
+                # Skip malformed frames instead of dropping the connection
+                continue
             
-            # Save message to database
             message_id = str(uuid.uuid4())
             message_db = {
                 "id": message_id,
+                "conversation_id": conversation_id(user_id, receiver_id),
                 "sender_id": user_id,
-                "receiver_id": message_data["receiver_id"],
-                "content": message_data["content"],
+                "receiver_id": receiver_id,
+                "content": content,
                 "message_type": "text",
                 "is_read": False,
                 "created_at": datetime.utcnow()
             }
-            await messages_collection.insert_one(message_db)
+            frame = json.dumps({
+                "id": message_id,
+                "conversation_id": message_db["conversation_id"],
+                "sender_id": user_id,
+                "receiver_id": receiver_id,
+                "content": content,
+                "created_at": message_db["created_at"].isoformat()
+            })
             
-            # Send message to receiver
-            await manager.send_personal_message(
-                json.dumps({
-                    "id": message_id,
-                    "sender_id": user_id,
-                    "receiver_id": message_data["receiver_id"],
-                    "content": message_data["content"],
-                    "created_at": datetime.utcnow().isoformat()
-                }),
-                message_data["receiver_id"]
-            )
+            # Send message to receiver, wherever they are connected, and save it
+            if message_writer.write_behind:
+                await message_bus.publish(receiver_id, frame)
+                saved = await message_writer.save(message_db)
+            else:
+                saved = await message_writer.save(message_db)
+                await message_bus.publish(receiver_id, frame)
+            # Every send is acked. Write-through has stored the message by now;
+            # write-behind acks once it is stored with durable acks, else right away
+            client_id = message_data.get("client_id")
+            if message_writer.write_behind and not message_writer.durable_acks:
+                ack_message(connection, message_db, client_id)
+            else:
+                saved.add_done_callback(partial(ack_saved_message, connection, message_db, client_id))
             
     except WebSocketDisconnect:
-        manager.disconnect(websocket, user_id)
+        pass
+    except Exception as e:
+        # Evicted connections end up here once their socket is closed
+        if not connection.closed:
+            print(f"WebSocket error for {user_id}: {e}")
+    finally:
+        if manager.disconnect(connection):
+            await message_bus.unsubscribe(user_id)
+            # Another tab may have connected while unsubscribing
+            if manager.is_connected(user_id):
+                await message_bus.subscribe(user_id)
 
 # Message endpoints
 @app.get("/api/messages/{other_user_id}", response_model=List[MessageResponse])
 async def get_messages(
     other_user_id: str,
+    before: Optional[str] = None,
+    since: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
     current_user: dict = Depends(get_current_active_user)
 ):
-    messages = await messages_collection.find({
-        "$or": [
-            {"sender_id": current_user["id"], "receiver_id": other_user_id},
-            {"sender_id": other_user_id, "receiver_id": current_user["id"]}
-        ]
-    }).sort("created_at", 1).to_list(length=None)
+    """A page of a conversation, oldest first.
+
+    Without before/since this is the latest page. before=<message id> pages
+    backwards through older messages; since=<message id> returns only what
+    arrived after a message the client already has.
+    """
+    if before and since:
+        raise HTTPException(status_code=400, detail="Use either before or since, not both")
+    conversation = conversation_id(current_user["id"], other_user_id)
+    query = {"conversation_id": conversation}
+
+    if since:
+        query.update(await anchor_filter(conversation, since, "$gt"))
+        messages = await messages_collection.find(query, {"_id": 0}).sort(
+            HISTORY_SORT
+        ).limit(limit).to_list(length=limit)
+    else:
+        if before:
+            query.update(await anchor_filter(conversation, before, "$lt"))
+        messages = await messages_collection.find(query, {"_id": 0}).sort(
+            HISTORY_NEWEST_FIRST
+        ).limit(limit).to_list(length=limit)
+        messages.reverse()
     
-    return [MessageResponse(**message) for message in messages]
+    return json_list(MessageResponse, messages)
 
 @app.put("/api/messages/{message_id}/read")
 async def mark_message_read(
     message_id: str,
     current_user: dict = Depends(get_current_active_user)
 ):
-    await messages_collection.update_one(
-        {"id": message_id, "receiver_id": current_user["id"]},
-        {"$set": {"is_read": True}}
+    message = await messages_collection.find_one_and_update(
+        {"id": message_id, "receiver_id": current_user["id"], "is_read": False},
+        {"$set": {"is_read": True}},
+        projection={"_id": 0, "sender_id": 1}
     )
+    if message:
+        await mark_conversation_read(current_user["id"], message["sender_id"], 1)
     return {"message": "Message marked as read"}
 
+@app.post("/api/conversations/{other_user_id}/read")
+async def mark_conversation_as_read(
+    other_user_id: str,
+    receipt: Optional[MarkReadRequest] = None,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """Mark many messages read in one call, notifying the sender"""
+    marked = await read_conversation(current_user["id"], other_user_id, receipt or MarkReadRequest())
+    return {"message": "Conversation marked as read", "marked": marked}
+
+@app.get("/api/conversations", response_model=List[ConversationResponse])
+async def get_conversations(
+    response: Response,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """The user's inbox, most recently active conversation first"""
+    query = {"user_id": current_user["id"]}
+    if cursor:
+        query.update(inbox_cursor_filter(cursor))
+    conversations = await conversations_collection.find(query, {"_id": 0}).sort(
+        INBOX_SORT
+    ).limit(limit + 1).to_list(length=limit + 1)
+    
+    next_cursor = inbox_next_cursor(conversations, limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return json_list(ConversationResponse, conversations[:limit], response)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
@@ -0,0 +1,90 @@
+"""Runtime log of slow database queries.
+
+A pymongo CommandListener prints every query that took longer than
+SLOW_QUERY_MS with its shape: the filter, sort and pipeline with the
+values replaced by their types, so the line points at the access path
+without leaking user data. Run ``python -m backend.query_audit`` to see
+which index such a shape uses.
+"""
+import json
+from typing import Any, Dict, Tuple
+
+from decouple import config
+from pymongo import monitoring
+
+from backend.metrics import Counter, registry
+
+# Milliseconds; 0 turns the log off
+SLOW_QUERY_MS = config('SLOW_QUERY_MS', default=100, cast=float)
+
+# Commands that select documents; inserts carry whole documents and no filter
+QUERY_COMMANDS = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify", "getMore"}
+
+slow_queries = registry.register(Counter(
+    "p2p_mongo_slow_queries_total", "Queries slower than SLOW_QUERY_MS", ("collection", "command")
+))
+
+
+def shape(value: Any) -> Any:
+    """value with every literal replaced by its type name"""
+    if isinstance(value, dict):
+        return {key: shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        shapes = []
+        for item in map(shape, value):
+            if item not in shapes:
+                shapes.append(item)
+        return shapes
+    return type(value).__name__
+
+
+def describe(command_name: str, command: dict) -> Tuple[str, Dict[str, Any]]:
+    """Collection and query shape of a command"""
+    collection = command.get(command_name)
+    if command_name == "find":
+        query = {"filter": shape(command.get("filter", {})), "sort": command.get("sort")}
+    elif command_name == "aggregate":
+        query = {"pipeline": shape(command.get("pipeline", []))}
+    elif command_name in ("count", "distinct"):
+        query = {"filter": shape(command.get("query", {}))}
+    elif command_name == "update":
+        query = {"filter": shape([update["q"] for update in command.get("updates", [])])}
+    elif command_name == "delete":
+        query = {"filter": shape([delete["q"] for delete in command.get("deletes", [])])}
+    elif command_name == "findAndModify":
+        query = {"filter": shape(command.get("query", {})), "sort": command.get("sort")}
+    else:
+        # getMore carries only the cursor; the shape was logged with the first batch if slow
+        collection, query = command.get("collection"), {}
+    return collection if isinstance(collection, str) else "", query
+
+
+class SlowQueryLog(monitoring.CommandListener):
+    def __init__(self, threshold_ms: float = SLOW_QUERY_MS):
+        self.threshold_micros = threshold_ms * 1000
+        # Commands in progress; completion events do not carry the command
+        self._commands: Dict[Tuple, dict] = {}
+
+    def started(self, event):
+        if event.command_name in QUERY_COMMANDS:
+            self._commands[(event.connection_id, event.request_id)] = event.command
+
+    def _finish(self, event):
+        command = self._commands.pop((event.connection_id, event.request_id), None)
+        if command is None or event.duration_micros < self.threshold_micros:
+            return
+        collection, query = describe(event.command_name, command)
+        slow_queries.inc(collection, event.command_name)
+        print(f"Slow query: {event.command_name} on {collection or event.database_name} "
+              f"took {event.duration_micros / 1000:.0f}ms {json.dumps(query, default=str)}")
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event)
+
+
+def slow_query_listeners() -> list:
+    """Listeners to create the Mongo client with"""
+    return [SlowQueryLog()] if SLOW_QUERY_MS > 0 else []
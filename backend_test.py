@@ -3,6 +3,7 @@ import json
 import time
 import random
 import string
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import os
 
@@ -244,10 +245,130 @@ def test_update_booking(token, booking_id, update_data):
         log_test("Update Booking", False, f"Failed to update booking: {response.text}")
         return None
 
+def booking_for_days(item_id, first_day, last_day):
+    """Booking request for the days first_day through last_day from today"""
+    return {
+        "item_id": item_id,
+        "start_date": (datetime.now() + timedelta(days=first_day)).strftime("%Y-%m-%d"),
+        "end_date": (datetime.now() + timedelta(days=last_day)).strftime("%Y-%m-%d"),
+        "total_amount": TEST_ITEM["price_per_day"] * (last_day - first_day + 1),
+        "message": "Booking conflict test"
+    }
+
+def test_overlapping_booking(token, item_id):
+    """Test that a booking overlapping a held one is rejected and an adjacent one is not"""
+    headers = {"Authorization": f"Bearer {token}"}
+    # TEST_BOOKING holds days 1 to 3
+    overlapping = booking_for_days(item_id, 3, 5)
+    response = requests.post(f"{BASE_URL}/api/bookings", json=overlapping, headers=headers)
+    if response.status_code == 409:
+        log_test("Overlapping Booking", True, "Booking sharing a day with a held one was rejected")
+    else:
+        log_test("Overlapping Booking", False, f"Expected 409, got {response.status_code}: {response.text}")
+    
+    adjacent = booking_for_days(item_id, 4, 5)
+    response = requests.post(f"{BASE_URL}/api/bookings", json=adjacent, headers=headers)
+    if response.status_code == 200:
+        log_test("Adjacent Booking", True, "Booking starting the day after another ends was accepted")
+    else:
+        log_test("Adjacent Booking", False, f"Failed to book adjacent days: {response.text}")
+
+def test_concurrent_bookings(token, item_id, attempts=5):
+    """Test that of several simultaneous requests for the same days exactly one is accepted"""
+    headers = {"Authorization": f"Bearer {token}"}
+    booking = booking_for_days(item_id, 10, 12)
+    with ThreadPoolExecutor(max_workers=attempts) as pool:
+        responses = list(pool.map(
+            lambda _: requests.post(f"{BASE_URL}/api/bookings", json=booking, headers=headers),
+            range(attempts)
+        ))
+    statuses = sorted(response.status_code for response in responses)
+    if statuses == [200] + [409] * (attempts - 1):
+        log_test("Concurrent Bookings", True, f"1 of {attempts} simultaneous bookings accepted")
+    else:
+        log_test("Concurrent Bookings", False, f"Expected one 200 and {attempts - 1} 409s, got {statuses}")
+
+def test_date_ranges():
+    """Test merging calendar days into half-open ranges (runs without the server)"""
+    from backend.availability import dates_to_ranges, ranges_to_dates
+    
+    def day(value):
+        return datetime.strptime(value, "%Y-%m-%d")
+    
+    cases = [
+        ("single day", ["2024-03-10"], [("2024-03-10", "2024-03-11")]),
+        ("adjacent days", ["2024-03-10", "2024-03-11"], [("2024-03-10", "2024-03-12")]),
+        ("gap", ["2024-03-10", "2024-03-12"],
+         [("2024-03-10", "2024-03-11"), ("2024-03-12", "2024-03-13")]),
+        ("unsorted with duplicates", ["2024-03-12", "2024-03-10", "2024-03-11", "2024-03-10"],
+         [("2024-03-10", "2024-03-13")]),
+        ("month and year boundary", ["2024-12-31", "2025-01-01"], [("2024-12-31", "2025-01-02")]),
+        ("leap day", ["2024-02-28", "2024-02-29", "2024-03-01"], [("2024-02-28", "2024-03-02")]),
+        ("empty", [], []),
+    ]
+    for name, dates, expected in cases:
+        ranges = dates_to_ranges(dates)
+        expected = [{"start": day(start), "end": day(end)} for start, end in expected]
+        round_trip = ranges_to_dates(ranges) == sorted(set(dates))
+        if ranges == expected and round_trip:
+            log_test("Date Ranges", True, name)
+        else:
+            log_test("Date Ranges", False, f"{name}: got {ranges}, round trip {'ok' if round_trip else 'failed'}")
+
+def test_query_audit():
+    """Test the index audit's plan checks on canned explain output (runs without the server)"""
+    from backend.query_audit import problems, query_shapes, winning_stages
+    
+    shapes = query_shapes()
+    names = [shape.name for shape in shapes]
+    if len(set(names)) == len(names):
+        log_test("Query Audit", True, f"{len(shapes)} query shapes built from the handlers' helpers")
+    else:
+        log_test("Query Audit", False, f"Duplicate shape names: {sorted({n for n in names if names.count(n) > 1})}")
+    shape = {shape.name: shape for shape in shapes}
+    
+    def index_scan(name):
+        return {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": name}}
+    
+    cases = [
+        ("index scan", "GET /api/items",
+         {"queryPlanner": {"winningPlan": index_scan("created_at_-1_id_-1")}}, []),
+        ("collection scan", "GET /api/items",
+         {"queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}}}, ["collection scan"]),
+        ("in-memory sort", "GET /api/items?category",
+         {"queryPlanner": {"winningPlan": {"stage": "SORT", "inputStage": index_scan("category_1")}}},
+         ["in-memory sort"]),
+        ("sort by text score", "GET /api/items?q",
+         {"queryPlanner": {"winningPlan": {"stage": "SORT", "inputStage": {"stage": "TEXT_MATCH"}}}}, []),
+        ("rejected plans ignored", "GET /api/items",
+         {"queryPlanner": {"winningPlan": index_scan("created_at_-1_id_-1"),
+                           "rejectedPlans": [{"stage": "COLLSCAN"}]}}, []),
+        ("aggregation cursor stage", "GET /api/items?lat&lon next page",
+         {"stages": [{"$cursor": {"queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}}}},
+                     {"$match": {}}]}, ["collection scan"]),
+    ]
+    for name, shape_name, explain, expected in cases:
+        found = problems(shape[shape_name], winning_stages(explain))
+        if found == expected:
+            log_test("Query Audit", True, name)
+        else:
+            log_test("Query Audit", False, f"{name}: expected {expected}, got {found}")
+    
+    # Later geo pages must keep the id tiebreak after $geoNear
+    pipeline = shape["GET /api/items?lat&lon next page"].command["pipeline"]
+    if [next(iter(stage)) for stage in pipeline] == ["$geoNear", "$match", "$limit"]:
+        log_test("Query Audit", True, "geo next page resumes after the cursor")
+    else:
+        log_test("Query Audit", False, f"Unexpected geo next page pipeline: {pipeline}")
+
 def run_tests():
     """Run all tests in sequence"""
     print("\n===== STARTING API TESTS =====\n")
     
+    # Calendar merging and the query audit's checks need no server
+    test_date_ranges()
+    test_query_audit()
+    
     # 1. Register first user (item owner)
     owner_data = test_register(TEST_USER1)
     if not owner_data:
@@ -326,6 +447,12 @@ def run_tests():
     }
     updated_booking = test_update_booking(owner_token, booking_id, booking_update)
     
+    # 15. Overlapping and adjacent bookings against the approved one
+    test_overlapping_booking(renter_token, item_id)
+    
+    # 16. Simultaneous bookings for the same days
+    test_concurrent_bookings(renter_token, item_id)
+    
     # Print summary
     print("\n===== TEST SUMMARY =====")
     print(f"Total tests: {test_results['passed'] + test_results['failed']}")
@@ -0,0 +1 @@
+# Benchmarks for the P2P Marketplace backend
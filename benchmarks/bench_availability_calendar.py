@@ -0,0 +1,78 @@
+"""Item calendar size and date-range search: string lists vs merged ranges.
+
+Seeds the same items twice over a 365-day horizon, once with the old
+available_dates string list (multikey indexed) and once with the merged
+available_ranges the API now stores, then compares BSON document size and
+the latency of finding items free for a given week.
+"""
+import asyncio
+import random
+import uuid
+from datetime import datetime, timedelta
+
+import bson
+
+from benchmarks.common import make_item, measure, print_row
+from backend.availability import calendar_filter, dates_to_ranges, parse_interval
+from backend.database import database
+
+ITEMS = 20_000
+HORIZON_DAYS = 365
+
+
+def calendar():
+    """A year of availability with a few blocked-out stretches"""
+    today = datetime.utcnow().date()
+    blocked = set()
+    for _ in range(random.randint(0, 4)):
+        first = random.randrange(HORIZON_DAYS)
+        blocked.update(range(first, first + random.randint(3, 20)))
+    return [
+        (today + timedelta(days=i)).strftime("%Y-%m-%d")
+        for i in range(HORIZON_DAYS) if i not in blocked
+    ]
+
+
+async def main():
+    as_strings = database.bench_calendar_strings
+    as_ranges = database.bench_calendar_ranges
+    await as_strings.drop()
+    await as_ranges.drop()
+
+    owner_id = str(uuid.uuid4())
+    string_docs, range_docs = [], []
+    for _ in range(ITEMS):
+        item = make_item(owner_id)
+        item["available_dates"] = calendar()
+        string_docs.append(item)
+        ranged = {k: v for k, v in item.items() if k != "available_dates"}
+        ranged["available_ranges"] = dates_to_ranges(item["available_dates"])
+        range_docs.append(ranged)
+    await as_strings.insert_many(string_docs)
+    await as_ranges.insert_many(range_docs)
+    await as_strings.create_index("available_dates")
+    await as_ranges.create_index([("available_ranges.start", 1), ("available_ranges.end", 1)])
+
+    string_size = sum(len(bson.encode(d)) for d in string_docs) / ITEMS
+    range_size = sum(len(bson.encode(d)) for d in range_docs) / ITEMS
+    print(f"Average document size: strings {string_size:.0f} B, ranges {range_size:.0f} B")
+
+    first = datetime.utcnow().date() + timedelta(days=90)
+    week = [(first + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(7)]
+    start, end = parse_interval(week[0], week[-1])
+
+    async def strings_query():
+        return await as_strings.find({"available_dates": {"$all": week}}, {"_id": 0, "id": 1}).limit(20).to_list(20)
+
+    async def ranges_query():
+        return await as_ranges.find(calendar_filter(start, end), {"_id": 0, "id": 1}).limit(20).to_list(20)
+
+    print_row("week search, string list", await measure(strings_query))
+    print_row("week search, ranges", await measure(ranges_query))
+
+    await as_strings.drop()
+    await as_ranges.drop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,120 @@
+"""Cross-worker chat delivery latency and throughput as workers scale.
+
+Starts N uvicorn processes of the app on consecutive ports sharing one
+message bus (CHAT_BUS_BACKEND, redis by default), connects simulated users
+spread round-robin over the workers, and has every user send messages to
+random other users, so most messages cross process boundaries. Reports
+delivery latency percentiles and delivered messages per second.
+
+    python -m benchmarks.bench_chat_fanout
+"""
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+
+import websockets
+
+from benchmarks import common  # noqa: F401  (points DATABASE_NAME at the scratch database)
+
+WORKER_COUNTS = [1, 2, 4]
+BASE_PORT = 8101
+USERS = 200
+MESSAGES_PER_USER = 50
+BUS = os.environ.get("CHAT_BUS_BACKEND", "redis")
+
+
+def start_workers(count):
+    env = dict(os.environ, CHAT_BUS_BACKEND=BUS)
+    return [
+        subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "backend.server:app",
+             "--port", str(BASE_PORT + i), "--log-level", "warning"],
+            env=env
+        )
+        for i in range(count)
+    ]
+
+
+async def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("localhost", port), timeout=1):
+                return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Worker on port {port} did not start")
+
+
+async def run(worker_count):
+    users = [str(uuid.uuid4()) for _ in range(USERS)]
+    expected = USERS * MESSAGES_PER_USER
+    latencies = []
+    done = asyncio.Event()
+
+    async def receive(ws):
+        async for frame in ws:
+            sent_at = json.loads(json.loads(frame)["content"])["sent_at"]
+            latencies.append((time.time() - sent_at) * 1000)
+            if len(latencies) == expected:
+                done.set()
+
+    sockets = [
+        await websockets.connect(f"ws://localhost:{BASE_PORT + i % worker_count}/ws/{user_id}")
+        for i, user_id in enumerate(users)
+    ]
+    receivers = [asyncio.create_task(receive(ws)) for ws in sockets]
+
+    async def send_all(user_id, ws):
+        for _ in range(MESSAGES_PER_USER):
+            receiver_id = random.choice([u for u in users if u != user_id])
+            await ws.send(json.dumps({
+                "receiver_id": receiver_id,
+                "content": json.dumps({"sent_at": time.time()})
+            }))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(send_all(u, ws) for u, ws in zip(users, sockets)))
+    try:
+        await asyncio.wait_for(done.wait(), timeout=120)
+    except asyncio.TimeoutError:
+        pass
+    elapsed = time.perf_counter() - started
+
+    for task in receivers:
+        task.cancel()
+    for ws in sockets:
+        await ws.close()
+
+    latencies.sort()
+    print(
+        f"{worker_count} workers: delivered {len(latencies)}/{expected} "
+        f"in {elapsed:.2f}s ({len(latencies) / elapsed:.0f} msg/s), "
+        f"p50={statistics.median(latencies):.1f}ms "
+        f"p99={latencies[int(len(latencies) * 0.99) - 1]:.1f}ms"
+    )
+
+
+async def main():
+    for count in WORKER_COUNTS:
+        workers = start_workers(count)
+        try:
+            for i in range(count):
+                await wait_for_port(BASE_PORT + i)
+            await run(count)
+        finally:
+            for worker in workers:
+                worker.terminate()
+            for worker in workers:
+                worker.wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,116 @@
+"""Chat messages per second per worker: write-through vs write-behind.
+
+Drives the real /ws endpoint in-process with simulated sockets, every user
+sending a stream of messages to random other users, and stores them in the
+scratch database with each persistence mode:
+
+* write-through: one insert_one per message before it is forwarded
+* write-behind: forwarded at once, stored in insert_many batches
+* durable: write-behind, and the sender is acked after the batch is stored
+
+Reports messages per second, and for durable mode how long acks take.
+
+    python -m benchmarks.bench_chat_persistence
+"""
+import asyncio
+import json
+import random
+import statistics
+import time
+
+from fastapi import WebSocketDisconnect
+
+from benchmarks import common  # noqa: F401  (points DATABASE_NAME at the scratch database)
+from backend import server
+from backend.database import create_indexes, messages_collection
+from backend.message_writer import MessageWriter
+
+USERS = 200
+MESSAGES_PER_USER = 100
+
+MODES = {
+    "write-through": dict(write_behind=False),
+    "write-behind": dict(write_behind=True),
+    "durable": dict(write_behind=True, durable_acks=True),
+}
+
+
+class SimulatedWebSocket:
+    def __init__(self, user_id, messages):
+        self.frames = [
+            json.dumps({
+                "receiver_id": f"user-{random.randrange(USERS)}",
+                "content": f"hello from {user_id}",
+                "client_id": str(i)
+            })
+            for i in range(messages)
+        ]
+        self.sent_at = {}
+        self.ack_latencies = []
+        self.finished = asyncio.Event()
+
+    async def accept(self):
+        pass
+
+    async def receive_text(self):
+        if self.frames:
+            frame = self.frames.pop()
+            self.sent_at[json.loads(frame)["client_id"]] = time.perf_counter()
+            return frame
+        # Stay connected until every ack arrived so none are lost
+        await self.finished.wait()
+        raise WebSocketDisconnect(1000)
+
+    async def send_text(self, message):
+        frame = json.loads(message)
+        if frame.get("type") == "ack":
+            self.ack_latencies.append(time.perf_counter() - self.sent_at[frame["client_id"]])
+
+    async def close(self, code=1000):
+        pass
+
+
+async def run(mode, options):
+    await messages_collection.delete_many({})
+    server.message_writer = MessageWriter(**options)
+    await server.message_writer.start()
+    sockets = [SimulatedWebSocket(f"user-{i}", MESSAGES_PER_USER) for i in range(USERS)]
+
+    async def finish_when_acked(ws):
+        while options.get("durable_acks") and len(ws.ack_latencies) < MESSAGES_PER_USER:
+            await asyncio.sleep(0.01)
+        while ws.frames:
+            await asyncio.sleep(0.01)
+        ws.finished.set()
+
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(server.websocket_endpoint(ws, f"user-{i}") for i, ws in enumerate(sockets)),
+        *(finish_when_acked(ws) for ws in sockets)
+    )
+    forwarded = time.perf_counter() - started
+    await server.message_writer.stop()
+    stored = time.perf_counter() - started
+
+    total = USERS * MESSAGES_PER_USER
+    count = await messages_collection.count_documents({})
+    line = (f"{mode:<14} {total / forwarded:10,.0f} msg/s forwarded, "
+            f"{total / stored:10,.0f} msg/s stored ({count}/{total} in db)")
+    latencies = sorted(latency * 1000 for ws in sockets for latency in ws.ack_latencies)
+    if latencies:
+        line += (f", ack p50={statistics.median(latencies):.1f}ms "
+                 f"p95={latencies[int(len(latencies) * 0.95) - 1]:.1f}ms")
+    print(line)
+
+
+async def main():
+    await create_indexes()
+    await server.message_bus.start(server.manager.deliver)
+    for mode, options in MODES.items():
+        await run(mode, options)
+    await messages_collection.delete_many({})
+    await server.message_bus.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,48 @@
+"""In-process geo index versus per-item scalar haversine.
+
+Builds a GeoIndex over generated items and compares a 5 km radius search
+against the scalar haversine loop get_items used to run over every row,
+then times one 21-item page of a 50 km search (the frontend's default
+radius) and a k-nearest page. Needs no database.
+"""
+import asyncio
+import uuid
+
+from benchmarks.common import CENTER, make_item, measure, print_row
+from backend.geo_index import GeoIndex
+from backend.server import haversine
+
+SIZES = [10_000, 100_000, 1_000_000]
+
+
+async def main():
+    for size in SIZES:
+        owner_id = str(uuid.uuid4())
+        items = [make_item(owner_id) for _ in range(size)]
+        index = GeoIndex()
+        for item in items:
+            index.upsert(item)
+
+        async def scalar():
+            return [
+                item for item in items
+                if haversine(CENTER[0], CENTER[1], *item["location"]["coordinates"]) <= 5
+            ]
+
+        async def indexed():
+            return index.query_radius(CENTER[0], CENTER[1], 5)
+
+        async def page():
+            return index.query_radius(CENTER[0], CENTER[1], 50, limit=21)
+
+        async def nearest():
+            return index.query_nearest(CENTER[0], CENTER[1], 21)
+
+        print_row(f"{size} scalar haversine", await measure(scalar, repeat=5))
+        print_row(f"{size} index radius", await measure(indexed))
+        print_row(f"{size} index 50 km page", await measure(page))
+        print_row(f"{size} index k-nearest", await measure(nearest))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
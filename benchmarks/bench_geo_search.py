@@ -0,0 +1,42 @@
+"""Geo search latency as the item collection grows.
+
+Seeds increasing numbers of items around San Francisco and times the
+"near me" listing (5 km radius, first page) through list_items. With the
+$geoNear query the latency should stay roughly flat as the collection grows,
+and every returned page is full instead of being thinned out in Python.
+"""
+import asyncio
+import json
+
+from fastapi import Response
+
+from benchmarks.common import CENTER, measure, print_row, seed_items
+from backend.database import items_collection, create_indexes
+from backend.server import list_items
+
+SIZES = [1_000, 10_000, 100_000]
+
+
+async def main():
+    await items_collection.drop()
+    await create_indexes()
+
+    seeded = 0
+    for size in SIZES:
+        await seed_items(items_collection, size - seeded)
+        seeded = size
+
+        async def near_me():
+            return await list_items(Response(), category=None, lat=CENTER[1], lon=CENTER[0],
+                                    max_distance=5, limit=20, skip=0, cursor=None,
+                                    variant=None, fields=None)
+
+        page = await near_me()
+        stats = await measure(near_me)
+        print_row(f"{size} items ({len(json.loads(page.body))} hits)", stats)
+
+    await items_collection.drop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,44 @@
+"""Image variant rendering throughput against the number of worker processes.
+
+Renders thumbnail/card/full variants of generated photos through a
+ProcessPoolExecutor of increasing size and reports images per second.
+Needs no database.
+"""
+import io
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+from benchmarks import common  # noqa: F401  (points DATABASE_NAME at the scratch database)
+from backend.image_variants import render_variants
+
+IMAGES = 64
+WORKERS = [1, 2, 4, 8]
+
+
+def make_photo(width=2400, height=1800):
+    """A noisy JPEG roughly the size of a phone photo"""
+    image = Image.effect_noise((width // 4, height // 4), random.uniform(40, 90)).resize((width, height))
+    out = io.BytesIO()
+    image.convert("RGB").save(out, "JPEG", quality=90)
+    return out.getvalue()
+
+
+def main():
+    photos = [make_photo() for _ in range(IMAGES)]
+    print(f"{IMAGES} photos, {sum(map(len, photos)) / IMAGES / 1024:.0f} KiB average, {os.cpu_count()} CPUs")
+    for workers in WORKERS:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Warm the workers up so process start-up is not measured
+            list(pool.map(render_variants, photos[:workers]))
+            started = time.perf_counter()
+            list(pool.map(render_variants, photos))
+            elapsed = time.perf_counter() - started
+        print(f"{workers} workers: {IMAGES / elapsed:8.1f} images/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Full-text item search latency on a 1M item corpus.
+
+Seeds 1M items (reused if the scratch collection already holds them) with
+titles and descriptions drawn from a small marketplace vocabulary, then
+times list_items with q= for single and multi-word searches, searches
+combined with the category and radius filters, and typeahead prefixes.
+
+    python -m benchmarks.bench_item_search
+"""
+import asyncio
+import json
+import random
+import uuid
+
+from fastapi import Response
+
+from benchmarks.common import CENTER, make_item, measure, print_row
+from backend.database import items_collection, create_indexes
+from backend.search import search_prefixes
+from backend.server import list_items
+
+ITEMS = 1_000_000
+BATCH = 10_000
+
+ADJECTIVES = ["cordless", "vintage", "electric", "folding", "heavy", "portable", "wooden",
+              "compact", "professional", "waterproof", "leather", "kids", "camping", "gaming"]
+NOUNS = ["drill", "ladder", "tent", "camera", "bike", "jacket", "projector", "kayak", "sofa",
+         "saw", "speaker", "table", "drone", "generator", "trailer", "lens", "costume", "mixer"]
+FILLER = ["great", "condition", "pickup", "weekend", "includes", "charger", "case", "clean",
+          "barely", "used", "perfect", "for", "parties", "trips", "projects", "daily", "rental"]
+
+
+def make_search_item(owner_id):
+    item = make_item(owner_id)
+    title = f"{random.choice(ADJECTIVES)} {random.choice(NOUNS)} {random.randint(1, 999)}"
+    item["title"] = title
+    item["description"] = " ".join(random.choices(ADJECTIVES + NOUNS + FILLER * 3, k=25))
+    item["search_prefixes"] = search_prefixes(title)
+    return item
+
+
+async def seed():
+    if await items_collection.estimated_document_count() >= ITEMS:
+        return
+    await items_collection.drop()
+    owner_id = str(uuid.uuid4())
+    for _ in range(0, ITEMS, BATCH):
+        await items_collection.insert_many(
+            [make_search_item(owner_id) for _ in range(BATCH)], ordered=False
+        )
+    # Building the text index once after loading is much faster than per insert
+    await create_indexes()
+
+
+def search(**params):
+    arguments = dict(category=None, lat=None, lon=None, max_distance=None, limit=20, skip=0,
+                     cursor=None, variant=None, fields=None, available_from=None,
+                     available_to=None, q=None, prefix=False)
+    arguments.update(params)
+    return lambda: list_items(Response(), **arguments)
+
+
+async def main():
+    await seed()
+    await create_indexes()
+
+    cases = [
+        ("one word", search(q="kayak")),
+        ("two words", search(q="portable projector")),
+        ("word + category", search(q="drill", category="tools")),
+        ("word within 10 km", search(q="tent", lat=CENTER[1], lon=CENTER[0], max_distance=10)),
+        ("word, nearest first", search(q="camera", lat=CENTER[1], lon=CENTER[0])),
+        ("prefix", search(q="gen", prefix=True)),
+        ("word + prefix", search(q="cordless dr", prefix=True)),
+        ("page 3", search(q="sofa", skip=40)),
+    ]
+    for label, run in cases:
+        hits = len(json.loads((await run()).body))
+        print_row(f"{label} ({hits} hits)", await measure(run, repeat=100))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
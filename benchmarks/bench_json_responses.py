@@ -0,0 +1,111 @@
+"""Requests per second per core for list responses, before and after json_list.
+
+Serves 100-row pages of item summaries, bookings and messages from memory
+through a small FastAPI app in-process (one core, no database, no network):
+
+* before: the handler builds a model per row and FastAPI validates and
+  encodes the list again through response_model
+* after: the handler returns json_list, one validation and a direct dump
+
+Also checks that both produce the same JSON.
+
+    python -m benchmarks.bench_json_responses
+"""
+import asyncio
+import time
+import uuid
+from datetime import datetime
+from typing import List
+
+import httpx
+from fastapi import FastAPI, Response
+
+from benchmarks.common import make_item
+from backend.models import (
+    BookingSummary, ItemSummary, MessageResponse, ITEM_SUMMARY_EXTRA_FIELDS
+)
+from backend.responses import json_list
+from backend.server import item_summary, summary_fields
+
+ROWS = 100
+REQUESTS = 2_000
+
+
+def make_booking():
+    now = datetime.utcnow()
+    return {
+        "id": str(uuid.uuid4()), "item_id": str(uuid.uuid4()), "renter_id": str(uuid.uuid4()),
+        "owner_id": str(uuid.uuid4()), "start_date": "2024-06-01", "end_date": "2024-06-03",
+        "total_amount": 42.5, "status": "pending", "message": "Can I pick it up early?",
+        "created_at": now, "updated_at": now
+    }
+
+
+def make_message():
+    sender, receiver = str(uuid.uuid4()), str(uuid.uuid4())
+    return {
+        "id": str(uuid.uuid4()), "conversation_id": f"{sender}:{receiver}",
+        "sender_id": sender, "receiver_id": receiver, "content": "Is it still available?",
+        "message_type": "text", "is_read": False, "created_at": datetime.utcnow()
+    }
+
+
+def build_app():
+    field_names = summary_fields(ItemSummary, ITEM_SUMMARY_EXTRA_FIELDS, None)
+    items = [make_item(str(uuid.uuid4())) for _ in range(ROWS)]
+    bookings = [make_booking() for _ in range(ROWS)]
+    messages = [make_message() for _ in range(ROWS)]
+    app = FastAPI()
+
+    @app.get("/before/items", response_model=List[ItemSummary], response_model_exclude_unset=True)
+    async def items_before():
+        return [ItemSummary(**item_summary(item, field_names, None)) for item in items]
+
+    @app.get("/after/items", response_model=List[ItemSummary], response_model_exclude_unset=True)
+    async def items_after(response: Response):
+        return json_list(ItemSummary, (item_summary(item, field_names, None) for item in items),
+                         response, exclude_unset=True)
+
+    @app.get("/before/bookings", response_model=List[BookingSummary], response_model_exclude_unset=True)
+    async def bookings_before():
+        return [BookingSummary(**booking) for booking in bookings]
+
+    @app.get("/after/bookings", response_model=List[BookingSummary], response_model_exclude_unset=True)
+    async def bookings_after(response: Response):
+        return json_list(BookingSummary, bookings, response, exclude_unset=True)
+
+    @app.get("/before/messages", response_model=List[MessageResponse])
+    async def messages_before():
+        return [MessageResponse(**message) for message in messages]
+
+    @app.get("/after/messages", response_model=List[MessageResponse])
+    async def messages_after():
+        return json_list(MessageResponse, messages)
+
+    return app
+
+
+async def requests_per_second(client, path):
+    for _ in range(50):
+        await client.get(path)
+    started = time.process_time()
+    for _ in range(REQUESTS):
+        await client.get(path)
+    return REQUESTS / (time.process_time() - started)
+
+
+async def main():
+    transport = httpx.ASGITransport(app=build_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for resource in ("items", "bookings", "messages"):
+            before = await client.get(f"/before/{resource}")
+            after = await client.get(f"/after/{resource}")
+            same = "same JSON" if before.content == after.content else "JSON DIFFERS"
+            before_rps = await requests_per_second(client, f"/before/{resource}")
+            after_rps = await requests_per_second(client, f"/after/{resource}")
+            print(f"{resource:<9} {ROWS} rows: before {before_rps:7.0f} req/s/core, "
+                  f"after {after_rps:7.0f} req/s/core ({after_rps / before_rps:.2f}x, {same})")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,65 @@
+"""Bytes and latency per listing page: full documents vs projected summaries.
+
+Seeds items shaped like real listings (long description, several images,
+a year of available dates) and compares loading a 20-item page as full
+ItemResponse models against the projected ItemSummary page list_items now
+serves.
+"""
+import asyncio
+import json
+import uuid
+from datetime import datetime, timedelta
+
+from fastapi import Response
+
+from benchmarks.common import make_item, measure, print_row
+from backend.database import items_collection, create_indexes
+from backend.models import ItemResponse
+from backend.pagination import RECENT_SORT
+from backend.server import list_items
+
+ITEMS = 5_000
+PAGE = 20
+
+
+def listing(owner_id):
+    item = make_item(owner_id)
+    item["is_available"] = True
+    item["description"] = "x" * 2000
+    item["images"] = [f"/api/images/{uuid.uuid4().hex * 2}" for _ in range(4)]
+    item["available_dates"] = [
+        (datetime.utcnow() + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(365)
+    ]
+    return item
+
+
+def page_bytes(page):
+    # list_items renders its own JSON response
+    if isinstance(page, Response):
+        return len(page.body)
+    return len(json.dumps([m.model_dump(mode="json", exclude_unset=True) for m in page]))
+
+
+async def main():
+    await items_collection.drop()
+    await create_indexes()
+    owner_id = str(uuid.uuid4())
+    await items_collection.insert_many([listing(owner_id) for _ in range(ITEMS)])
+
+    async def full_page():
+        items = await items_collection.find({"is_available": True}).sort(RECENT_SORT).limit(PAGE).to_list(length=PAGE)
+        return [ItemResponse(**item) for item in items]
+
+    async def summary_page():
+        return await list_items(Response(), category=None, lat=None, lon=None, max_distance=None,
+                                limit=PAGE, skip=0, cursor=None, variant=None, fields=None)
+
+    for label, page in (("full ItemResponse", full_page), ("ItemSummary", summary_page)):
+        size = page_bytes(await page())
+        print_row(f"{label} ({size / 1024:.1f} KiB)", await measure(page))
+
+    await items_collection.drop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
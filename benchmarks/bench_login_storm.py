@@ -0,0 +1,75 @@
+"""Latency of unrelated endpoints during a login storm.
+
+Runs against a live server (like backend_test.py). Samples GET /api/items
+latency on its own, then again while many clients log in concurrently.
+With bcrypt on the password pool the p99 of the listing should barely
+move; logins beyond the pool's queue limit get 503s instead of stalling
+the event loop.
+
+    python -m benchmarks.bench_login_storm
+"""
+import asyncio
+import os
+import random
+import string
+import time
+
+import httpx
+
+BASE_URL = os.environ.get("BASE_URL", "http://localhost:8001")
+STORM_CLIENTS = 200
+SAMPLES = 300
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    pick = lambda q: samples[min(len(samples) - 1, int(len(samples) * q))]
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99)}
+
+
+async def sample_listing(client, count):
+    latencies = []
+    for _ in range(count):
+        started = time.perf_counter()
+        await client.get("/api/items", params={"limit": 20})
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0.01)
+    return percentiles(latencies)
+
+
+async def login_forever(client, credentials, stop, outcomes):
+    while not stop.is_set():
+        response = await client.post("/api/auth/login", json=credentials)
+        outcomes[response.status_code] = outcomes.get(response.status_code, 0) + 1
+
+
+async def main():
+    suffix = "".join(random.choice(string.ascii_lowercase) for _ in range(8))
+    credentials = {"email": f"storm_{suffix}@example.com", "password": "Password123!"}
+    limits = httpx.Limits(max_connections=STORM_CLIENTS + 10)
+    async with httpx.AsyncClient(base_url=BASE_URL, timeout=60, limits=limits) as client:
+        response = await client.post("/api/auth/register", json={
+            "username": f"storm_{suffix}", "full_name": "Storm User", **credentials
+        })
+        response.raise_for_status()
+
+        baseline = await sample_listing(client, SAMPLES)
+
+        stop = asyncio.Event()
+        outcomes = {}
+        storm = [
+            asyncio.create_task(login_forever(client, credentials, stop, outcomes))
+            for _ in range(STORM_CLIENTS)
+        ]
+        await asyncio.sleep(1)
+        during = await sample_listing(client, SAMPLES)
+        stop.set()
+        await asyncio.gather(*storm)
+
+    for label, stats in (("GET /api/items idle", baseline), ("GET /api/items in storm", during)):
+        print(f"{label:<26} p50={stats['p50']:7.2f}ms p95={stats['p95']:7.2f}ms p99={stats['p99']:7.2f}ms")
+    print(f"Login responses during the storm: {outcomes}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+"""Conversation history on a 100k-message conversation.
+
+Seeds one two-person conversation with 100k messages, plus as many spread
+over other conversations, then compares loading the whole history the way
+get_messages used to (an $or over both directions, sorted in memory) with
+the paged endpoint: the latest page, a page deep in the past via before=,
+and a delta sync via since= that only returns the last few messages.
+
+    python -m benchmarks.bench_message_history
+"""
+import asyncio
+import random
+import uuid
+from datetime import datetime, timedelta
+
+from benchmarks.common import measure, print_row
+from backend.conversations import conversation_id
+from backend.database import create_indexes, messages_collection
+from backend.server import get_messages
+
+MESSAGES = 100_000
+OTHER_MESSAGES = 100_000
+BATCH = 10_000
+
+
+def make_message(sender_id, receiver_id, created_at):
+    return {
+        "id": str(uuid.uuid4()),
+        "conversation_id": conversation_id(sender_id, receiver_id),
+        "sender_id": sender_id,
+        "receiver_id": receiver_id,
+        "content": "Is this still available next weekend?",
+        "message_type": "text",
+        "is_read": True,
+        "created_at": created_at
+    }
+
+
+async def seed(alice, bob):
+    start = datetime.utcnow() - timedelta(seconds=MESSAGES)
+    for offset in range(0, MESSAGES, BATCH):
+        await messages_collection.insert_many([
+            make_message(*random.sample([alice, bob], 2), start + timedelta(seconds=i))
+            for i in range(offset, offset + BATCH)
+        ], ordered=False)
+    others = [str(uuid.uuid4()) for _ in range(1000)]
+    for offset in range(0, OTHER_MESSAGES, BATCH):
+        await messages_collection.insert_many([
+            make_message(*random.sample(others, 2), start + timedelta(seconds=random.randrange(MESSAGES)))
+            for _ in range(BATCH)
+        ], ordered=False)
+
+
+async def full_history(alice, bob):
+    # The query get_messages ran before conversations were paged
+    return await messages_collection.find({
+        "$or": [
+            {"sender_id": alice, "receiver_id": bob},
+            {"sender_id": bob, "receiver_id": alice}
+        ]
+    }).sort("created_at", 1).to_list(length=None)
+
+
+async def main():
+    await messages_collection.delete_many({})
+    await create_indexes()
+    alice, bob = str(uuid.uuid4()), str(uuid.uuid4())
+    await seed(alice, bob)
+    user = {"id": alice}
+
+    history = await messages_collection.find(
+        {"conversation_id": conversation_id(alice, bob)}, {"_id": 0, "id": 1}
+    ).sort([("created_at", 1), ("id", 1)]).to_list(length=None)
+    middle = history[len(history) // 2]["id"]
+    recent = history[-5]["id"]
+
+    print_row("full history (old)", await measure(lambda: full_history(alice, bob), repeat=5))
+    print_row("latest page", await measure(
+        lambda: get_messages(bob, before=None, since=None, limit=50, current_user=user)
+    ))
+    print_row("page before middle", await measure(
+        lambda: get_messages(bob, before=middle, since=None, limit=50, current_user=user)
+    ))
+    print_row("since 5 from the end", await measure(
+        lambda: get_messages(bob, before=None, since=recent, limit=50, current_user=user)
+    ))
+
+    await messages_collection.delete_many({})
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
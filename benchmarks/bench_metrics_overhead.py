@@ -0,0 +1,64 @@
+"""Cost of the metrics middleware per request.
+
+Serves a small JSON response from a FastAPI app in-process (one core, no
+database, no network), without and with MetricsMiddleware, and reports
+requests per second per core and the time the middleware adds to each
+request. Also times one scrape of /metrics with a realistic number of
+series.
+
+    python -m benchmarks.bench_metrics_overhead
+"""
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from backend.metrics import MetricsMiddleware, http_request_seconds, http_requests, registry
+
+REQUESTS = 5_000
+ROUTES = 40
+
+
+def build_app(instrumented):
+    app = FastAPI()
+
+    @app.get("/api/items/{item_id}")
+    async def get_item(item_id: str):
+        return {"id": item_id, "title": "Cordless drill", "price_per_day": 12.5}
+
+    if instrumented:
+        app.add_middleware(MetricsMiddleware)
+    return app
+
+
+async def requests_per_second(app):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(100):
+            await client.get("/api/items/warmup")
+        started = time.process_time()
+        for n in range(REQUESTS):
+            await client.get(f"/api/items/{n}")
+        return REQUESTS / (time.process_time() - started)
+
+
+async def main():
+    before = await requests_per_second(build_app(False))
+    after = await requests_per_second(build_app(True))
+    added_us = (1 / after - 1 / before) * 1e6
+    print(f"without metrics {before:7.0f} req/s/core, with metrics {after:7.0f} req/s/core "
+          f"({added_us:.1f}us added per request)")
+
+    # Fill the registry with a realistic number of route series, then scrape
+    for route in range(ROUTES):
+        for status in ("200", "404"):
+            http_requests.inc("GET", f"/api/route{route}", status)
+        http_request_seconds.observe(0.01, "GET", f"/api/route{route}")
+    started = time.perf_counter()
+    body = registry.render()
+    print(f"scrape with {len(body.splitlines())} lines: {(time.perf_counter() - started) * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+"""Opening a chat with many unread messages: per-message vs bulk read receipts.
+
+Seeds conversations with 200 and 2000 unread messages and marks them read
+the old way, one mark_message_read call (one HTTP request, one update_one)
+per message, and with a single mark-conversation-read call. Reports the
+number of requests and the time until the whole chat is read.
+
+    python -m benchmarks.bench_read_receipts
+"""
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from benchmarks import common  # noqa: F401  (points DATABASE_NAME at the scratch database)
+from backend.conversations import conversation_id, record_messages
+from backend.database import conversations_collection, create_indexes, messages_collection
+from backend.models import MarkReadRequest
+from backend.server import mark_conversation_as_read, mark_message_read
+
+UNREAD_COUNTS = [200, 2000]
+
+
+async def seed(sender, reader, count):
+    start = datetime.utcnow() - timedelta(seconds=count)
+    messages = [
+        {
+            "id": str(uuid.uuid4()),
+            "conversation_id": conversation_id(sender, reader),
+            "sender_id": sender,
+            "receiver_id": reader,
+            "content": f"Message {i}",
+            "message_type": "text",
+            "is_read": False,
+            "created_at": start + timedelta(seconds=i)
+        }
+        for i in range(count)
+    ]
+    await messages_collection.insert_many(messages)
+    await record_messages(messages)
+    return [message["id"] for message in messages]
+
+
+async def reset(sender, reader):
+    await messages_collection.update_many(
+        {"conversation_id": conversation_id(sender, reader)}, {"$set": {"is_read": False}}
+    )
+    await conversations_collection.delete_many({})
+    messages = await messages_collection.find(
+        {"conversation_id": conversation_id(sender, reader)}, {"_id": 0}
+    ).to_list(length=None)
+    await record_messages(messages)
+
+
+async def main():
+    await create_indexes()
+    for count in UNREAD_COUNTS:
+        await messages_collection.delete_many({})
+        await conversations_collection.delete_many({})
+        sender, reader = str(uuid.uuid4()), str(uuid.uuid4())
+        ids = await seed(sender, reader, count)
+        user = {"id": reader}
+
+        started = time.perf_counter()
+        for message_id in ids:
+            await mark_message_read(message_id, current_user=user)
+        per_message = time.perf_counter() - started
+
+        await reset(sender, reader)
+        started = time.perf_counter()
+        await mark_conversation_as_read(sender, MarkReadRequest(up_to=ids[-1]), current_user=user)
+        bulk = time.perf_counter() - started
+
+        unread = await messages_collection.count_documents({"receiver_id": reader, "is_read": False})
+        print(f"{count:>5} unread  per message: {count:>5} requests {per_message * 1000:9.1f}ms   "
+              f"bulk: 1 request {bulk * 1000:7.1f}ms   left unread: {unread}")
+
+    await messages_collection.delete_many({})
+    await conversations_collection.delete_many({})
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
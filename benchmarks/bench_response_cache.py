@@ -0,0 +1,138 @@
+"""Hit ratio and latency of cached GETs on a realistic read/write mix.
+
+Seeds items with a few reviews each and replays the same request mix with
+the response cache disabled and enabled. Reads go through the app over an
+in-process ASGI transport; item popularity is Zipf-skewed, as it is on the
+live site. The mix per 100 operations:
+
+* 55 item detail pages, a quarter of them revalidated with If-None-Match
+* 20 listing pages (category browse, near me)
+* 23 review lists
+* 2 item updates through update_item, which invalidate the item and
+  every listing
+
+    python -m benchmarks.bench_response_cache
+"""
+import asyncio
+import random
+import time
+import uuid
+from datetime import datetime
+
+import httpx
+from fastapi import BackgroundTasks
+
+from benchmarks.common import CATEGORIES, CENTER, make_item, print_row
+from backend.database import create_indexes, items_collection, reviews_collection
+from backend.models import ItemUpdate
+from backend.server import app, response_cache, update_item
+
+ITEMS = 2_000
+REVIEWS_PER_ITEM = 5
+OPERATIONS = 5_000
+ZIPF_EXPONENT = 1.1
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        "p50": samples[len(samples) // 2],
+        "p95": samples[int(len(samples) * 0.95) - 1],
+        "p99": samples[int(len(samples) * 0.99) - 1]
+    }
+
+
+def build_mix(items, seed=42):
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) ** ZIPF_EXPONENT for rank in range(len(items))]
+    popular = rng.choices(items, weights, k=OPERATIONS)
+    mix = []
+    for item in popular:
+        roll = rng.random()
+        if roll < 0.55:
+            mix.append(("item", item, rng.random() < 0.25))
+        elif roll < 0.65:
+            mix.append(("listing", f"/api/items?category={rng.choice(CATEGORIES)}&limit=20", False))
+        elif roll < 0.75:
+            mix.append(("listing", f"/api/items?lat={CENTER[1]}&lon={CENTER[0]}&max_distance=5&limit=20", False))
+        elif roll < 0.98:
+            mix.append(("reviews", item, False))
+        else:
+            mix.append(("write", item, False))
+    return mix
+
+
+async def seed():
+    owner = {"id": str(uuid.uuid4())}
+    items = [make_item(owner["id"]) for _ in range(ITEMS)]
+    await items_collection.insert_many(items)
+    reviews = [
+        {
+            "id": str(uuid.uuid4()), "item_id": item["id"], "reviewer_id": str(uuid.uuid4()),
+            "booking_id": str(uuid.uuid4()), "rating": random.randint(1, 5),
+            "comment": "Worked great, would rent again.", "created_at": datetime.utcnow()
+        }
+        for item in items for _ in range(REVIEWS_PER_ITEM)
+    ]
+    await reviews_collection.insert_many(reviews)
+    return owner, [item["id"] for item in items]
+
+
+async def run(client, mix, owner):
+    latencies = {"item": [], "listing": [], "reviews": []}
+    etags = {}
+    for kind, target, revalidate in mix:
+        if kind == "write":
+            await update_item(target, ItemUpdate(price_per_day=round(random.uniform(5, 200), 2)),
+                              BackgroundTasks(), current_user=owner)
+            continue
+        headers = {}
+        if kind == "item":
+            path = f"/api/items/{target}"
+            if revalidate and target in etags:
+                headers["If-None-Match"] = etags[target]
+        elif kind == "reviews":
+            path = f"/api/reviews/{target}"
+        else:
+            path = target
+        started = time.perf_counter()
+        response = await client.get(path, headers=headers)
+        latencies[kind].append((time.perf_counter() - started) * 1000)
+        if kind == "item" and "etag" in response.headers:
+            etags[target] = response.headers["etag"]
+    return latencies
+
+
+async def main():
+    await create_indexes()
+    await items_collection.delete_many({})
+    await reviews_collection.delete_many({})
+    owner, item_ids = await seed()
+    mix = build_mix(item_ids)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        results = {}
+        for label, enabled in (("uncached", False), ("cached", True)):
+            response_cache.enabled = enabled
+            response_cache.hits = response_cache.misses = 0
+            response_cache.not_modified = response_cache.invalidations = 0
+            results[label] = await run(client, mix, owner)
+            stats = response_cache.stats()
+
+    print(f"{OPERATIONS} operations over {ITEMS} items, "
+          f"hit ratio {stats['hit_rate']:.1%}, {stats['not_modified']} x 304, "
+          f"{stats['invalidations']} invalidations")
+    for kind in ("item", "listing", "reviews"):
+        for label in ("uncached", "cached"):
+            print_row(f"{kind} ({label})", summarize(results[label][kind]))
+    for label in ("uncached", "cached"):
+        total = sum(sum(samples) for samples in results[label].values())
+        print(f"total read time ({label}): {total:9.1f}ms")
+
+    await items_collection.delete_many({})
+    await reviews_collection.delete_many({})
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
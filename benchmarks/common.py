@@ -0,0 +1,88 @@
+"""Shared helpers for the backend benchmarks.
+
+Benchmarks run in-process against the handler functions in backend.server and
+a scratch database (``p2p_benchmark`` unless DATABASE_NAME is set), so they
+must be started from the repository root, e.g.::
+
+    python -m benchmarks.bench_geo_search
+"""
+import os
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta
+from math import cos, radians, sin
+
+# Never seed the real marketplace database
+os.environ.setdefault("DATABASE_NAME", "p2p_benchmark")
+
+# San Francisco, the same location the functional tests use
+CENTER = (-122.4194, 37.7749)
+
+CATEGORIES = ["clothes", "tools", "electronics", "furniture", "vehicles", "other"]
+
+
+def random_point(center=CENTER, radius_km=50.0):
+    """Random [lon, lat] roughly uniformly spread within radius_km of center"""
+    lon, lat = center
+    r = radius_km * random.random() ** 0.5
+    angle = random.uniform(0, 360)
+    dlat = r * cos(radians(angle)) / 111.32
+    dlon = r * sin(radians(angle)) / (111.32 * cos(radians(lat)))
+    return [lon + dlon, lat + dlat]
+
+
+def make_item(owner_id, created_at=None, radius_km=50.0):
+    """Build an item document shaped like the ones create_item stores"""
+    now = created_at or datetime.utcnow()
+    return {
+        "id": str(uuid.uuid4()),
+        "owner_id": owner_id,
+        "title": f"Benchmark item {random.randint(0, 10**6)}",
+        "description": "Generated by the benchmark seeder. " * 10,
+        "category": random.choice(CATEGORIES),
+        "price_per_day": round(random.uniform(5, 200), 2),
+        "images": [],
+        "location": {"type": "Point", "coordinates": random_point(radius_km=radius_km)},
+        "available_dates": [
+            (now + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(1, 30)
+        ],
+        "is_available": random.random() < 0.9,
+        "rating": 0.0,
+        "total_reviews": 0,
+        "created_at": now,
+        "updated_at": now
+    }
+
+
+async def seed_items(collection, count, batch_size=5000, radius_km=50.0):
+    """Insert count generated items in batches"""
+    owner_id = str(uuid.uuid4())
+    start = datetime.utcnow() - timedelta(seconds=count)
+    for offset in range(0, count, batch_size):
+        batch = [
+            make_item(owner_id, start + timedelta(seconds=offset + i), radius_km)
+            for i in range(min(batch_size, count - offset))
+        ]
+        await collection.insert_many(batch, ordered=False)
+
+
+async def measure(coro_factory, repeat=50):
+    """Await coro_factory() repeat times and return latency stats in ms"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await coro_factory()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "p50": statistics.median(samples),
+        "p95": samples[int(len(samples) * 0.95) - 1],
+        "p99": samples[int(len(samples) * 0.99) - 1],
+        "mean": statistics.fmean(samples)
+    }
+
+
+def print_row(label, stats):
+    print(f"{label:<28} p50={stats['p50']:8.2f}ms p95={stats['p95']:8.2f}ms p99={stats['p99']:8.2f}ms")
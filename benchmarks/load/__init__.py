@@ -0,0 +1,27 @@
+"""Load generation against a live server.
+
+Unlike the other benchmarks, which call handlers in-process, this suite
+drives a running server over HTTP and WebSocket from many concurrent
+virtual users, so it measures the whole stack: uvicorn, middleware,
+serialization, Mongo and the chat fan-out.
+
+1. Seed a scratch database (``p2p_benchmark`` unless DATABASE_NAME is set)
+   and write a manifest of the generated users, items and conversations::
+
+       python -m benchmarks.load.seed --users 2000 --items 50000
+
+2. Start the server on the same database::
+
+       DATABASE_NAME=p2p_benchmark uvicorn backend.server:app --port 8001
+
+3. Run a scenario profile, then compare later runs against a baseline::
+
+       python -m benchmarks.load.run --profile mixed --users 100 --duration 60 \\
+           --output results.json --save-baseline baseline.json
+       python -m benchmarks.load.run --profile mixed --users 100 --duration 60 \\
+           --baseline baseline.json
+
+The run prints requests per second and p50/p95/p99 per route, writes the
+same numbers as JSON, and exits with status 1 when a route regressed past
+the threshold.
+"""
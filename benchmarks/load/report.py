@@ -0,0 +1,112 @@
+"""Per-route latency recording, the JSON report and the baseline check."""
+import math
+from typing import Dict, List
+
+# Upper bounds of the latency histogram buckets, in ms; the last bucket is open
+HISTOGRAM_BOUNDS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+LATENCY_METRICS = ("p50", "p95", "p99")
+
+
+class RouteStats:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.statuses: Dict[str, int] = {}
+        self.errors = 0
+
+
+class Recorder:
+    """Collects one sample per request, keyed by route template.
+
+    Samples are dropped until ``recording`` is set, so the warm-up period
+    does not count.
+    """
+
+    def __init__(self):
+        self.routes: Dict[str, RouteStats] = {}
+        self.recording = False
+
+    def record(self, route: str, latency_ms: float, status: str, error: bool):
+        if not self.recording:
+            return
+        stats = self.routes.setdefault(route, RouteStats())
+        stats.latencies.append(latency_ms)
+        stats.statuses[status] = stats.statuses.get(status, 0) + 1
+        if error:
+            stats.errors += 1
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+def histogram(ordered: List[float]) -> Dict[str, int]:
+    buckets = {f"le_{bound}": 0 for bound in HISTOGRAM_BOUNDS_MS}
+    buckets["inf"] = 0
+    for latency in ordered:
+        for bound in HISTOGRAM_BOUNDS_MS:
+            if latency <= bound:
+                buckets[f"le_{bound}"] += 1
+                break
+        else:
+            buckets["inf"] += 1
+    return buckets
+
+
+def summarize(recorder: Recorder, elapsed: float) -> Dict[str, dict]:
+    routes = {}
+    for route, stats in sorted(recorder.routes.items()):
+        ordered = sorted(stats.latencies)
+        routes[route] = {
+            "count": len(ordered),
+            "errors": stats.errors,
+            "error_rate": stats.errors / len(ordered),
+            "rps": len(ordered) / elapsed,
+            "p50": percentile(ordered, 0.50),
+            "p95": percentile(ordered, 0.95),
+            "p99": percentile(ordered, 0.99),
+            "mean": sum(ordered) / len(ordered),
+            "max": ordered[-1],
+            "statuses": stats.statuses,
+            "histogram_ms": histogram(ordered)
+        }
+    return routes
+
+
+def print_table(routes: Dict[str, dict]):
+    print(f"{'route':<44} {'count':>7} {'err':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for route, stats in routes.items():
+        print(f"{route:<44} {stats['count']:>7} {stats['errors']:>5} {stats['rps']:>8.1f} "
+              f"{stats['p50']:>7.1f}ms {stats['p95']:>6.1f}ms {stats['p99']:>6.1f}ms")
+
+
+def compare(routes: Dict[str, dict], baseline: Dict[str, dict], threshold: float,
+            min_samples: int, min_delta_ms: float) -> List[str]:
+    """Regressions of routes against a baseline run, as readable lines.
+
+    A latency percentile regresses when it grew by more than threshold
+    (a fraction) and by at least min_delta_ms; throughput when it fell by
+    more than threshold; errors when the error rate rose by over a point.
+    Routes with fewer than min_samples requests in the baseline are too
+    noisy to judge and are skipped.
+    """
+    regressions = []
+    for route, before in baseline.items():
+        if before["count"] < min_samples:
+            continue
+        after = routes.get(route)
+        if after is None:
+            regressions.append(f"{route}: no requests completed (baseline {before['count']})")
+            continue
+        for metric in LATENCY_METRICS:
+            if (after[metric] > before[metric] * (1 + threshold)
+                    and after[metric] - before[metric] >= min_delta_ms):
+                regressions.append(f"{route}: {metric} {before[metric]:.1f}ms -> {after[metric]:.1f}ms")
+        if after["rps"] < before["rps"] * (1 - threshold):
+            regressions.append(f"{route}: rps {before['rps']:.1f} -> {after['rps']:.1f}")
+        if after["error_rate"] > before["error_rate"] + 0.01:
+            regressions.append(
+                f"{route}: error rate {before['error_rate']:.1%} -> {after['error_rate']:.1%}"
+            )
+    return regressions
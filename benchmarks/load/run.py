@@ -0,0 +1,179 @@
+"""Run a scenario profile against a live server and report per-route latency.
+
+Virtual users are closed-loop: each runs its scenario, waits an
+exponentially distributed think time and starts again. They start spread
+over the warm-up period, which is not recorded.
+
+    python -m benchmarks.load.run --profile mixed --users 100 --duration 60 \\
+        --output results.json --baseline baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+import httpx
+
+from benchmarks.load.report import Recorder, compare, print_table, summarize
+from benchmarks.load.scenarios import PROFILES, SCENARIOS, Session
+
+BASE_URL = os.environ.get("BASE_URL", "http://localhost:8001")
+# Logins hash passwords on the server; more at once only queue there
+LOGIN_CONCURRENCY = 8
+LOGIN_ATTEMPTS = 5
+
+
+def assign_scenarios(profile: dict, users: int):
+    """Scenario name per virtual user, split by the profile's shares"""
+    names = []
+    for name, share in profile.items():
+        names += [name] * round(share * users)
+    names += [next(iter(profile))] * (users - len(names))
+    return names[:users]
+
+
+async def login(client: httpx.AsyncClient, manifest: dict, user: dict, semaphore: asyncio.Semaphore):
+    async with semaphore:
+        for attempt in range(LOGIN_ATTEMPTS):
+            response = await client.post("/api/auth/login", json={
+                "email": user["email"], "password": manifest["password"]
+            })
+            # 503 means the password pool is saturated; back off and retry
+            if response.status_code != 503:
+                break
+            await asyncio.sleep(0.5 * (attempt + 1))
+        response.raise_for_status()
+        return response.json()["access_token"]
+
+
+async def virtual_user(session: Session, scenario, stop: asyncio.Event, ramp_up: float,
+                       think_time: float):
+    await asyncio.sleep(session.rng.uniform(0, ramp_up))
+    while not stop.is_set():
+        try:
+            await scenario(session)
+        except Exception as e:
+            print(f"{scenario.__name__} scenario failed for {session.user['id']}: {e!r}")
+        if think_time:
+            await asyncio.sleep(session.rng.expovariate(1 / think_time))
+    await session.close()
+
+
+async def run(args) -> int:
+    with open(args.manifest) as f:
+        manifest = json.load(f)
+    if args.users > len(manifest["users"]):
+        print(f"The manifest only has {len(manifest['users'])} users; seed more or lower --users")
+        return 2
+
+    rng = random.Random(args.seed)
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.users + 10, max_keepalive_connections=args.users + 10)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        users = rng.sample(manifest["users"], args.users)
+        names = assign_scenarios(PROFILES[args.profile], args.users)
+
+        # Browsing and searching are anonymous; only log in users that need a token
+        semaphore = asyncio.Semaphore(LOGIN_CONCURRENCY)
+        tokens = await asyncio.gather(*(
+            login(client, manifest, user, semaphore) if name in ("booking", "chat") else asyncio.sleep(0)
+            for user, name in zip(users, names)
+        ))
+
+        ws_url = args.base_url.replace("http", "ws", 1)
+        sessions = [
+            Session(client, recorder, manifest, user, token, random.Random(rng.random()), ws_url)
+            for user, token in zip(users, tokens)
+        ]
+        chatting = [session.user["id"] for session, name in zip(sessions, names) if name == "chat"]
+        for session, name in zip(sessions, names):
+            if name == "chat":
+                # Talk to other chatting users, so deliveries can be timed
+                session.peers = [peer for peer in chatting if peer != session.user["id"]] or chatting
+
+        stop = asyncio.Event()
+        tasks = [
+            asyncio.create_task(virtual_user(session, SCENARIOS[name], stop, args.warmup, args.think_time))
+            for session, name in zip(sessions, names)
+        ]
+        await asyncio.sleep(args.warmup)
+        started_at = datetime.utcnow()
+        recorder.recording = True
+        started = time.perf_counter()
+        await asyncio.sleep(args.duration)
+        recorder.recording = False
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await asyncio.gather(*tasks)
+
+    routes = summarize(recorder, elapsed)
+    total = sum(stats["count"] for stats in routes.values())
+    results = {
+        "profile": args.profile,
+        "users": args.users,
+        "base_url": args.base_url,
+        "started_at": started_at.isoformat(),
+        "duration_s": elapsed,
+        "think_time_s": args.think_time,
+        "total": {
+            "count": total,
+            "errors": sum(stats["errors"] for stats in routes.values()),
+            "rps": total / elapsed
+        },
+        "routes": routes
+    }
+
+    print_table(routes)
+    print(f"{total} requests in {elapsed:.1f}s, {results['total']['rps']:.1f} req/s, "
+          f"{results['total']['errors']} errors")
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if (baseline["profile"], baseline["users"]) != (args.profile, args.users):
+            print(f"Baseline was recorded with profile {baseline['profile']} and "
+                  f"{baseline['users']} users; compare runs with the same settings")
+            return 2
+        regressions = compare(routes, baseline["routes"], args.threshold, args.min_samples,
+                              args.min_delta_ms)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print(f"No regressions against {args.baseline} (threshold {args.threshold:.0%})")
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="mixed")
+    parser.add_argument("--users", type=int, default=50, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=60, help="recorded seconds")
+    parser.add_argument("--warmup", type=float, default=10, help="unrecorded seconds while users ramp up")
+    parser.add_argument("--think-time", type=float, default=1.0, help="mean seconds between scenarios")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--manifest", default="load_manifest.json")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--save-baseline", help="also write the JSON report here, as the new baseline")
+    parser.add_argument("--baseline", help="fail (exit 1) on regressions against this report")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed relative growth of p50/p95/p99 and drop of rps")
+    parser.add_argument("--min-samples", type=int, default=100,
+                        help="routes with fewer baseline requests are not checked")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0,
+                        help="latency growth below this never counts as a regression")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run(parse_args())))
@@ -0,0 +1,174 @@
+"""Virtual user sessions and the scenario profiles they run.
+
+A scenario is one pass of something a real user does, timed request by
+request under a route name. Routes are named after the endpoint template
+plus the kind of query, so the ids in the path do not split a route into
+thousands of rows. Virtual users repeat their scenario with a think time
+in between until the run ends.
+"""
+import asyncio
+import json
+import time
+from datetime import date, timedelta
+from typing import List, Optional
+
+import httpx
+import websockets
+
+from benchmarks.common import CATEGORIES, random_point
+from benchmarks.load.report import Recorder
+
+# Chat messages carry their send time, so the receiving virtual user (in the
+# same process) can time the delivery through the server
+DELIVERY_MARKER = "load:"
+
+
+class Session:
+    """One virtual user: an HTTP client shared by all sessions, the user's
+    token and, in chat scenarios, the user's WebSocket"""
+
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, manifest: dict,
+                 user: dict, token: Optional[str], rng, ws_url: str):
+        self.client = client
+        self.recorder = recorder
+        self.manifest = manifest
+        self.user = user
+        self.headers = {"Authorization": f"Bearer {token}"} if token else {}
+        self.rng = rng
+        self.ws_url = ws_url
+        self.peers: List[str] = []
+        self.socket = None
+        self.reader: Optional[asyncio.Task] = None
+
+    async def request(self, method: str, route: str, path: str, expect=(200,),
+                      **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, headers=self.headers, **kwargs)
+        except httpx.HTTPError as e:
+            self.recorder.record(route, (time.perf_counter() - started) * 1000, type(e).__name__, True)
+            return None
+        self.recorder.record(route, (time.perf_counter() - started) * 1000,
+                             str(response.status_code), response.status_code not in expect)
+        return response
+
+    def near_metro(self):
+        lon, lat = random_point(self.rng.choice(self.manifest["metros"]), radius_km=15)
+        return {"lon": lon, "lat": lat}
+
+    def item_id(self):
+        return self.rng.choice(self.manifest["items"])
+
+    async def connect(self):
+        started = time.perf_counter()
+        try:
+            self.socket = await websockets.connect(f"{self.ws_url}/ws/{self.user['id']}")
+        except (OSError, websockets.WebSocketException) as e:
+            self.recorder.record("WS /ws/{user_id} connect", (time.perf_counter() - started) * 1000,
+                                 type(e).__name__, True)
+            return
+        self.recorder.record("WS /ws/{user_id} connect", (time.perf_counter() - started) * 1000,
+                             "101", False)
+        self.reader = asyncio.create_task(self._read())
+
+    async def _read(self):
+        try:
+            async for raw in self.socket:
+                frame = json.loads(raw)
+                if frame.get("type") == "ping":
+                    await self.socket.send(json.dumps({"type": "pong"}))
+                    continue
+                content = frame.get("content")
+                if isinstance(content, str) and content.startswith(DELIVERY_MARKER):
+                    sent = float(content[len(DELIVERY_MARKER):])
+                    self.recorder.record("WS message delivery", (time.perf_counter() - sent) * 1000,
+                                         "delivered", False)
+        except websockets.ConnectionClosed:
+            pass
+
+    async def close(self):
+        if self.socket is not None:
+            await self.socket.close()
+        if self.reader is not None:
+            await self.reader
+
+
+async def browse(session: Session):
+    """Near-me listing with its second page, a category page, then a couple
+    of item pages with their reviews"""
+    near = session.near_metro()
+    response = await session.request("GET", "GET /api/items (near)", "/api/items",
+                                     params={**near, "max_distance": 10, "limit": 20})
+    items = response.json() if response is not None and response.status_code == 200 else []
+    cursor = response.headers.get("x-next-cursor") if response is not None else None
+    if cursor:
+        await session.request("GET", "GET /api/items (near, next page)", "/api/items",
+                              params={**near, "max_distance": 10, "limit": 20, "cursor": cursor})
+    category = session.rng.choice(CATEGORIES)
+    await session.request("GET", "GET /api/items (category)", "/api/items",
+                          params={"category": category, "limit": 20})
+    picks = [item["id"] for item in items[:10]] or [session.item_id()]
+    for item_id in session.rng.sample(picks, min(2, len(picks))):
+        await session.request("GET", "GET /api/items/{item_id}", f"/api/items/{item_id}")
+        await session.request("GET", "GET /api/reviews/{item_id}", f"/api/reviews/{item_id}")
+
+
+async def search(session: Session):
+    """Typeahead as the term is typed (roughly every other keystroke gets
+    past the debounce), the full search, then the top result"""
+    term = session.rng.choice(session.manifest["search_terms"])
+    near = session.near_metro()
+    for length in range(2, len(term), 2):
+        await session.request("GET", "GET /api/items (typeahead)", "/api/items",
+                              params={**near, "max_distance": 25, "q": term[:length],
+                                      "prefix": "true", "limit": 10})
+    response = await session.request("GET", "GET /api/items (search)", "/api/items",
+                                     params={**near, "max_distance": 25, "q": term, "limit": 20})
+    if response is not None and response.status_code == 200 and response.json():
+        item_id = response.json()[0]["id"]
+        await session.request("GET", "GET /api/items/{item_id}", f"/api/items/{item_id}")
+
+
+async def booking(session: Session):
+    """Check an item's availability, request it (a 409 for taken dates is a
+    normal answer, as is a 400 for the user's own item) and list bookings"""
+    item_id = session.item_id()
+    first = date.today() + timedelta(days=session.rng.randrange(1, 90))
+    last = first + timedelta(days=session.rng.randrange(0, 4))
+    dates = {"start_date": first.isoformat(), "end_date": last.isoformat()}
+    await session.request("GET", "GET /api/items/{item_id}", f"/api/items/{item_id}")
+    await session.request("GET", "GET /api/items/{item_id}/availability",
+                          f"/api/items/{item_id}/availability", params=dates)
+    await session.request("POST", "POST /api/bookings", "/api/bookings", expect=(200, 400, 409),
+                          json={"item_id": item_id, "total_amount": 25, **dates})
+    await session.request("GET", "GET /api/bookings", "/api/bookings")
+
+
+async def chat(session: Session):
+    """Open the inbox and a conversation with another chatting virtual user,
+    send a few messages over the socket and mark the conversation read"""
+    if session.socket is None:
+        await session.connect()
+    other = session.rng.choice(session.peers)
+    await session.request("GET", "GET /api/conversations", "/api/conversations")
+    await session.request("GET", "GET /api/messages/{other_user_id}", f"/api/messages/{other}")
+    if session.reader is not None and not session.reader.done():
+        for _ in range(3):
+            await session.socket.send(json.dumps({
+                "receiver_id": other, "content": f"{DELIVERY_MARKER}{time.perf_counter()}"
+            }))
+            await asyncio.sleep(session.rng.uniform(0.2, 1.0))
+    await session.request("POST", "POST /api/conversations/{other_user_id}/read",
+                          f"/api/conversations/{other}/read", json={})
+
+
+SCENARIOS = {"browse": browse, "search": search, "booking": booking, "chat": chat}
+
+# Share of virtual users running each scenario
+PROFILES = {
+    "browse": {"browse": 1.0},
+    "search": {"search": 1.0},
+    "booking": {"booking": 1.0},
+    "chat": {"chat": 1.0},
+    "mixed": {"browse": 0.5, "search": 0.25, "booking": 0.1, "chat": 0.15},
+}
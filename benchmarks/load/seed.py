@@ -0,0 +1,274 @@
+"""Seed a scratch database for the load test and write its manifest.
+
+Generates users, items spread around a handful of metro areas (denser
+downtown, thinning out towards the suburbs), past and upcoming bookings,
+reviews of completed rentals rolled into the item and owner ratings, and
+chat histories with their inbox entries. Documents are shaped exactly like
+the ones the API stores, and every user has the password LOAD_PASSWORD so
+virtual users can log in.
+
+    python -m benchmarks.load.seed --users 2000 --items 50000 --manifest load_manifest.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from benchmarks.common import CATEGORIES, random_point
+from backend.auth import get_password_hash
+from backend.availability import DATE_FORMAT
+from backend.conversations import conversation_id, record_messages
+from backend.database import (
+    bookings_collection, conversations_collection, create_indexes, items_collection,
+    messages_collection, reviews_collection, users_collection
+)
+from backend.models import BookingStatus
+from backend.search import search_prefixes
+
+LOAD_PASSWORD = "LoadTest123!"
+BATCH_SIZE = 5000
+CALENDAR_DAYS = 120
+
+# (name, [lon, lat], share of users and items)
+METROS = [
+    ("San Francisco", [-122.4194, 37.7749], 0.30),
+    ("New York", [-73.9857, 40.7484], 0.30),
+    ("Chicago", [-87.6298, 41.8781], 0.15),
+    ("Austin", [-97.7431, 30.2672], 0.15),
+    ("Seattle", [-122.3321, 47.6062], 0.10),
+]
+
+ADJECTIVES = ["compact", "heavy duty", "vintage", "electric", "portable", "professional",
+              "cordless", "folding", "wooden", "waterproof", "lightweight", "deluxe"]
+NOUNS = {
+    "clothes": ["tuxedo", "wedding dress", "ski jacket", "costume", "hiking boots", "raincoat"],
+    "tools": ["drill", "ladder", "pressure washer", "circular saw", "lawn mower", "tile cutter"],
+    "electronics": ["camera", "projector", "drone", "speaker", "gaming console", "microphone"],
+    "furniture": ["table", "sofa", "desk", "chairs", "bookshelf", "bed frame"],
+    "vehicles": ["bike", "kayak", "scooter", "trailer", "canoe", "paddle board"],
+    "other": ["tent", "grill", "telescope", "sewing machine", "karaoke machine", "cooler"],
+}
+
+
+def metro_point(rng):
+    """A point near a metro, weighted by its share, denser towards its center"""
+    _, center, _ = rng.choices(METROS, [share for _, _, share in METROS])[0]
+    return random_point(center, radius_km=min(60.0, rng.expovariate(1 / 8)))
+
+
+def day(offset):
+    return datetime.combine(datetime.utcnow().date(), datetime.min.time()) + timedelta(days=offset)
+
+
+def make_user(rng, n, password_hash):
+    now = datetime.utcnow()
+    return {
+        "id": str(uuid.uuid4()),
+        "username": f"load{n}",
+        "email": f"load{n}@example.com",
+        "full_name": f"Load User {n}",
+        "phone": None,
+        "bio": None,
+        "profile_image": None,
+        "location": {"type": "Point", "coordinates": metro_point(rng)},
+        "password": password_hash,
+        "role": "user",
+        "rating": 0.0,
+        "rating_sum": 0,
+        "total_reviews": 0,
+        "is_verified": rng.random() < 0.3,
+        "is_active": True,
+        "created_at": now,
+        "updated_at": now
+    }
+
+
+def make_item(rng, owner_id):
+    category = rng.choice(CATEGORIES)
+    title = f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS[category])}".capitalize()
+    created_at = datetime.utcnow() - timedelta(minutes=rng.randrange(60 * 24 * 365))
+    return {
+        "id": str(uuid.uuid4()),
+        "owner_id": owner_id,
+        "title": title,
+        "description": f"{title} in good condition, available for pickup or delivery. " * 3,
+        "search_prefixes": search_prefixes(title),
+        "category": category,
+        "price_per_day": round(rng.uniform(5, 200), 2),
+        "images": [],
+        "location": {"type": "Point", "coordinates": metro_point(rng)},
+        "available_ranges": [{"start": day(0), "end": day(CALENDAR_DAYS)}],
+        "is_available": rng.random() < 0.9,
+        "rating": 0.0,
+        "rating_sum": 0,
+        "total_reviews": 0,
+        "created_at": created_at,
+        "updated_at": created_at
+    }
+
+
+def make_booking(rng, item, renter_id, first_day, days, status):
+    start, end = day(first_day), day(first_day + days)
+    return {
+        "id": str(uuid.uuid4()),
+        "item_id": item["id"],
+        "renter_id": renter_id,
+        "owner_id": item["owner_id"],
+        "start_date": start.strftime(DATE_FORMAT),
+        "end_date": (end - timedelta(days=1)).strftime(DATE_FORMAT),
+        "start": start,
+        "end": end,
+        "total_amount": round(item["price_per_day"] * days, 2),
+        "message": None,
+        "status": status,
+        "created_at": start - timedelta(days=rng.randrange(1, 14)),
+        "updated_at": start
+    }
+
+
+def add_rating(document, rating):
+    document["rating_sum"] += rating
+    document["total_reviews"] += 1
+    document["rating"] = document["rating_sum"] / document["total_reviews"]
+
+
+def make_bookings_and_reviews(rng, users, items, count):
+    """Past completed bookings (each reviewed) and upcoming pending or approved
+    ones. Every item's bookings are laid out back to back, so none overlap."""
+    users_by_id = {user["id"]: user for user in users}
+    past_day, next_day = {}, {}
+    bookings, reviews = [], []
+    for _ in range(count):
+        item = rng.choice(items)
+        renter = rng.choice(users)
+        if renter["id"] == item["owner_id"]:
+            continue
+        days = rng.randint(1, 5)
+        if rng.random() < 0.6:
+            first = past_day.get(item["id"], 0) - days - rng.randrange(3)
+            past_day[item["id"]] = first
+            booking = make_booking(rng, item, renter["id"], first, days, BookingStatus.COMPLETED)
+            rating = rng.choices([1, 2, 3, 4, 5], [1, 1, 3, 8, 12])[0]
+            reviews.append({
+                "id": str(uuid.uuid4()),
+                "item_id": item["id"],
+                "reviewer_id": renter["id"],
+                "booking_id": booking["id"],
+                "rating": rating,
+                "comment": rng.choice(["Worked great.", "As described.", "Would rent again!", None]),
+                "created_at": booking["end"]
+            })
+            add_rating(item, rating)
+            add_rating(users_by_id[item["owner_id"]], rating)
+        else:
+            first = next_day.get(item["id"], 1) + rng.randrange(3)
+            next_day[item["id"]] = first + days
+            status = rng.choice([BookingStatus.PENDING, BookingStatus.APPROVED])
+            booking = make_booking(rng, item, renter["id"], first, days, status)
+        bookings.append(booking)
+    return bookings, reviews
+
+
+def make_conversations(rng, users, bookings, count):
+    """Renter/owner pairs from bookings, topped up with random pairs"""
+    count = min(count, len(users) * (len(users) - 1) // 2)
+    pairs = {tuple(sorted((b["renter_id"], b["owner_id"]))) for b in bookings[:count]}
+    while len(pairs) < count:
+        a, b = rng.sample(users, 2)
+        pairs.add(tuple(sorted((a["id"], b["id"]))))
+    return sorted(pairs)
+
+
+def make_messages(rng, pairs, count):
+    """Chat histories over the last 30 days; a few conversations are long,
+    most are short, and only the latest messages are still unread"""
+    weights = [1 / (rank + 1) for rank in range(len(pairs))]
+    per_pair = {}
+    for pair in rng.choices(pairs, weights, k=count):
+        per_pair[pair] = per_pair.get(pair, 0) + 1
+    now = datetime.utcnow()
+    messages = []
+    for (a, b), total in per_pair.items():
+        sent = now - timedelta(days=30)
+        step = timedelta(days=30) / (total + 1)
+        for n in range(total):
+            sender, receiver = (a, b) if rng.random() < 0.5 else (b, a)
+            sent += step * rng.uniform(0.5, 1.5)
+            messages.append({
+                "id": str(uuid.uuid4()),
+                "conversation_id": conversation_id(sender, receiver),
+                "sender_id": sender,
+                "receiver_id": receiver,
+                "content": f"Message {n} about the rental",
+                "message_type": "text",
+                "is_read": total - n > 3,
+                "created_at": min(sent, now)
+            })
+    return messages
+
+
+async def insert(collection, documents):
+    for offset in range(0, len(documents), BATCH_SIZE):
+        await collection.insert_many(documents[offset:offset + BATCH_SIZE], ordered=False)
+
+
+async def seed(args):
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    await create_indexes()
+    if args.reset:
+        for collection in (users_collection, items_collection, bookings_collection,
+                           reviews_collection, messages_collection, conversations_collection):
+            await collection.delete_many({})
+
+    # Hashing once keeps seeding fast; the hash is the same for every user
+    password_hash = get_password_hash(LOAD_PASSWORD)
+    offset = await users_collection.count_documents({})
+    users = [make_user(rng, offset + n, password_hash) for n in range(args.users)]
+    items = [make_item(rng, rng.choice(users)["id"]) for _ in range(args.items)]
+    bookings, reviews = make_bookings_and_reviews(rng, users, items, args.bookings)
+    pairs = make_conversations(rng, users, bookings, args.conversations)
+    messages = make_messages(rng, pairs, args.messages)
+
+    await insert(users_collection, users)
+    await insert(items_collection, items)
+    await insert(bookings_collection, bookings)
+    await insert(reviews_collection, reviews)
+    await insert(messages_collection, messages)
+    for offset in range(0, len(messages), BATCH_SIZE):
+        await record_messages(messages[offset:offset + BATCH_SIZE])
+
+    manifest = {
+        "password": LOAD_PASSWORD,
+        "users": [{"id": user["id"], "email": user["email"]} for user in users],
+        "items": [item["id"] for item in items],
+        "metros": [center for _, center, _ in METROS],
+        "search_terms": sorted({noun for nouns in NOUNS.values() for noun in nouns} | set(ADJECTIVES)),
+        "conversations": pairs
+    }
+    with open(args.manifest, "w") as f:
+        json.dump(manifest, f)
+
+    print(f"Seeded {len(users)} users, {len(items)} items, {len(bookings)} bookings, "
+          f"{len(reviews)} reviews, {len(messages)} messages in {len(pairs)} conversations "
+          f"in {time.perf_counter() - started:.1f}s; manifest written to {args.manifest}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--items", type=int, default=50000)
+    parser.add_argument("--bookings", type=int, default=20000)
+    parser.add_argument("--conversations", type=int, default=5000)
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=42, help="random seed, for repeatable data sets")
+    parser.add_argument("--manifest", default="load_manifest.json")
+    parser.add_argument("--reset", action="store_true", help="empty the collections first")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(seed(parse_args()))
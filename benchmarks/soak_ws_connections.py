@@ -0,0 +1,117 @@
+"""Memory soak test for the WebSocket connection registry.
+
+Runs the real /ws endpoint against simulated sockets for millions of
+connect/disconnect cycles: users open several connections at once, and
+sockets end with a clean disconnect, a malformed frame followed by a
+disconnect, an unexpected error or by being evicted as idle. Resident
+memory is sampled as it goes and must stay flat, and the registry and
+message bus must be empty at the end. Needs no database or server.
+
+    python -m benchmarks.soak_ws_connections [cycles]
+"""
+import asyncio
+import contextlib
+import gc
+import os
+import random
+import sys
+import time
+
+from fastapi import WebSocketDisconnect
+
+from backend.server import manager, message_bus, websocket_endpoint
+
+CYCLES = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+CONCURRENCY = 1_000
+USERS = 300
+SAMPLES = 10
+
+
+class SimulatedWebSocket:
+    def __init__(self, frames, ending):
+        self.frames = frames
+        self.ending = ending
+        self.closed = asyncio.Event()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message):
+        pass
+
+    async def receive_text(self):
+        if self.frames:
+            return self.frames.pop()
+        if self.ending == "idle":
+            # Half-open: never sends again until the server closes it
+            await self.closed.wait()
+            raise WebSocketDisconnect(1006)
+        if self.ending == "error":
+            raise RuntimeError("connection reset")
+        raise WebSocketDisconnect(1000)
+
+    async def close(self, code=1000):
+        self.closed.set()
+
+
+def random_socket():
+    frames = ['{"type": "pong"}'] * random.randrange(3)
+    if random.random() < 0.1:
+        frames.append("not json")
+    ending = random.choices(["disconnect", "error", "idle"], weights=[90, 9, 1])[0]
+    return SimulatedWebSocket(frames, ending)
+
+
+def rss_mb():
+    with open("/proc/self/statm") as statm:
+        pages = int(statm.read().split()[1])
+    return pages * 4096 / 1024 / 1024
+
+
+async def main():
+    # Evict idle sockets quickly so they take part in the churn
+    manager.heartbeat = 0.05
+    manager.idle_timeout = 0.1
+    await message_bus.start(manager.deliver)
+
+    samples = []
+    done = 0
+
+    async def worker():
+        nonlocal done
+        while done < CYCLES:
+            done += 1
+            await websocket_endpoint(random_socket(), f"user-{random.randrange(USERS)}")
+
+    async def monitor():
+        sample_every = CYCLES // SAMPLES
+        while True:
+            await asyncio.sleep(0.5)
+            if done >= sample_every * (len(samples) + 1):
+                gc.collect()
+                samples.append(rss_mb())
+                print(f"{done:>10} cycles  rss {samples[-1]:7.1f} MB  "
+                      f"connections {len(manager.active_connections)}", file=sys.__stdout__)
+
+    started = time.perf_counter()
+    sampler = asyncio.create_task(monitor())
+    # The endpoint logs every unexpected error; keep the report readable
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
+    sampler.cancel()
+
+    # Let the watchdog notice the registry is empty and exit
+    await asyncio.sleep(manager.heartbeat * 2)
+    elapsed = time.perf_counter() - started
+    metrics = manager.metrics()
+    print(f"{CYCLES} cycles in {elapsed:.1f}s ({CYCLES / elapsed:,.0f}/s)")
+    print(f"rss after first sample {samples[0]:.1f} MB, last {samples[-1]:.1f} MB, "
+          f"growth {samples[-1] - samples[0]:+.1f} MB")
+    print(f"idle evictions {metrics['idle_evictions']}, left over: "
+          f"{metrics['connections']} connections, {metrics['users']} users, "
+          f"{len(message_bus.local_users)} bus subscriptions")
+    await message_bus.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
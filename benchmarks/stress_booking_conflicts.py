@@ -0,0 +1,66 @@
+"""Concurrency stress test for booking conflict detection.
+
+Fires hundreds of simultaneous create_booking calls with random, heavily
+overlapping date ranges at a single item, then checks that the bookings
+that were accepted never overlap each other.
+"""
+import asyncio
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+
+from benchmarks.common import make_item
+from backend.database import bookings_collection, items_collection, create_indexes
+from backend.models import BookingCreate
+from backend.server import create_booking
+
+REQUESTS = 500
+HORIZON_DAYS = 60
+
+
+def random_request(item_id):
+    first = datetime.utcnow().date() + timedelta(days=random.randrange(HORIZON_DAYS))
+    last = first + timedelta(days=random.randrange(1, 7))
+    return BookingCreate(
+        item_id=item_id,
+        start_date=first.strftime("%Y-%m-%d"),
+        end_date=last.strftime("%Y-%m-%d"),
+        total_amount=10
+    )
+
+
+async def attempt(item_id, outcomes):
+    renter = {"id": str(uuid.uuid4())}
+    try:
+        await create_booking(random_request(item_id), current_user=renter)
+        outcomes["accepted"] += 1
+    except HTTPException as e:
+        outcomes[e.status_code] = outcomes.get(e.status_code, 0) + 1
+
+
+async def main():
+    await create_indexes()
+    item = make_item(str(uuid.uuid4()))
+    await items_collection.insert_one(item)
+
+    outcomes = {"accepted": 0}
+    started = time.perf_counter()
+    await asyncio.gather(*(attempt(item["id"], outcomes) for _ in range(REQUESTS)))
+    elapsed = time.perf_counter() - started
+
+    accepted = await bookings_collection.find({"item_id": item["id"]}).sort("start", 1).to_list(length=None)
+    overlaps = sum(1 for a, b in zip(accepted, accepted[1:]) if b["start"] < a["end"])
+    print(f"{REQUESTS} concurrent requests in {elapsed:.2f}s: {outcomes}")
+    print(f"Stored bookings: {len(accepted)}, overlapping pairs: {overlaps}")
+
+    await bookings_collection.delete_many({"item_id": item["id"]})
+    await items_collection.delete_one({"id": item["id"]})
+    if overlaps:
+        raise SystemExit("Overlapping bookings were accepted")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
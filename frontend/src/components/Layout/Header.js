@@ -2,6 +2,7 @@ import React, { useState } from 'react';
 import { Link, useNavigate } from 'react-router-dom';
 import { useAuth } from '../../contexts/AuthContext';
 import { useChat } from '../../contexts/ChatContext';
+import { imageUrl } from '../../utils/images';
 import { 
   User, 
   LogOut, 
@@ -118,7 +119,7 @@ const Header = () => {
                   >
                     {user?.profile_image ? (
                       <img 
-                        src={user.profile_image} 
+                        src={imageUrl(user.profile_image)} 
                         alt={user.full_name}
                         className="w-8 h-8 rounded-full object-cover"
                       />
@@ -23,8 +23,19 @@ export const BookingProvider = ({ children }) => {
     
     setLoading(true);
     try {
-      const response = await axios.get('/api/bookings');
-      setBookings(response.data);
+      // The endpoint is paginated; follow the cursor until the last page
+      const allBookings = [];
+      let cursor = null;
+      do {
+        const params = new URLSearchParams({ fields: 'message' });
+        if (cursor) {
+          params.append('cursor', cursor);
+        }
+        const response = await axios.get(`/api/bookings?${params.toString()}`);
+        allBookings.push(...response.data);
+        cursor = response.headers['x-next-cursor'];
+      } while (cursor);
+      setBookings(allBookings);
     } catch (error) {
       console.error('Error fetching bookings:', error);
     } finally {
@@ -4,6 +4,8 @@ import { useAuth } from './AuthContext';
 
 const ChatContext = createContext();
 
+const MESSAGE_PAGE_SIZE = 50;
+
 export const useChat = () => {
   const context = useContext(ChatContext);
   if (!context) {
@@ -17,6 +19,7 @@ export const ChatProvider = ({ children }) => {
   const [activeChat, setActiveChat] = useState(null);
   const [socket, setSocket] = useState(null);
   const [onlineUsers, setOnlineUsers] = useState(new Set());
+  const [inbox, setInbox] = useState([]);
   const { user, isAuthenticated } = useAuth();
 
   // Initialize WebSocket connection
@@ -33,6 +36,49 @@ export const ChatProvider = ({ children }) => {
       
       ws.onmessage = (event) => {
         const messageData = JSON.parse(event.data);
+
+        // Answer heartbeats so the server keeps the connection open
+        if (messageData.type === 'ping') {
+          ws.send(JSON.stringify({ type: 'pong' }));
+          return;
+        }
+
+        // The server took a message we sent: swap in its real id and timestamp
+        if (messageData.type === 'ack') {
+          setMessages(prev => {
+            const next = {};
+            Object.keys(prev).forEach(userId => {
+              next[userId] = prev[userId].map(msg =>
+                msg.id === messageData.client_id
+                  ? {
+                      ...msg,
+                      id: messageData.id,
+                      created_at: messageData.created_at,
+                      pending: false,
+                      failed: !messageData.saved
+                    }
+                  : msg
+              );
+            });
+            return next;
+          });
+          return;
+        }
+
+        // The other user read messages we sent them
+        if (messageData.type === 'read') {
+          const readAt = new Date(messageData.read_at);
+          setMessages(prev => ({
+            ...prev,
+            [messageData.reader_id]: (prev[messageData.reader_id] || []).map(msg =>
+              msg.sender_id === user.id && !msg.pending && new Date(msg.created_at) <= readAt
+                ? { ...msg, is_read: true }
+                : msg
+            )
+          }));
+          return;
+        }
+
         console.log('Received message:', messageData);
         
         // Add message to the appropriate conversation
@@ -65,10 +111,12 @@ export const ChatProvider = ({ children }) => {
   const sendMessage = async (receiverId, content) => {
     if (!socket || !user) return;
     
+    const clientId = Date.now().toString(); // temporary ID until the server acks
     const messageData = {
       receiver_id: receiverId,
       content: content,
-      message_type: 'text'
+      message_type: 'text',
+      client_id: clientId
     };
     
     try {
@@ -76,12 +124,13 @@ export const ChatProvider = ({ children }) => {
       
       // Add message to local state immediately
       const message = {
-        id: Date.now().toString(), // temporary ID
+        id: clientId,
         sender_id: user.id,
         receiver_id: receiverId,
         content: content,
         created_at: new Date().toISOString(),
-        is_read: false
+        is_read: false,
+        pending: true
       };
       
       setMessages(prev => ({
@@ -98,15 +147,98 @@ export const ChatProvider = ({ children }) => {
     }
   };
 
-  // Fetch messages for a conversation
+  // Fetch the server-side inbox: last message and unread count per conversation
+  const fetchConversations = async () => {
+    try {
+      let conversations = [];
+      let cursor = null;
+      do {
+        const response = await axios.get('/api/conversations', {
+          params: cursor ? { cursor, limit: 100 } : { limit: 100 }
+        });
+        conversations = conversations.concat(response.data);
+        cursor = response.headers['x-next-cursor'];
+      } while (cursor);
+      setInbox(conversations);
+      return { success: true, conversations };
+    } catch (error) {
+      return { 
+        success: false, 
+        error: error.response?.data?.detail || 'Failed to fetch conversations' 
+      };
+    }
+  };
+
+  useEffect(() => {
+    if (isAuthenticated && user) {
+      fetchConversations();
+    }
+  }, [isAuthenticated, user]);
+
+  // Append fetched messages we don't have yet, replacing our own unacked copies
+  const mergeMessages = (existing, fetched) => {
+    const knownIds = new Set(existing.map(msg => msg.id));
+    const fresh = fetched.filter(msg => !knownIds.has(msg.id));
+    const kept = existing.filter(msg => !(msg.pending && fresh.some(other =>
+      other.sender_id === msg.sender_id && other.content === msg.content
+    )));
+    return [...kept, ...fresh];
+  };
+
+  // Fetch messages for a conversation: the latest page the first time,
+  // afterwards only the messages that arrived since the newest one we have
   const fetchMessages = async (otherUserId) => {
+    const stored = (messages[otherUserId] || []).filter(msg => !msg.pending);
+    let since = stored.length ? stored[stored.length - 1].id : null;
     try {
-      const response = await axios.get(`/api/messages/${otherUserId}`);
+      let fetched = [];
+      while (true) {
+        const response = await axios.get(`/api/messages/${otherUserId}`, {
+          params: since ? { since, limit: MESSAGE_PAGE_SIZE } : { limit: MESSAGE_PAGE_SIZE }
+        });
+        fetched = fetched.concat(response.data);
+        if (!since || response.data.length < MESSAGE_PAGE_SIZE) break;
+        since = response.data[response.data.length - 1].id;
+      }
       setMessages(prev => ({
         ...prev,
-        [otherUserId]: response.data
+        [otherUserId]: stored.length ? mergeMessages(prev[otherUserId] || [], fetched) : fetched
       }));
-      return { success: true, messages: response.data };
+      return { success: true, messages: fetched };
+    } catch (error) {
+      if (since && error.response?.status === 404) {
+        // The server doesn't know our newest message; start over
+        setMessages(prev => ({ ...prev, [otherUserId]: [] }));
+        const response = await axios.get(`/api/messages/${otherUserId}`, {
+          params: { limit: MESSAGE_PAGE_SIZE }
+        });
+        setMessages(prev => ({ ...prev, [otherUserId]: response.data }));
+        return { success: true, messages: response.data };
+      }
+      return { 
+        success: false, 
+        error: error.response?.data?.detail || 'Failed to fetch messages' 
+      };
+    }
+  };
+
+  // Load the page of messages before the oldest one we have
+  const fetchOlderMessages = async (otherUserId) => {
+    const stored = (messages[otherUserId] || []).filter(msg => !msg.pending);
+    if (!stored.length) return fetchMessages(otherUserId);
+    try {
+      const response = await axios.get(`/api/messages/${otherUserId}`, {
+        params: { before: stored[0].id, limit: MESSAGE_PAGE_SIZE }
+      });
+      setMessages(prev => ({
+        ...prev,
+        [otherUserId]: [...response.data, ...(prev[otherUserId] || [])]
+      }));
+      return {
+        success: true,
+        messages: response.data,
+        hasMore: response.data.length === MESSAGE_PAGE_SIZE
+      };
     } catch (error) {
       return { 
         success: false, 
@@ -128,6 +260,30 @@ export const ChatProvider = ({ children }) => {
     }
   };
 
+  // Mark everything the other user sent us, up to a message, read in one go
+  const markConversationRead = async (otherUserId, upTo = null) => {
+    setMessages(prev => ({
+      ...prev,
+      [otherUserId]: (prev[otherUserId] || []).map(msg =>
+        msg.receiver_id === user?.id ? { ...msg, is_read: true } : msg
+      )
+    }));
+    setInbox(prev => prev.map(conversation =>
+      conversation.other_user_id === otherUserId
+        ? { ...conversation, unread_count: 0 }
+        : conversation
+    ));
+    try {
+      await axios.post(`/api/conversations/${otherUserId}/read`, { up_to: upTo });
+      return { success: true };
+    } catch (error) {
+      return { 
+        success: false, 
+        error: error.response?.data?.detail || 'Failed to mark conversation as read' 
+      };
+    }
+  };
+
   // Get unread message count
   const getUnreadCount = (userId) => {
     if (!messages[userId]) return 0;
@@ -160,6 +316,17 @@ export const ChatProvider = ({ children }) => {
       }
     });
     
+    // Conversations not opened yet come from the server-side inbox
+    inbox.forEach(conversation => {
+      if (!messages[conversation.other_user_id]?.length && conversation.last_message) {
+        conversations.push({
+          userId: conversation.other_user_id,
+          lastMessage: conversation.last_message,
+          unreadCount: conversation.unread_count
+        });
+      }
+    });
+    
     // Sort by last message date
     conversations.sort((a, b) => 
       new Date(b.lastMessage.created_at) - new Date(a.lastMessage.created_at)
@@ -168,12 +335,10 @@ export const ChatProvider = ({ children }) => {
     return conversations;
   };
 
-  // Start conversation
+  // Start conversation; an already loaded one only fetches what is new
   const startConversation = (userId) => {
     setActiveChat(userId);
-    if (!messages[userId]) {
-      fetchMessages(userId);
-    }
+    fetchMessages(userId);
   };
 
   // Close conversation
@@ -188,7 +353,10 @@ export const ChatProvider = ({ children }) => {
     onlineUsers,
     sendMessage,
     fetchMessages,
+    fetchOlderMessages,
+    fetchConversations,
     markMessageAsRead,
+    markConversationRead,
     getUnreadCount,
     getTotalUnreadCount,
     getConversations,
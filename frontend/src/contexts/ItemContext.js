@@ -36,6 +36,13 @@ export const ItemProvider = ({ children }) => {
         params.append('category', currentFilters.category);
       }
       
+      if (currentFilters.searchTerm && currentFilters.searchTerm.trim()) {
+        params.append('q', currentFilters.searchTerm);
+        if (currentFilters.prefix) {
+          params.append('prefix', 'true');
+        }
+      }
+      
       if (currentFilters.location) {
         params.append('lat', currentFilters.location.lat);
         params.append('lon', currentFilters.location.lon);
@@ -56,8 +63,19 @@ export const ItemProvider = ({ children }) => {
     if (!isAuthenticated) return;
     
     try {
-      const response = await axios.get('/api/items/my');
-      setMyItems(response.data);
+      // The endpoint is paginated; follow the cursor until the last page
+      const allItems = [];
+      let cursor = null;
+      do {
+        const params = new URLSearchParams({ fields: 'description' });
+        if (cursor) {
+          params.append('cursor', cursor);
+        }
+        const response = await axios.get(`/api/items/my?${params.toString()}`);
+        allItems.push(...response.data);
+        cursor = response.headers['x-next-cursor'];
+      } while (cursor);
+      setMyItems(allItems);
     } catch (error) {
       console.error('Error fetching my items:', error);
     }
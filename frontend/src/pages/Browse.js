@@ -3,6 +3,7 @@ import { Link, useSearchParams } from 'react-router-dom';
 import { useItems } from '../contexts/ItemContext';
 import { Search, Filter, MapPin, Star, Calendar, X } from 'lucide-react';
 import { ITEM_CATEGORIES, DISTANCE_OPTIONS } from '../utils/constants';
+import { imageUrl } from '../utils/images';
 
 const Browse = () => {
   const [searchParams, setSearchParams] = useSearchParams();
@@ -30,6 +31,17 @@ const Browse = () => {
     fetchItems({ searchTerm });
   };
 
+  // Typeahead: search as the user types, treating the last word as a prefix
+  useEffect(() => {
+    const prefix = !/\s$/.test(searchTerm);
+    // Single letters are not indexed as prefixes; wait for the next keystroke
+    if (prefix && /^\s*\w\s*$/.test(searchTerm)) return;
+    const timer = setTimeout(() => {
+      fetchItems({ searchTerm, prefix });
+    }, 250);
+    return () => clearTimeout(timer);
+  }, [searchTerm]);
+
   const handleFilterChange = (key, value) => {
     setTempFilters(prev => ({ ...prev, [key]: value }));
   };
@@ -54,9 +66,6 @@ const Browse = () => {
   };
 
   const filteredItems = items.filter(item => {
-    if (searchTerm && !item.title.toLowerCase().includes(searchTerm.toLowerCase())) {
-      return false;
-    }
     if (tempFilters.category && item.category !== tempFilters.category) {
       return false;
     }
@@ -277,7 +286,7 @@ const Browse = () => {
                 <div className="relative">
                   {item.images && item.images.length > 0 ? (
                     <img
-                      src={item.images[0]}
+                      src={imageUrl(item.images[0])}
                       alt={item.title}
                       className="w-full h-48 object-cover rounded-lg mb-4"
                     />
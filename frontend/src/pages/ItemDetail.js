@@ -10,6 +10,7 @@ import {
   Clock, Shield, CheckCircle
 } from 'lucide-react';
 import { BOOKING_STATUS_LABELS, BOOKING_STATUS_COLORS } from '../utils/constants';
+import { imageUrl } from '../utils/images';
 import toast from 'react-hot-toast';
 
 const ItemDetail = () => {
@@ -169,7 +170,7 @@ const ItemDetail = () => {
               {item.images && item.images.length > 0 ? (
                 <div className="relative">
                   <img
-                    src={item.images[currentImageIndex]}
+                    src={imageUrl(item.images[currentImageIndex])}
                     alt={item.title}
                     className="w-full h-96 object-cover rounded-xl"
                   />
@@ -209,7 +210,7 @@ const ItemDetail = () => {
                     }`}
                   >
                     <img
-                      src={image}
+                      src={imageUrl(image)}
                       alt={`${item.title} ${index + 1}`}
                       className="w-full h-full object-cover"
                     />
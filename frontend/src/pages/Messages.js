@@ -18,7 +18,7 @@ const Messages = () => {
     getConversations,
     startConversation,
     closeConversation,
-    markMessageAsRead
+    markConversationRead
   } = useChat();
   const { user } = useAuth();
 
@@ -37,6 +37,17 @@ const Messages = () => {
     scrollToBottom();
   }, [messages[activeChat]]);
 
+  // Everything visible in the open chat is read; one receipt covers it all
+  useEffect(() => {
+    if (!activeChat) return;
+    const unread = (messages[activeChat] || []).filter(msg =>
+      !msg.is_read && msg.receiver_id === user?.id
+    );
+    if (unread.length > 0) {
+      markConversationRead(activeChat, unread[unread.length - 1].id);
+    }
+  }, [activeChat, messages[activeChat]]);
+
   const handleSendMessage = async (e) => {
     e.preventDefault();
     if (!messageInput.trim() || !activeChat) return;
@@ -8,6 +8,7 @@ import {
   ToggleLeft, ToggleRight
 } from 'lucide-react';
 import { ITEM_CATEGORIES } from '../utils/constants';
+import { imageUrl } from '../utils/images';
 import toast from 'react-hot-toast';
 
 const MyItems = () => {
@@ -183,7 +184,7 @@ const MyItems = () => {
                 <div className="relative">
                   {item.images && item.images.length > 0 ? (
                     <img
-                      src={item.images[0]}
+                      src={imageUrl(item.images[0])}
                       alt={item.title}
                       className="w-full h-48 object-cover rounded-lg mb-4"
                     />
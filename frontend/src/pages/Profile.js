@@ -5,6 +5,7 @@ import {
   Camera, Star, Package, Calendar, MessageCircle
 } from 'lucide-react';
 import { MAX_FILE_SIZE, ACCEPTED_IMAGE_TYPES } from '../utils/constants';
+import { imageUrl } from '../utils/images';
 import toast from 'react-hot-toast';
 
 const Profile = () => {
@@ -149,7 +150,7 @@ const Profile = () => {
               <div className="relative inline-block mb-4">
                 {formData.profile_image ? (
                   <img
-                    src={formData.profile_image}
+                    src={imageUrl(formData.profile_image)}
                     alt={user?.full_name}
                     className="w-32 h-32 rounded-full object-cover mx-auto"
                   />
@@ -0,0 +1,6 @@
+const backendUrl = process.env.REACT_APP_BACKEND_URL || 'http://localhost:8001';
+
+// Stored images are referenced by their API path (/api/images/<id>), which is
+// served by the backend's origin, not the frontend's. External URLs and
+// data: URLs of not yet uploaded images are used as they are.
+export const imageUrl = (src) => (src && src.startsWith('/api/') ? `${backendUrl}${src}` : src);